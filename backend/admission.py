@@ -0,0 +1,225 @@
+import heapq
+import itertools
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import resilience
+
+
+class AdmissionRejected(RuntimeError):
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    def __reduce__(self):
+        return type(self), (str(self), self.retry_after)
+
+
+class QueueFull(AdmissionRejected):
+    status_code = 429
+
+
+class QueueTimeout(AdmissionRejected):
+    status_code = 503
+
+
+class TokenBucket:
+    # `rate` tokens per second up to `burst`; a rate of 0 disables limiting.
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self) -> float:
+        # Takes a token and returns 0, or returns the seconds until one is available.
+        # Not thread-safe on its own; AdmissionScheduler calls it under its lock.
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self._refill(now)
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def refund(self) -> None:
+        # Returns a token that was taken but not used.
+        if self.rate <= 0:
+            return
+        self._refill(time.monotonic())
+        self._tokens = min(self.burst, self._tokens + 1)
+
+    def available(self) -> float:
+        if self.rate <= 0:
+            return self.burst
+        self._refill(time.monotonic())
+        return self._tokens
+
+
+class Ticket:
+    # One admission taken ahead of the upstream call it pays for, so a caller can be shed
+    # before it does any work. spend() is true once; release() refunds an unspent ticket.
+
+    def __init__(self, scheduler: "AdmissionScheduler"):
+        self._scheduler = scheduler
+        self._lock = threading.Lock()
+        self._spent = False
+
+    def spend(self) -> bool:
+        with self._lock:
+            if self._spent:
+                return False
+            self._spent = True
+            return True
+
+    def release(self) -> None:
+        if self.spend():
+            self._scheduler.refund()
+
+
+class _Waiter:
+    __slots__ = ("priority", "enqueued_at", "evicted")
+
+    def __init__(self, priority: float):
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.evicted = False
+
+
+class AdmissionScheduler:
+    # Admits callers at the token-bucket rate, most urgent first (lower priority value
+    # wins, FIFO within a priority). When the queue is full a newcomer displaces the least
+    # urgent waiter if it is more urgent than it, otherwise it is shed. Callers that wait
+    # longer than `max_wait_seconds` give up with QueueTimeout.
+
+    def __init__(self, rate_per_second: float, burst: float, max_queue: int, max_wait_seconds: float):
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self._bucket = TokenBucket(rate_per_second, burst)
+        self._cond = threading.Condition()
+        self._heap: List[tuple] = []
+        self._sequence = itertools.count()
+        self._waits = resilience.LatencyWindow(500)
+        self._counters = {
+            "admitted": 0,
+            "queued": 0,
+            "shed_full": 0,
+            "evicted": 0,
+            "timed_out": 0,
+            "declined": 0,
+            "refunded": 0,
+        }
+        self._max_depth_seen = 0
+
+    def _retry_after(self) -> float:
+        if self._bucket.rate <= 0:
+            return 1.0
+        return max(1.0, (len(self._heap) + 1) / self._bucket.rate)
+
+    def _remove(self, entry: tuple) -> None:
+        self._heap.remove(entry)
+        heapq.heapify(self._heap)
+
+    def limit_queue(self, max_queue: int) -> int:
+        # Lowers the queue cap, e.g. to what the caller's threadpool can spare; queued
+        # callers stay, newcomers are shed until the queue is back under the cap.
+        with self._cond:
+            self.max_queue = min(self.max_queue, max_queue)
+            return self.max_queue
+
+    def try_acquire(self) -> bool:
+        # Takes a token only if one is free now and nobody is queued for it; never waits.
+        # For optional calls such as hedges, which are pointless once they have to queue.
+        with self._cond:
+            if not self._heap and self._bucket.take() == 0:
+                self._counters["admitted"] += 1
+                return True
+            self._counters["declined"] += 1
+            return False
+
+    def acquire(self, priority: float, max_wait_seconds: Optional[float] = None) -> float:
+        # Blocks until the caller may make one upstream call; returns the seconds waited.
+        max_wait = self.max_wait_seconds if max_wait_seconds is None else max_wait_seconds
+        with self._cond:
+            if not self._heap and self._bucket.take() == 0:
+                self._counters["admitted"] += 1
+                self._waits.record(0.0)
+                return 0.0
+
+            if len(self._heap) >= self.max_queue:
+                least_urgent = max(self._heap) if self._heap else None
+                if least_urgent is None or least_urgent[0] <= priority:
+                    self._counters["shed_full"] += 1
+                    raise QueueFull("Too many AI analyses are queued; try again shortly.", self._retry_after())
+                self._remove(least_urgent)
+                least_urgent[2].evicted = True
+                self._counters["evicted"] += 1
+                self._cond.notify_all()
+
+            waiter = _Waiter(priority)
+            entry = (priority, next(self._sequence), waiter)
+            heapq.heappush(self._heap, entry)
+            self._counters["queued"] += 1
+            self._max_depth_seen = max(self._max_depth_seen, len(self._heap))
+            deadline = waiter.enqueued_at + max_wait
+
+            while True:
+                if waiter.evicted:
+                    raise QueueFull(
+                        "Displaced from the AI queue by more urgent cases; try again shortly.", self._retry_after()
+                    )
+                now = time.monotonic()
+                token_wait = None
+                if self._heap[0] is entry:
+                    token_wait = self._bucket.take()
+                    if token_wait == 0:
+                        heapq.heappop(self._heap)
+                        waited = now - waiter.enqueued_at
+                        self._counters["admitted"] += 1
+                        self._waits.record(waited)
+                        self._cond.notify_all()
+                        return waited
+                remaining = deadline - now
+                if remaining <= 0:
+                    self._remove(entry)
+                    self._counters["timed_out"] += 1
+                    self._cond.notify_all()
+                    raise QueueTimeout(
+                        f"AI analysis waited over {max_wait:g}s for capacity; try again shortly.", self._retry_after()
+                    )
+                self._cond.wait(min(remaining, token_wait) if token_wait else remaining)
+
+    def reserve(self, priority: float, max_wait_seconds: Optional[float] = None) -> Ticket:
+        # acquire(), but the admission is held in a Ticket for a later call to spend.
+        self.acquire(priority, max_wait_seconds)
+        return Ticket(self)
+
+    def refund(self) -> None:
+        with self._cond:
+            self._bucket.refund()
+            self._counters["refunded"] += 1
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "queue_depth": len(self._heap),
+                "max_queue": self.max_queue,
+                "max_depth_seen": self._max_depth_seen,
+                "rate_per_second": self._bucket.rate,
+                "burst": self._bucket.burst,
+                "tokens_available": round(self._bucket.available(), 3),
+                "wait_p50_seconds": self._waits.percentile(0.5),
+                "wait_p95_seconds": self._waits.percentile(0.95),
+                "wait_p99_seconds": self._waits.percentile(0.99),
+                **self._counters,
+            }
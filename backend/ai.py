@@ -1,14 +1,30 @@
+import copy
+import hashlib
 import json
 import os
 import random
-from typing import Any, Dict, List
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import closing, contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, ContextManager, Deque, Dict, Iterator, List, Optional, Tuple
 
 import cohere
+import httpx
 from dotenv import load_dotenv
 
+import admission
+from analysis_cache import analysis_cache, make_key
+import resilience
+import triage
+
 load_dotenv()
 
 MODEL_NAME = os.getenv("COHERE_MODEL", "command-a-03-2025")
+# Routine cases go to this smaller model when set; MODEL_NAME stays the escalation target.
+FAST_MODEL_NAME = os.getenv("COHERE_FAST_MODEL", "")
 PROMPT_CONTEXT = os.getenv(
     "AI_PROMPT_CONTEXT",
     (
@@ -17,6 +33,59 @@ PROMPT_CONTEXT = os.getenv(
     ),
 )
 
+COHERE_BASE_URL = os.getenv("COHERE_BASE_URL") or None
+COHERE_TIMEOUT_SECONDS = float(os.getenv("COHERE_TIMEOUT_SECONDS", "60"))
+COHERE_CONNECT_TIMEOUT_SECONDS = float(os.getenv("COHERE_CONNECT_TIMEOUT_SECONDS", "5"))
+COHERE_MAX_CONNECTIONS = int(os.getenv("COHERE_MAX_CONNECTIONS", "20"))
+COHERE_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("COHERE_MAX_KEEPALIVE_CONNECTIONS", "10"))
+COHERE_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("COHERE_KEEPALIVE_EXPIRY_SECONDS", "60"))
+# How long a caller waits on an identical in-flight analysis before giving up.
+SINGLEFLIGHT_TIMEOUT_SECONDS = float(os.getenv("AI_SINGLEFLIGHT_TIMEOUT_SECONDS", "120"))
+# Estimated-token budget for the per-request message; the static system prompt is extra.
+PROMPT_TOKEN_BUDGET = int(os.getenv("AI_PROMPT_TOKEN_BUDGET", "1500"))
+PROMPT_HISTORY_MAX_ENTRIES = int(os.getenv("AI_PROMPT_HISTORY_MAX_ENTRIES", "5"))
+PROMPT_HISTORY_ENTRY_MAX_CHARS = int(os.getenv("AI_PROMPT_HISTORY_ENTRY_MAX_CHARS", "400"))
+PROMPT_NOTES_MIN_CHARS = 300
+PROMPT_VITAL_VALUE_MAX_CHARS = int(os.getenv("AI_PROMPT_VITAL_VALUE_MAX_CHARS", "80"))
+
+# Overall budget for one analysis call, including retries and backoff.
+AI_CALL_DEADLINE_SECONDS = float(os.getenv("AI_CALL_DEADLINE_SECONDS", "45"))
+AI_ATTEMPT_TIMEOUT_SECONDS = float(os.getenv("AI_ATTEMPT_TIMEOUT_SECONDS", "30"))
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "2"))
+AI_BACKOFF_BASE_SECONDS = float(os.getenv("AI_BACKOFF_BASE_SECONDS", "0.5"))
+AI_BACKOFF_MAX_SECONDS = float(os.getenv("AI_BACKOFF_MAX_SECONDS", "8"))
+# Hedging sends a second request once the first outlives this latency percentile.
+AI_HEDGE_ENABLED = os.getenv("AI_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+AI_HEDGE_PERCENTILE = float(os.getenv("AI_HEDGE_PERCENTILE", "0.95"))
+AI_HEDGE_MIN_SAMPLES = int(os.getenv("AI_HEDGE_MIN_SAMPLES", "20"))
+AI_HEDGE_MAX_WORKERS = int(os.getenv("AI_HEDGE_MAX_WORKERS", "16"))
+AI_BREAKER_FAILURE_THRESHOLD = int(os.getenv("AI_BREAKER_FAILURE_THRESHOLD", "5"))
+AI_BREAKER_RESET_SECONDS = float(os.getenv("AI_BREAKER_RESET_SECONDS", "30"))
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+# Admission in front of the provider: calls per minute to match the account quota (0 turns
+# limiting off), how many may queue for a slot, and how long one may wait in the queue.
+AI_RATE_LIMIT_PER_MINUTE = float(os.getenv("AI_RATE_LIMIT_PER_MINUTE", "500"))
+AI_RATE_LIMIT_BURST = float(os.getenv("AI_RATE_LIMIT_BURST", "10"))
+AI_QUEUE_MAX = int(os.getenv("AI_QUEUE_MAX", "100"))
+AI_QUEUE_MAX_WAIT_SECONDS = float(os.getenv("AI_QUEUE_MAX_WAIT_SECONDS", "20"))
+# A queued caller blocks its thread, so the queue is capped this many threads below the
+# web server's threadpool (see bound_admission_queue) to keep threads for other endpoints.
+AI_QUEUE_RESERVED_THREADS = int(os.getenv("AI_QUEUE_RESERVED_THREADS", "16"))
+# A case stays on the fast model only while it is within all of these limits.
+AI_ROUTE_LARGE_SEVERITIES = {
+    level.strip().lower() for level in os.getenv("AI_ROUTE_LARGE_SEVERITIES", "high,critical,severe").split(",")
+}
+AI_ROUTE_FAST_MAX_SYMPTOMS = int(os.getenv("AI_ROUTE_FAST_MAX_SYMPTOMS", "3"))
+AI_ROUTE_FAST_MAX_NOTES_CHARS = int(os.getenv("AI_ROUTE_FAST_MAX_NOTES_CHARS", "600"))
+AI_ROUTE_FAST_MAX_HISTORY = int(os.getenv("AI_ROUTE_FAST_MAX_HISTORY", "2"))
+# Stop using the fast model while its recent validation-failure rate is above this.
+AI_ROUTE_FAST_MAX_FAILURE_RATE = float(os.getenv("AI_ROUTE_FAST_MAX_FAILURE_RATE", "0.3"))
+AI_ROUTE_MIN_SAMPLES = int(os.getenv("AI_ROUTE_MIN_SAMPLES", "20"))
+# While the fast model is benched for its failure rate or latency, every Nth case that
+# would otherwise have used it still does, so its samples can recover; 0 disables probes.
+AI_ROUTE_FAST_PROBE_EVERY = int(os.getenv("AI_ROUTE_FAST_PROBE_EVERY", "20"))
+TRUNCATION_MARKER = " ...[truncated]"
+
 FALLBACK_DOCTOR_POOL = [
     {"name": "Dr. Ananya Rao", "specialty": "Internal Medicine"},
     {"name": "Dr. Karan Mehta", "specialty": "Pulmonology"},
@@ -26,7 +95,205 @@ FALLBACK_DOCTOR_POOL = [
 ]
 
 
-def _history_to_text(history: List[Dict[str, Any]]) -> str:
+class _PooledClient:
+    # A ClientV2 and its httpx pool, with the number of calls currently using them.
+
+    def __init__(self, api_key: str, client: cohere.ClientV2, http_client: httpx.Client):
+        self.api_key = api_key
+        self.client = client
+        self.http_client = http_client
+        self.leases = 0
+        self.retired = False
+
+
+class _CohereClientManager:
+    # One ClientV2 per API key, backed by a shared httpx connection pool. httpx.Client is
+    # thread-safe, so worker threads reuse warm TLS connections instead of reconnecting.
+    # Calls lease the client; a client replaced by key rotation is closed once its last
+    # lease is returned.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current: Optional[_PooledClient] = None
+        self._builds = 0
+        self._closed = 0
+        self._calls = 0
+        self._total_seconds = 0.0
+        self._first_call_seconds: Optional[float] = None
+        self._last_call_seconds: Optional[float] = None
+
+    def _build(self, api_key: str) -> Tuple[cohere.ClientV2, httpx.Client]:
+        http_client = httpx.Client(
+            timeout=httpx.Timeout(COHERE_TIMEOUT_SECONDS, connect=COHERE_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=COHERE_MAX_CONNECTIONS,
+                max_keepalive_connections=COHERE_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=COHERE_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+        )
+        kwargs: Dict[str, Any] = {
+            "api_key": api_key,
+            "timeout": COHERE_TIMEOUT_SECONDS,
+            "httpx_client": http_client,
+        }
+        if COHERE_BASE_URL:
+            kwargs["base_url"] = COHERE_BASE_URL
+        return cohere.ClientV2(**kwargs), http_client
+
+    def _retire(self, pooled: _PooledClient) -> Optional[httpx.Client]:
+        # Called with the lock held; returns the pool to close if nothing is using it.
+        pooled.retired = True
+        if pooled.leases:
+            return None
+        self._closed += 1
+        return pooled.http_client
+
+    @contextmanager
+    def lease(self) -> Iterator[cohere.ClientV2]:
+        api_key = os.getenv("COHERE_API_KEY")
+        if not api_key:
+            raise RuntimeError("COHERE_API_KEY is not set in environment")
+
+        to_close = None
+        with self._lock:
+            if self._current is None or api_key != self._current.api_key:
+                # Key rotation: build a fresh pool; the old one closes after its in-flight calls.
+                if self._current is not None:
+                    to_close = self._retire(self._current)
+                self._current = _PooledClient(api_key, *self._build(api_key))
+                self._builds += 1
+            pooled = self._current
+            pooled.leases += 1
+        if to_close is not None:
+            to_close.close()
+
+        try:
+            yield pooled.client
+        finally:
+            with self._lock:
+                pooled.leases -= 1
+                to_close = self._retire(pooled) if pooled.retired else None
+            if to_close is not None:
+                to_close.close()
+
+    def record_call(self, seconds: float) -> None:
+        with self._lock:
+            self._calls += 1
+            self._total_seconds += seconds
+            self._last_call_seconds = seconds
+            if self._first_call_seconds is None:
+                self._first_call_seconds = seconds
+
+    def close(self) -> None:
+        with self._lock:
+            to_close = self._retire(self._current) if self._current is not None else None
+            self._current = None
+        if to_close is not None:
+            to_close.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "client_builds": self._builds,
+                "clients_closed": self._closed,
+                "in_flight": self._current.leases if self._current is not None else 0,
+                "calls": self._calls,
+                "avg_call_seconds": round(self._total_seconds / self._calls, 4) if self._calls else None,
+                # The first call pays DNS/TCP/TLS setup; later calls reuse the pooled connection.
+                "first_call_seconds": self._first_call_seconds,
+                "last_call_seconds": self._last_call_seconds,
+            }
+
+
+_client_manager = _CohereClientManager()
+
+
+def lease_client() -> ContextManager[cohere.ClientV2]:
+    return _client_manager.lease()
+
+
+def client_stats() -> Dict[str, Any]:
+    return _client_manager.stats()
+
+
+def close_client() -> None:
+    _client_manager.close()
+
+
+class _InFlightCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+def _copy_error(error: BaseException) -> BaseException:
+    try:
+        return copy.copy(error)
+    except Exception:
+        return RuntimeError(f"Identical in-flight analysis failed: {error}")
+
+
+class _SingleFlight:
+    # Coalesces concurrent calls with the same key onto one execution; every caller
+    # receives its own copy of the result, or of the exception chained to the leader's.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _InFlightCall] = {}
+        self._executions = 0
+        self._coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Dict[str, Any]], timeout: float) -> Dict[str, Any]:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _InFlightCall()
+                self._calls[key] = call
+                self._executions += 1
+            else:
+                call.waiters += 1
+                self._coalesced += 1
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as exc:
+                call.error = exc
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.done.set()
+        elif not call.done.wait(timeout):
+            raise TimeoutError(f"Timed out after {timeout}s waiting for an identical in-flight analysis")
+
+        if call.error is not None:
+            if leader:
+                raise call.error
+            # A fresh exception per waiter keeps each traceback to its own thread; the
+            # leader's stays reachable as __cause__.
+            raise _copy_error(call.error) from call.error
+        return copy.deepcopy(call.result)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "executions": self._executions,
+                "coalesced": self._coalesced,
+            }
+
+
+_inflight = _SingleFlight()
+
+
+def inflight_stats() -> Dict[str, Any]:
+    return _inflight.stats()
+
+
+def _history_to_text(history: List[Dict[str, Any]], max_entry_chars: Optional[int] = None) -> str:
     if not history:
         return "No prior AI analysis history available for this patient."
 
@@ -38,40 +305,230 @@ def _history_to_text(history: List[Dict[str, Any]]) -> str:
         else:
             causes_text = str(causes)
 
-        lines.append(
+        line = (
             f"{idx}. risk_level={entry.get('risk_level', 'unknown')}, "
             f"probable_causes={causes_text}, "
             f"specialist_recommendation={entry.get('specialist_recommendation', 'N/A')}"
         )
+        lines.append(_truncate(line, max_entry_chars) if max_entry_chars else line)
 
     return "\n".join(lines)
 
 
-def build_analysis_prompt(payload: Dict[str, Any], history: List[Dict[str, Any]]) -> str:
-    history_text = _history_to_text(history)
-    current_case = json.dumps(payload, indent=2, default=str)
-
-    return (
-        f"Context:\n{PROMPT_CONTEXT}\n\n"
-        "You are a clinical decision-support assistant for emergency triage.\n"
-        "Use both the current case data and prior patient history to estimate likely causes,\n"
-        "risk level, specialist recommendation, and a concise summary.\n"
-        "The payload includes the doctor's diagnosis. Compare that diagnosis against standard clinical guidelines,\n"
-        "and estimate how much it deviates from standard guidance.\n\n"
-        f"Current Case:\n{current_case}\n\n"
-        f"Prior History (latest first):\n{history_text}\n\n"
-        "Return strictly valid JSON only (no markdown, no extra text) with keys:\n"
-        "- probable_causes: array of strings\n"
-        "- risk_level: string\n"
-        "- specialist_recommendation: string\n"
-        "- summary: string\n"
-        "- confidence_score: number between 0 and 1\n"
-        "- deviation_percentage: number between 0 and 100 where 0 means fully aligned with guidelines\n"
-        "- suggested_doctors: array with 2-3 objects. Each object must include:\n"
-        "  - name: string\n"
-        "  - specialty: string\n"
-        "  - reason: string (why this specialist is suitable)"
+ANALYSIS_INSTRUCTIONS = (
+    "You are a clinical decision-support assistant for emergency triage.\n"
+    "Use both the current case data and prior patient history to estimate likely causes,\n"
+    "risk level, specialist recommendation, and a concise summary.\n"
+    "The payload includes the doctor's diagnosis. Compare that diagnosis against standard clinical guidelines,\n"
+    "and estimate how much it deviates from standard guidance.\n\n"
+    "Return strictly valid JSON only (no markdown, no extra text) with keys:\n"
+    "- probable_causes: array of strings\n"
+    "- risk_level: string\n"
+    "- specialist_recommendation: string\n"
+    "- summary: string\n"
+    "- confidence_score: number between 0 and 1\n"
+    "- deviation_percentage: number between 0 and 100 where 0 means fully aligned with guidelines\n"
+    "- suggested_doctors: array with 2-3 objects. Each object must include:\n"
+    "  - name: string\n"
+    "  - specialty: string\n"
+    "  - reason: string (why this specialist is suitable)"
+)
+
+
+def _estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English clinical text.
+    return (len(text) + 3) // 4
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return text[: max(max_chars - len(TRUNCATION_MARKER), 0)].rstrip() + TRUNCATION_MARKER
+
+
+def _render_case_message(case: Dict[str, Any], history_text: str) -> str:
+    current_case = json.dumps(case, separators=(",", ":"), ensure_ascii=False, default=str)
+    return f"Current Case:\n{current_case}\n\nPrior History (latest first):\n{history_text}"
+
+
+class _PromptTelemetry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._prompts = 0
+        self._total_tokens = 0
+        self._max_tokens = 0
+        self._truncated = 0
+        self._last: Optional[Dict[str, Any]] = None
+
+    def record(self, stats: Dict[str, Any]) -> None:
+        with self._lock:
+            self._prompts += 1
+            self._total_tokens += stats["estimated_tokens"]
+            self._max_tokens = max(self._max_tokens, stats["estimated_tokens"])
+            if stats["truncated"]:
+                self._truncated += 1
+            self._last = stats
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "prompts": self._prompts,
+                "avg_estimated_tokens": round(self._total_tokens / self._prompts, 1) if self._prompts else None,
+                "max_estimated_tokens": self._max_tokens,
+                "truncated_prompts": self._truncated,
+                "last": self._last,
+            }
+
+
+_prompt_telemetry = _PromptTelemetry()
+
+
+def prompt_stats() -> Dict[str, Any]:
+    return _prompt_telemetry.stats()
+
+
+def system_prompt() -> str:
+    # Identical on every request so providers can cache it as a prefix.
+    return f"Context:\n{PROMPT_CONTEXT}\n\n{ANALYSIS_INSTRUCTIONS}"
+
+
+# Bump when compile_analysis_prompt or _render_case_message change how a case becomes the
+# user message in a way the fingerprint below cannot see (ordering, trimming, wording logic).
+PROMPT_TEMPLATE_REVISION = 2
+
+
+def _prompt_fingerprint() -> str:
+    # Everything besides the case itself that decides what the model is sent: the system
+    # prompt, the user-message template and the settings that trim it.
+    parts = [
+        str(PROMPT_TEMPLATE_REVISION),
+        system_prompt(),
+        _render_case_message({}, ""),
+        str(PROMPT_TOKEN_BUDGET),
+        str(PROMPT_HISTORY_MAX_ENTRIES),
+        str(PROMPT_HISTORY_ENTRY_MAX_CHARS),
+        str(PROMPT_NOTES_MIN_CHARS),
+        str(PROMPT_VITAL_VALUE_MAX_CHARS),
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+# Part of every analysis cache key, so a prompt change never serves answers to the old one.
+PROMPT_VERSION = _prompt_fingerprint()
+
+
+def _analysis_cache_key(payload: Dict[str, Any], history: List[Dict[str, Any]]) -> str:
+    # Keyed on the configured model pair rather than the routed model, so the lookup can
+    # happen before routing; changing either model still invalidates the entries.
+    models = f"{MODEL_NAME}|{FAST_MODEL_NAME}"
+    return make_key(payload, _history_to_text(history), models, PROMPT_VERSION)
+
+
+def _compact_vital(value: Any) -> Any:
+    # Numbers pass through; long strings and nested structures become bounded text.
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    text = value if isinstance(value, str) else json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+    if len(text) <= PROMPT_VITAL_VALUE_MAX_CHARS:
+        return value
+    return _truncate(text, PROMPT_VITAL_VALUE_MAX_CHARS)
+
+
+def _trim_vitals(vitals: Dict[str, Any], excess_chars: int) -> Dict[str, Any]:
+    # Shortens every reading, then drops readings the triage rules do not use, last first,
+    # until roughly excess_chars are saved. Scored vitals are always kept.
+    scored = {path[0] for spec in triage.engine.rules["vitals"].values() for path in spec["paths"]}
+
+    def size(key: Any, value: Any) -> int:
+        # Characters the entry adds to the rendered dict: the braces stand in for its comma.
+        return len(json.dumps({str(key): value}, separators=(",", ":"), ensure_ascii=False, default=str)) - 1
+
+    trimmed: Dict[str, Any] = {}
+    saved = 0
+    for key, value in vitals.items():
+        trimmed[str(key)] = compact = _compact_vital(value)
+        if compact is not value:
+            saved += size(key, value) - size(key, compact)
+    omitted = 0
+    for key in reversed([key for key in trimmed if key not in scored]):
+        # Leaves room for the "_omitted" note added below.
+        if saved >= excess_chars + (64 if omitted else 0):
+            break
+        saved += size(key, trimmed.pop(key))
+        omitted += 1
+    if omitted:
+        trimmed["_omitted"] = f"{omitted} more readings omitted for length"
+    return trimmed
+
+
+def compile_analysis_prompt(payload: Dict[str, Any], history: List[Dict[str, Any]]) -> Dict[str, str]:
+    # Fits the per-request message into PROMPT_TOKEN_BUDGET, trimming in priority order:
+    # oldest history entries first, then free-text notes, then vitals the triage rules do
+    # not score, then the remaining history.
+    budget_chars = PROMPT_TOKEN_BUDGET * 4
+    case = dict(payload)
+    entries = list(history[:PROMPT_HISTORY_MAX_ENTRIES])
+    omitted = len(history) - len(entries)
+    truncated: List[str] = []
+
+    def history_text() -> str:
+        text = _history_to_text(entries, max_entry_chars=PROMPT_HISTORY_ENTRY_MAX_CHARS)
+        if omitted:
+            text += f"\n({omitted} older analyses omitted for length.)"
+        return text
+
+    message = _render_case_message(case, history_text())
+
+    while len(message) > budget_chars and len(entries) > 1:
+        entries.pop()
+        omitted += 1
+        message = _render_case_message(case, history_text())
+    if omitted:
+        truncated.append("history")
+
+    notes = str(case.get("notes") or "")
+    if len(message) > budget_chars and len(notes) > PROMPT_NOTES_MIN_CHARS:
+        keep = max(PROMPT_NOTES_MIN_CHARS, len(notes) - (len(message) - budget_chars))
+        case["notes"] = _truncate(notes, keep)
+        truncated.append("notes")
+        message = _render_case_message(case, history_text())
+
+    vitals = case.get("vitals")
+    if len(message) > budget_chars and isinstance(vitals, dict) and vitals:
+        case["vitals"] = _trim_vitals(vitals, len(message) - budget_chars)
+        truncated.append("vitals")
+        message = _render_case_message(case, history_text())
+
+    if len(message) > budget_chars and entries:
+        omitted += len(entries)
+        entries = []
+        message = _render_case_message(case, history_text())
+
+    system = system_prompt()
+    _prompt_telemetry.record(
+        {
+            "system_chars": len(system),
+            "message_chars": len(message),
+            "estimated_tokens": _estimate_tokens(system) + _estimate_tokens(message),
+            "history_entries": len(entries),
+            "history_omitted": omitted,
+            "truncated": truncated,
+            "over_budget": len(message) > budget_chars,
+        }
     )
+    return {"system": system, "user": message}
+
+
+def build_analysis_prompt(payload: Dict[str, Any], history: List[Dict[str, Any]]) -> str:
+    compiled = compile_analysis_prompt(payload, history)
+    return f"{compiled['system']}\n\n{compiled['user']}"
+
+
+def _prompt_messages(compiled: Dict[str, str]) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": compiled["system"]},
+        {"role": "user", "content": compiled["user"]},
+    ]
 
 
 def _extract_text_from_response(response: Any) -> str:
@@ -98,28 +555,181 @@ def _extract_text_from_response(response: Any) -> str:
     return combined
 
 
+# A "{" can only open an object when followed by a key or by "}".
+_JSON_OBJECT_START = re.compile(r'\{\s*["}]')
+_JSON_STRUCTURE = re.compile(r'[{}"]')
+_JSON_STRING_SPECIAL = re.compile(r'["\\]')
+
+
+def _strip_code_fence(text: str) -> str:
+    # Unwraps a reply that is exactly one ```json ... ``` block so it takes the fast path.
+    if not (text.startswith("```") and text.endswith("```")):
+        return text
+    newline = text.find("\n")
+    if newline == -1:
+        return text
+    language = text[3:newline].strip()
+    if language and not language.isalnum():
+        return text
+    return text[newline + 1:-3]
+
+
+def _loads_object(candidate: str) -> Optional[Dict[str, Any]]:
+    try:
+        parsed = json.loads(candidate)
+    except (json.JSONDecodeError, RecursionError):
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+def _scan_object_spans(text: str, start: int, ends: Dict[int, int]) -> None:
+    # Walks from the "{" at start until it is balanced, recording in ends the index just
+    # past the matching "}" for every brace opened along the way (-1 if it never closes).
+    # Braces inside strings, including after escaped quotes, are not counted.
+    stack = [start]
+    pos = start + 1
+    while stack:
+        match = _JSON_STRUCTURE.search(text, pos)
+        if match is None:
+            break
+        char = match.group()
+        pos = match.end()
+        if char == "{":
+            stack.append(match.start())
+        elif char == "}":
+            ends[stack.pop()] = pos
+        else:
+            while True:
+                special = _JSON_STRING_SPECIAL.search(text, pos)
+                if special is None:
+                    pos = len(text)
+                    break
+                pos = special.end()
+                if special.group() == '"':
+                    break
+                pos += 1
+    for unclosed in stack:
+        ends[unclosed] = -1
+
+
 def _extract_json_object(text: str) -> Dict[str, Any]:
     text = text.strip()
 
-    try:
-        parsed = json.loads(text)
-        if isinstance(parsed, dict):
-            return parsed
-    except json.JSONDecodeError:
-        pass
+    parsed = _loads_object(_strip_code_fence(text))
+    if parsed is not None:
+        return parsed
 
-    decoder = json.JSONDecoder()
-    for idx, char in enumerate(text):
-        if char != "{":
+    # Try each "{" that can open an object, in order. A balanced span that does not parse
+    # is skipped whole, nested objects included, so the spans handed to json.loads never
+    # overlap. Starts inside a span that never closes reuse the ends recorded while
+    # balancing it instead of being balanced again.
+    ends: Dict[int, int] = {}
+    pos = 0
+    while True:
+        start_match = _JSON_OBJECT_START.search(text, pos)
+        if start_match is None:
+            raise ValueError("Model did not return a valid JSON object")
+        start = start_match.start()
+        if start not in ends:
+            _scan_object_spans(text, start, ends)
+        end = ends[start]
+        if end == -1:
+            pos = start + 1
             continue
+        parsed = _loads_object(text[start:end])
+        if parsed is not None:
+            return parsed
+        pos = end
+
+
+class _IncrementalJsonFields:
+    # Scans streamed model text once and reports each top-level member of the first
+    # JSON object as soon as its value is complete. Text before that object (a markdown
+    # fence, or prose such as "see {below}") is skipped: only a "{" followed by a quote
+    # or "}" opens an object, and an object whose first member does not parse is
+    # abandoned and the scan resumes just after its "{".
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._object_start: Optional[int] = None
+        self._member_start: Optional[int] = None
+        self._emitted = 0
+        self.finished = False
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        self.buffer += text
+        completed: List[Tuple[str, Any]] = []
+        buf = self.buffer
+
+        while self._pos < len(buf) and not self.finished:
+            char = buf[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                if self._depth > 0:
+                    self._in_string = True
+            elif char == "{" and self._depth == 0:
+                opens = self._opens_object(self._pos)
+                if opens is None:
+                    # The next significant character has not arrived yet.
+                    break
+                if opens:
+                    self._depth = 1
+                    self._object_start = self._pos
+                    self._member_start = self._pos + 1
+            elif char in "{[" and self._depth > 0:
+                self._depth += 1
+            elif char in "}]" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._close_member(self._pos, completed)
+                    if self._emitted:
+                        self.finished = True
+                    else:
+                        self._restart()
+            elif char == "," and self._depth == 1:
+                if not self._close_member(self._pos, completed) and not self._emitted:
+                    self._restart()
+                else:
+                    self._member_start = self._pos + 1
+            self._pos += 1
+
+        return completed
+
+    def _opens_object(self, pos: int) -> Optional[bool]:
+        for char in self.buffer[pos + 1:]:
+            if not char.isspace():
+                return char in '"}'
+        return None
+
+    def _restart(self) -> None:
+        # Resume after the abandoned "{"; the loop's increment moves past it.
+        self._pos = self._object_start
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member_start = None
+
+    def _close_member(self, end: int, completed: List[Tuple[str, Any]]) -> bool:
+        member = self.buffer[self._member_start:end].strip()
+        if not member:
+            return True
         try:
-            parsed, _ = decoder.raw_decode(text[idx:])
-            if isinstance(parsed, dict):
-                return parsed
+            parsed = json.loads("{" + member + "}")
         except json.JSONDecodeError:
-            continue
-
-    raise ValueError("Model did not return a valid JSON object")
+            return False
+        completed.extend(parsed.items())
+        self._emitted += len(parsed)
+        return True
 
 
 def _validate_analysis_output(data: Dict[str, Any]) -> Dict[str, Any]:
@@ -210,20 +820,368 @@ def _validate_analysis_output(data: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-def analyze_case(payload: Dict[str, Any], history: List[Dict[str, Any]]) -> Dict[str, Any]:
-    api_key = os.getenv("COHERE_API_KEY")
-    if not api_key:
-        raise RuntimeError("COHERE_API_KEY is not set in environment")
+def reserve_admission(payload: Dict[str, Any]) -> admission.Ticket:
+    # Lets a caller be shed before it stores anything. Pass the ticket to analyze_case or
+    # analyze_case_stream: the first upstream attempt spends it, and it is refunded if the
+    # case never reaches the provider (cache hit, coalesced call, failure before the call).
+    return _admission.reserve(admission_priority(payload))
+
+
+def analyze_case(
+    payload: Dict[str, Any], history: List[Dict[str, Any]], ticket: Optional[admission.Ticket] = None
+) -> Dict[str, Any]:
+    try:
+        cache_key = _analysis_cache_key(payload, history)
+        cached = analysis_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        compiled = compile_analysis_prompt(payload, history)
+        prompt_key = hashlib.sha256(f"{compiled['system']}\0{compiled['user']}".encode("utf-8")).hexdigest()
+
+        def run() -> Dict[str, Any]:
+            # Routed by the leader only, so coalesced callers do not count as routed calls.
+            provisional = triage.score_case(payload)
+            model = _router.choose(payload, history, provisional["risk_level"])
+            result = _call_model(compiled, model, -float(provisional["score"]), ticket=ticket)
+            analysis_cache.put(cache_key, result)
+            return result
+
+        return _inflight.do(prompt_key, run, SINGLEFLIGHT_TIMEOUT_SECONDS)
+    finally:
+        if ticket is not None:
+            ticket.release()
+
+
+_breaker = resilience.CircuitBreaker(AI_BREAKER_FAILURE_THRESHOLD, AI_BREAKER_RESET_SECONDS)
+_latencies = resilience.LatencyWindow()
+_hedge_executor = ThreadPoolExecutor(max_workers=AI_HEDGE_MAX_WORKERS, thread_name_prefix="ai-hedge")
+_admission = admission.AdmissionScheduler(
+    AI_RATE_LIMIT_PER_MINUTE / 60.0, AI_RATE_LIMIT_BURST, AI_QUEUE_MAX, AI_QUEUE_MAX_WAIT_SECONDS
+)
+_resilience_counters = {"retries": 0, "hedges": 0, "hedge_wins": 0}
+_resilience_lock = threading.Lock()
+
+
+def _count(name: str) -> None:
+    with _resilience_lock:
+        _resilience_counters[name] += 1
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (httpx.TimeoutException, httpx.TransportError, TimeoutError, ConnectionError)):
+        return True
+    status_code = getattr(exc, "status_code", None)
+    return status_code in RETRYABLE_STATUS_CODES
+
+
+class _ModelRouter:
+    # Picks the fast or the large model per case and keeps per-model latency and
+    # validation outcomes, which feed back into the choice and into hedging.
+
+    # Benched only on the fast model's own recent record, not on the case.
+    HEALTH_REASONS = ("fast_failure_rate", "fast_not_faster")
+
+    def __init__(
+        self, large_model: str, fast_model: str, window: int = 200, probe_every: int = AI_ROUTE_FAST_PROBE_EVERY
+    ):
+        self.large_model = large_model
+        self.fast_model = fast_model
+        self.probe_every = probe_every
+        self._benched = 0
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, resilience.LatencyWindow] = {}
+        self._outcomes: Dict[str, Deque[bool]] = {}
+        self._window = window
+        self._routed: Counter = Counter()
+        self._reasons: Counter = Counter()
+        self._escalations = 0
+
+    def _latency_window(self, model: str) -> resilience.LatencyWindow:
+        with self._lock:
+            if model not in self._latencies:
+                self._latencies[model] = resilience.LatencyWindow(self._window)
+            return self._latencies[model]
+
+    def record_latency(self, model: str, seconds: float) -> None:
+        self._latency_window(model).record(seconds)
 
-    prompt = build_analysis_prompt(payload, history)
+    def latency(self, model: str, fraction: float, min_samples: int = 1) -> Optional[float]:
+        return self._latency_window(model).percentile(fraction, min_samples)
 
-    client = cohere.ClientV2(api_key)
-    response = client.chat(
-        model=MODEL_NAME,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.1,
+    def record_outcome(self, model: str, valid: bool) -> None:
+        with self._lock:
+            self._outcomes.setdefault(model, deque(maxlen=self._window)).append(valid)
+
+    def record_escalation(self) -> None:
+        with self._lock:
+            self._escalations += 1
+
+    def failure_rate(self, model: str, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            outcomes = self._outcomes.get(model)
+            if not outcomes or len(outcomes) < max(min_samples, 1):
+                return None
+            return 1 - sum(outcomes) / len(outcomes)
+
+    def _reason_for_large(self, payload: Dict[str, Any], history: List[Dict[str, Any]], risk_level: str) -> Optional[str]:
+        if not self.fast_model or self.fast_model == self.large_model:
+            return "no_fast_model"
+        if str(payload.get("severity") or "").strip().lower() in AI_ROUTE_LARGE_SEVERITIES:
+            return "severity"
+        if risk_level in ("high", "critical"):
+            return "triage_risk"
+        if len(payload.get("symptoms") or []) > AI_ROUTE_FAST_MAX_SYMPTOMS:
+            return "symptoms"
+        if len(str(payload.get("notes") or "")) > AI_ROUTE_FAST_MAX_NOTES_CHARS:
+            return "notes"
+        if len(history) > AI_ROUTE_FAST_MAX_HISTORY:
+            return "history"
+        failure_rate = self.failure_rate(self.fast_model, AI_ROUTE_MIN_SAMPLES)
+        if failure_rate is not None and failure_rate > AI_ROUTE_FAST_MAX_FAILURE_RATE:
+            return "fast_failure_rate"
+        fast_p50 = self.latency(self.fast_model, 0.5, AI_ROUTE_MIN_SAMPLES)
+        large_p50 = self.latency(self.large_model, 0.5, AI_ROUTE_MIN_SAMPLES)
+        if fast_p50 is not None and large_p50 is not None and fast_p50 >= large_p50:
+            return "fast_not_faster"
+        return None
+
+    def choose(self, payload: Dict[str, Any], history: List[Dict[str, Any]], risk_level: str) -> str:
+        reason = self._reason_for_large(payload, history, risk_level)
+        with self._lock:
+            probe = False
+            if reason in self.HEALTH_REASONS:
+                # Without probes a benched fast model gets no new samples and stays benched.
+                self._benched += 1
+                probe = self.probe_every > 0 and self._benched % self.probe_every == 0
+            model = self.large_model if reason and not probe else self.fast_model
+            self._routed[model] += 1
+            self._reasons["fast_probe" if probe else reason or "routine"] += 1
+        return model
+
+    def stats(self) -> Dict[str, Any]:
+        models = {}
+        for model in sorted({self.large_model, self.fast_model} - {""}):
+            with self._lock:
+                outcomes = list(self._outcomes.get(model, ()))
+                routed = self._routed[model]
+            models[model] = {
+                "routed": routed,
+                "p50_seconds": self.latency(model, 0.5),
+                "p95_seconds": self.latency(model, 0.95),
+                "validated": len(outcomes),
+                "validation_failure_rate": round(1 - sum(outcomes) / len(outcomes), 4) if outcomes else None,
+            }
+        with self._lock:
+            return {
+                "large_model": self.large_model,
+                "fast_model": self.fast_model or None,
+                "models": models,
+                "reasons": dict(self._reasons),
+                "escalations": self._escalations,
+            }
+
+
+_router = _ModelRouter(MODEL_NAME, FAST_MODEL_NAME)
+
+
+def routing_stats() -> Dict[str, Any]:
+    return _router.stats()
+
+
+def admission_priority(payload: Dict[str, Any]) -> float:
+    # Lower is more urgent: the provisional triage score from severity, vitals and symptoms.
+    return -float(triage.score_case(payload)["score"])
+
+
+def admission_stats() -> Dict[str, Any]:
+    return _admission.stats()
+
+
+def bound_admission_queue(threads: int) -> int:
+    # Called at startup with the size of the request threadpool; returns the cap in effect.
+    return _admission.limit_queue(max(threads - AI_QUEUE_RESERVED_THREADS, 0))
+
+
+def resilience_stats() -> Dict[str, Any]:
+    with _resilience_lock:
+        counters = dict(_resilience_counters)
+    return {
+        "breaker": _breaker.stats(),
+        "p50_seconds": _latencies.percentile(0.5),
+        "p95_seconds": _latencies.percentile(0.95),
+        **counters,
+    }
+
+
+def _admit(priority: float, remaining: float, ticket: Optional[admission.Ticket]) -> float:
+    if ticket is not None and ticket.spend():
+        return 0.0
+    return _admission.acquire(priority, min(AI_QUEUE_MAX_WAIT_SECONDS, remaining))
+
+
+def _chat(
+    messages: List[Dict[str, str]],
+    model: str,
+    priority: float,
+    deadline_seconds: float,
+    ticket: Optional[admission.Ticket] = None,
+) -> Any:
+    def attempt(timeout: float) -> Any:
+        def send() -> Any:
+            # Leased per request: a losing hedge can outlive the call that started it.
+            with lease_client() as client:
+                started = time.perf_counter()
+                response = client.chat(
+                    model=model,
+                    messages=messages,
+                    temperature=0.1,
+                    request_options={"timeout_in_seconds": timeout, "max_retries": 0},
+                )
+            elapsed = time.perf_counter() - started
+            _latencies.record(elapsed)
+            _router.record_latency(model, elapsed)
+            _client_manager.record_call(elapsed)
+            return response
+
+        hedge_after = None
+        if AI_HEDGE_ENABLED:
+            # Per-model, so the fast model's latency does not set the large model's hedge point.
+            threshold = _router.latency(model, AI_HEDGE_PERCENTILE, AI_HEDGE_MIN_SAMPLES)
+            if threshold is not None and threshold < timeout:
+                hedge_after = threshold
+        return resilience.hedged_call(
+            send,
+            _hedge_executor,
+            hedge_after,
+            on_hedge=lambda: _count("hedges"),
+            on_hedge_win=lambda: _count("hedge_wins"),
+            # A hedge is another upstream request, so it needs a token too, but only one
+            # free right now: a hedge that has to queue arrives too late to help.
+            admit_hedge=_admission.try_acquire,
+        )
+
+    return resilience.call_with_retries(
+        attempt,
+        deadline_seconds=deadline_seconds,
+        attempt_timeout_seconds=AI_ATTEMPT_TIMEOUT_SECONDS,
+        max_retries=AI_MAX_RETRIES,
+        backoff_base=AI_BACKOFF_BASE_SECONDS,
+        backoff_cap=AI_BACKOFF_MAX_SECONDS,
+        is_retryable=_is_retryable,
+        breaker=_breaker,
+        on_retry=lambda attempt_number, exc: _count("retries"),
+        # Every attempt, retries included, takes its own admission token; the first one
+        # may have been reserved by the caller.
+        admit=lambda remaining: _admit(priority, remaining, ticket),
     )
 
-    output_text = _extract_text_from_response(response)
-    parsed = _extract_json_object(output_text)
-    return _validate_analysis_output(parsed)
+
+def _call_model(
+    compiled: Dict[str, str],
+    model: str,
+    priority: float,
+    deadline: Optional[float] = None,
+    ticket: Optional[admission.Ticket] = None,
+) -> Dict[str, Any]:
+    # `deadline` is a time.monotonic() instant; an escalation inherits the first call's,
+    # so the two together stay within AI_CALL_DEADLINE_SECONDS.
+    if deadline is None:
+        deadline = time.monotonic() + AI_CALL_DEADLINE_SECONDS
+    messages = _prompt_messages(compiled)
+    response = _chat(messages, model, priority, deadline - time.monotonic(), ticket)
+
+    try:
+        output_text = _extract_text_from_response(response)
+        result = _validate_analysis_output(_extract_json_object(output_text))
+    except ValueError:
+        _router.record_outcome(model, False)
+        if model == MODEL_NAME or time.monotonic() >= deadline:
+            raise
+        # The fast model's answer was unusable; escalate once to the large model.
+        _router.record_escalation()
+        return _call_model(compiled, MODEL_NAME, priority, deadline)
+
+    _router.record_outcome(model, True)
+    return result
+
+
+def _stream_text_deltas(
+    compiled: Dict[str, str], priority: float, ticket: Optional[admission.Ticket] = None
+) -> Iterator[str]:
+    # Streams cannot be retried or hedged once bytes are relayed, but they still honour
+    # the circuit breaker, admission and the per-call deadline.
+    if ticket is None or not ticket.spend():
+        _admission.acquire(priority)
+    if not _breaker.allow():
+        raise resilience.CircuitOpenError("AI provider circuit is open; failing fast")
+
+    # True: the provider answered; False: it failed; None: the consumer went away first.
+    healthy: Optional[bool] = None
+    started = time.perf_counter()
+    try:
+        with lease_client() as client:
+            stream = client.chat_stream(
+                model=MODEL_NAME,
+                messages=_prompt_messages(compiled),
+                temperature=0.1,
+                request_options={"timeout_in_seconds": AI_CALL_DEADLINE_SECONDS, "max_retries": 0},
+            )
+            for event in stream:
+                if time.perf_counter() - started > AI_CALL_DEADLINE_SECONDS:
+                    raise resilience.DeadlineExceeded(f"AI stream exceeded its {AI_CALL_DEADLINE_SECONDS}s deadline")
+                if getattr(event, "type", None) != "content-delta":
+                    continue
+                delta = getattr(event, "delta", None)
+                message = getattr(delta, "message", None)
+                content = getattr(message, "content", None)
+                text = getattr(content, "text", None)
+                if text:
+                    yield text
+    except Exception as exc:
+        healthy = not _is_retryable(exc)
+        raise
+    else:
+        healthy = True
+        _client_manager.record_call(time.perf_counter() - started)
+    finally:
+        # GeneratorExit (client disconnect) leaves healthy as None: neither a success nor
+        # a failure, but a half-open trial must still be released.
+        if healthy is None:
+            _breaker.abandon()
+        elif healthy:
+            _breaker.record_success()
+        else:
+            _breaker.record_failure()
+
+
+def analyze_case_stream(
+    payload: Dict[str, Any], history: List[Dict[str, Any]], ticket: Optional[admission.Ticket] = None
+) -> Iterator[Tuple[str, Any]]:
+    # Yields ("field", (name, raw_value)) as each top-level field of the model's JSON
+    # completes, then ("result", validated_output) once the full response is checked.
+    try:
+        cache_key = _analysis_cache_key(payload, history)
+        cached = analysis_cache.get(cache_key)
+        if cached is not None:
+            for item in cached.items():
+                yield "field", item
+            yield "result", cached
+            return
+
+        compiled = compile_analysis_prompt(payload, history)
+        fields = _IncrementalJsonFields()
+        with closing(_stream_text_deltas(compiled, admission_priority(payload), ticket)) as deltas:
+            for text in deltas:
+                for item in fields.feed(text):
+                    yield "field", item
+    finally:
+        if ticket is not None:
+            ticket.release()
+
+    if not fields.buffer.strip():
+        raise ValueError("No text content returned by Cohere")
+
+    result = _validate_analysis_output(_extract_json_object(fields.buffer))
+    analysis_cache.put(cache_key, result)
+    yield "result", result
@@ -0,0 +1,201 @@
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from psycopg2.extras import Json
+
+from db import get_connection
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("ANALYSIS_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+DB_TIER_ENABLED = os.getenv("ANALYSIS_CACHE_DB", "true").lower() in ("1", "true", "yes")
+TTL_SECONDS = float(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", str(24 * 3600)))
+MAX_MEMORY_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "1024"))
+MAX_DB_ROWS = int(os.getenv("ANALYSIS_CACHE_MAX_DB_ROWS", "100000"))
+# Numeric vitals are rounded to this many decimals so trivially different readings share a key.
+# One decimal keeps clinically distinct readings apart (37.6 vs 38.4 C would both round to 38).
+VITAL_PRECISION = int(os.getenv("ANALYSIS_CACHE_VITAL_PRECISION", "1"))
+PRUNE_EVERY_STORES = 500
+
+
+def _normalize_text(value: Any) -> str:
+    return " ".join(str(value or "").split()).lower()
+
+
+def _normalize_vital(value: Any) -> Any:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return round(float(value), VITAL_PRECISION)
+    if isinstance(value, str):
+        try:
+            return round(float(value), VITAL_PRECISION)
+        except ValueError:
+            return _normalize_text(value)
+    if isinstance(value, dict):
+        return {str(k).strip().lower(): _normalize_vital(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_normalize_vital(item) for item in value]
+    return value
+
+
+def normalize_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    symptoms = payload.get("symptoms") or []
+    return {
+        "symptoms": sorted({_normalize_text(symptom) for symptom in symptoms if _normalize_text(symptom)}),
+        "duration": _normalize_text(payload.get("duration")),
+        "severity": _normalize_text(payload.get("severity")),
+        "vitals": _normalize_vital(payload.get("vitals") or {}),
+        "notes": _normalize_text(payload.get("notes")),
+        "doctor_diagnosis": _normalize_text(payload.get("doctor_diagnosis")),
+    }
+
+
+def make_key(payload: Dict[str, Any], history_text: str, model: str, prompt_version: str) -> str:
+    # The model and prompt are part of the key, so changing either stops old answers being served.
+    canonical = json.dumps(
+        {"case": normalize_payload(payload), "history": history_text, "model": model, "prompt": prompt_version},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    def __init__(self, ttl_seconds: float = TTL_SECONDS, max_entries: int = MAX_MEMORY_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._memory_hits = 0
+        self._db_hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._errors = 0
+
+    def _remember(self, key: str, result: Dict[str, Any], expires_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (expires_at, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not ENABLED:
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, result = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._memory_hits += 1
+                    return copy.deepcopy(result)
+                del self._entries[key]
+
+        if DB_TIER_ENABLED:
+            try:
+                with get_connection() as conn:
+                    cur = conn.cursor()
+                    cur.execute(
+                        """
+                        SELECT result, EXTRACT(EPOCH FROM expires_at - NOW()) AS ttl
+                        FROM analysis_cache
+                        WHERE cache_key = %s AND expires_at > NOW()
+                        """,
+                        (key,),
+                    )
+                    row = cur.fetchone()
+            except Exception:
+                logger.exception("Analysis cache lookup failed")
+                with self._lock:
+                    self._errors += 1
+                row = None
+
+            if row:
+                self._remember(key, row["result"], now + float(row["ttl"]))
+                with self._lock:
+                    self._db_hits += 1
+                return copy.deepcopy(row["result"])
+
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        if not ENABLED:
+            return
+
+        self._remember(key, copy.deepcopy(result), time.time() + self.ttl_seconds)
+        with self._lock:
+            self._stores += 1
+            prune = self._stores % PRUNE_EVERY_STORES == 0
+
+        if not DB_TIER_ENABLED:
+            return
+        try:
+            with get_connection() as conn:
+                cur = conn.cursor()
+                cur.execute(
+                    """
+                    INSERT INTO analysis_cache (cache_key, result, expires_at)
+                    VALUES (%s, %s, NOW() + make_interval(secs => %s))
+                    ON CONFLICT (cache_key) DO UPDATE
+                    SET result = EXCLUDED.result, created_at = NOW(), expires_at = EXCLUDED.expires_at
+                    """,
+                    (key, Json(result), self.ttl_seconds),
+                )
+                if prune:
+                    self._prune(cur)
+                conn.commit()
+        except Exception:
+            logger.exception("Analysis cache store failed")
+            with self._lock:
+                self._errors += 1
+
+    def _prune(self, cur: Any) -> None:
+        cur.execute("DELETE FROM analysis_cache WHERE expires_at <= NOW()")
+        cur.execute(
+            """
+            DELETE FROM analysis_cache
+            WHERE cache_key IN (
+                SELECT cache_key FROM analysis_cache
+                ORDER BY created_at DESC
+                OFFSET %s
+            )
+            """,
+            (MAX_DB_ROWS,),
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._memory_hits + self._db_hits + self._misses
+            return {
+                "enabled": ENABLED,
+                "db_tier_enabled": DB_TIER_ENABLED,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "memory_hits": self._memory_hits,
+                "db_hits": self._db_hits,
+                "misses": self._misses,
+                "hit_rate": round((self._memory_hits + self._db_hits) / lookups, 4) if lookups else None,
+                "stores": self._stores,
+                "errors": self._errors,
+            }
+
+
+analysis_cache = AnalysisCache()
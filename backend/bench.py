@@ -0,0 +1,397 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import cohere
+
+import ai
+import fake_cohere
+import main
+import pdf_writer
+
+# Microbenchmarks for the CPU-bound helpers on the report and analysis paths. Fixtures
+# are synthetic and seeded, so two runs on the same machine see identical inputs.
+#
+#   python bench.py --output bench-baseline.json
+#   python bench.py --compare bench-baseline.json --threshold 0.15
+#   python bench.py --ai-client --filter cohere_chat
+#   python bench.py --legacy-extract --filter extract_json_object
+
+SIZES = {"small": 1, "typical": 50, "pathological": 5000}
+REPLY_PROSE_BYTES = {"small": 1_000, "typical": 100_000, "pathological": 1_000_000}
+FIXTURE_EPOCH = datetime(2025, 1, 1, 9, 0, 0)
+# (compression_level, object_streams); "plain" is the uncompressed PDF 1.4 output the
+# writer produced before compression was added.
+PDF_MODES = {"plain": (0, False), "flate1": (1, False), "flate6": (6, False), "flate6+objstm": (6, True)}
+
+SYMPTOMS = ["fever", "cough", "headache", "chest pain", "nausea", "fatigue", "dizziness", "shortness of breath"]
+CAUSES = ["Viral infection", "Community-acquired pneumonia", "Migraine", "Gastritis", "Anaemia", "Hypertension"]
+SPECIALTIES = ["Pulmonology", "Cardiology", "Neurology", "Gastroenterology", "Internal Medicine"]
+
+
+def _fixture_uuid(rng: random.Random) -> uuid.UUID:
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def _analysis_output(rng: random.Random, causes: int = 2) -> Dict[str, Any]:
+    return {
+        "probable_causes": [f"{rng.choice(CAUSES)} ({index})" for index in range(causes)],
+        "risk_level": rng.choice(["low", "medium", "high"]),
+        "specialist_recommendation": f"{rng.choice(SPECIALTIES)} review within 48 hours if symptoms persist.",
+        "summary": "Symptoms are consistent with a self-limiting illness; reassess if vitals deteriorate. " * 2,
+        "confidence_score": round(rng.uniform(0.4, 0.95), 2),
+        "deviation_percentage": rng.randint(0, 60),
+        "suggested_doctors": [
+            {"name": f"Dr. Fixture {index}", "specialty": rng.choice(SPECIALTIES), "reason": "Relevant specialty."}
+            for index in range(2)
+        ],
+    }
+
+
+def _report_rows(visits: int, seed: int = 7) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    # Rows in the shape REPORT_VISIT_COLUMNS returns them from psycopg2.
+    rng = random.Random(seed)
+    patient = {
+        "id": _fixture_uuid(rng),
+        "health_id": "CAX-a1b2c3",
+        "full_name": "Fixture Patient",
+        "phone": "+919800000000",
+        "age": 47,
+        "gender": "female",
+        "created_at": FIXTURE_EPOCH,
+    }
+    rows = []
+    for index in range(visits):
+        created_at = FIXTURE_EPOCH + timedelta(days=index)
+        analysis = _analysis_output(rng) if index % 5 else None
+        rows.append(
+            {
+                "visit_id": _fixture_uuid(rng),
+                "patient_id": patient["id"],
+                "visit_created_at": created_at,
+                "doctor_id": _fixture_uuid(rng),
+                "doctor_name": "Dr. Fixture",
+                "symptoms": rng.sample(SYMPTOMS, rng.randint(1, 4)),
+                "duration": f"{rng.randint(1, 14)} days",
+                "severity": rng.choice(["low", "medium", "high"]),
+                "vitals": {"pulse": rng.randint(55, 130), "spo2": rng.randint(88, 100), "temperature_c": 37.2},
+                "notes": "Patient reports intermittent symptoms, worse at night, partially relieved by rest. " * 3,
+                "doctor_diagnosis": rng.choice(CAUSES),
+                "ai_id": _fixture_uuid(rng) if analysis else None,
+                **(analysis or {}),
+                "ai_created_at": created_at + timedelta(minutes=5) if analysis else None,
+            }
+        )
+    return patient, rows
+
+
+def _history(entries: int, seed: int = 11) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    return [_analysis_output(rng) for _ in range(entries)]
+
+
+def _case_payload() -> Dict[str, Any]:
+    return {
+        "symptoms": ["fever", "cough", "shortness of breath"],
+        "duration": "4 days",
+        "severity": "medium",
+        "vitals": {"blood_pressure": {"systolic": 128, "diastolic": 82}, "pulse": 104, "spo2": 94, "temperature_c": 38.6},
+        "notes": "Productive cough, pleuritic chest discomfort on deep breaths, no recent travel. " * 4,
+        "doctor_diagnosis": "Lower respiratory tract infection",
+    }
+
+
+def _prompt_corpus(seed: int = 23) -> Dict[str, Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+    # Cases that push compile_analysis_prompt past its token budget in different ways.
+    rng = random.Random(seed)
+    base = _case_payload()
+    long_notes = {**base, "notes": base["notes"] * 200}
+    large_vitals = {
+        **base,
+        "vitals": {
+            **base["vitals"],
+            **{f"lab_{index:03d}": round(rng.uniform(0, 200), 2) for index in range(400)},
+            **{f"remark_{index:02d}": "Repeat reading after nebulisation, patient anxious. " * 4 for index in range(40)},
+            "ecg_trace": [rng.randint(-500, 1500) for _ in range(2000)],
+        },
+    }
+    long_history = [
+        {**entry, "probable_causes": [f"{rng.choice(CAUSES)} ({index})" for index in range(30)]} for entry in _history(200)
+    ]
+    return {
+        "baseline": (base, _history(3)),
+        "long_notes": (long_notes, _history(3)),
+        "large_vitals": (large_vitals, _history(3)),
+        "long_history": (base, long_history),
+        "all_oversized": ({**large_vitals, "notes": long_notes["notes"]}, long_history),
+    }
+
+
+def _model_reply(prose_bytes: int) -> str:
+    # Chatty reply: prose containing brace fragments that are not JSON, then a fenced answer.
+    prose = ('The {dose} depends on {"weight": kg} and on the renal panel. ' * (prose_bytes // 60 + 1))[:prose_bytes]
+    return f"{prose}\n```json\n{json.dumps(_analysis_output(random.Random(3)))}\n```"
+
+
+def _nested_reply(reply_bytes: int, depth: int = 200) -> str:
+    # A deeply nested draft with a trailing comma at its core, so the outer span and
+    # every span inside it are balanced but none parses, then the real answer.
+    filler = "x" * max(reply_bytes // depth - 24, 1)
+    draft = ('{"note": "%s", "next": ' % filler) * depth + "1," + "}" * depth
+    return f"{draft}\n```json\n{json.dumps(_analysis_output(random.Random(3)))}\n```"
+
+
+def _legacy_extract_json_object(text: str) -> Dict[str, Any]:
+    # The extractor as it was before the single-pass scan: a raw_decode of the remaining
+    # text at every "{". Kept so --legacy-extract and the fuzz tests can compare against it.
+    text = text.strip()
+    try:
+        parsed = json.loads(text)
+        if isinstance(parsed, dict):
+            return parsed
+    except json.JSONDecodeError:
+        pass
+
+    decoder = json.JSONDecoder()
+    for idx, char in enumerate(text):
+        if char != "{":
+            continue
+        try:
+            parsed, _ = decoder.raw_decode(text[idx:])
+            if isinstance(parsed, dict):
+                return parsed
+        except json.JSONDecodeError:
+            continue
+
+    raise ValueError("Model did not return a valid JSON object")
+
+
+def _extract_benchmarks(
+    extract: Callable[[str], Dict[str, Any]], suffix: str = ""
+) -> List[Tuple[str, Callable[[], Any]]]:
+    cases: List[Tuple[str, Callable[[], Any]]] = []
+    for label, reply_bytes in REPLY_PROSE_BYTES.items():
+        prose, nested = _model_reply(reply_bytes), _nested_reply(reply_bytes)
+        cases.append((f"extract_json_object[{label}{suffix}]", lambda t=prose: extract(t)))
+        cases.append((f"extract_json_object[{label},nested{suffix}]", lambda t=nested: extract(t)))
+    return cases
+
+
+def _benchmarks() -> List[Tuple[str, Callable[[], Any]]]:
+    # Each entry is (name, zero-argument callable); fixtures are built outside the callable.
+    cases: List[Tuple[str, Callable[[], Any]]] = []
+    for label, visits in SIZES.items():
+        patient, rows = _report_rows(visits)
+        report = main._shape_report_document(patient, rows, None, None)
+        lines = main._to_report_lines(report)
+        history = _history(visits)
+        payload = _case_payload()
+        output = _analysis_output(random.Random(5), causes=visits)
+
+        cases.extend(
+            [
+                (f"shape_report_document[{label}]", lambda p=patient, r=rows: main._shape_report_document(p, r, None, None)),
+                (f"to_report_lines[{label}]", lambda r=report: main._to_report_lines(r)),
+                (f"escape_pdf_text[{label}]", lambda ls=lines: [pdf_writer._escape_pdf_text(line) for line in ls]),
+                (f"build_pdf_from_lines[{label}]", lambda ls=lines: pdf_writer.build_pdf_from_lines(ls)),
+                *[
+                    (
+                        f"build_pdf_from_lines[{label},{mode}]",
+                        lambda ls=lines, level=level, objstm=objstm: pdf_writer.build_pdf_from_lines(ls, level, objstm),
+                    )
+                    for mode, (level, objstm) in PDF_MODES.items()
+                ],
+                (f"build_analysis_prompt[{label}]", lambda p=payload, h=history: ai.build_analysis_prompt(p, h)),
+                (f"validate_analysis_output[{label}]", lambda o=output: ai._validate_analysis_output(o)),
+            ]
+        )
+    cases.extend(_extract_benchmarks(ai._extract_json_object))
+    for label, (payload, history) in _prompt_corpus().items():
+        cases.append(
+            (f"compile_analysis_prompt[{label}]", lambda p=payload, h=history: ai.compile_analysis_prompt(p, h))
+        )
+    return cases
+
+
+def _ai_client_benchmarks(base_url: str) -> List[Tuple[str, Callable[[], Any]]]:
+    # One chat call against the in-process fake server. "fresh" builds a client per call,
+    # as analyze_case did before the pooled client; "pooled" leases the shared one.
+    messages = [{"role": "user", "content": "ping"}]
+    options = {"max_retries": 0}
+
+    def fresh() -> Any:
+        client = cohere.ClientV2(api_key="bench", base_url=base_url)
+        try:
+            return client.chat(model=ai.MODEL_NAME, messages=messages, request_options=options)
+        finally:
+            client._client_wrapper.httpx_client.httpx_client.close()
+
+    def pooled() -> Any:
+        with ai.lease_client() as client:
+            return client.chat(model=ai.MODEL_NAME, messages=messages, request_options=options)
+
+    return [("cohere_chat[fresh_client]", fresh), ("cohere_chat[pooled_client]", pooled)]
+
+
+def _time_callable(func: Callable[[], Any], repeat: int, min_seconds: float) -> Dict[str, Any]:
+    # Calibrate the loop count so each sample runs for at least min_seconds, then keep
+    # the per-call time of every sample.
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds or number >= 1_000_000:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(min_seconds / elapsed) + 1))
+
+    samples = [elapsed / number]
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat - 1):
+            started = time.perf_counter()
+            for _ in range(number):
+                func()
+            samples.append((time.perf_counter() - started) / number)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    return {
+        "calls_per_sample": number,
+        "samples": len(samples),
+        "min_seconds": min(samples),
+        "median_seconds": statistics.median(samples),
+    }
+
+
+def _peak_memory(func: Callable[[], Any]) -> Tuple[int, Any]:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        output = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak, output
+
+
+def run_benchmarks(
+    name_filter: Optional[str],
+    repeat: int,
+    min_seconds: float,
+    extra: Optional[List[Tuple[str, Callable[[], Any]]]] = None,
+) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for name, func in _benchmarks() + (extra or []):
+        if name_filter and name_filter not in name:
+            continue
+        timing = _time_callable(func, repeat, min_seconds)
+        timing["peak_bytes"], output = _peak_memory(func)
+        # Size of byte outputs such as PDFs, so compression settings can be compared.
+        if isinstance(output, bytes):
+            timing["output_bytes"] = len(output)
+        # Prompt size after trimming, so budget changes show up next to the timings.
+        if isinstance(output, dict) and {"system", "user"} <= set(output):
+            timing["estimated_tokens"] = ai._estimate_tokens(output["system"]) + ai._estimate_tokens(output["user"])
+        results[name] = timing
+        print(
+            f"{name:50} median={timing['median_seconds'] * 1000:10.3f}ms "
+            f"min={timing['min_seconds'] * 1000:10.3f}ms peak={timing['peak_bytes'] / 1024:10.1f}KiB"
+            + (f" output={timing['output_bytes'] / 1024:8.1f}KiB" if "output_bytes" in timing else "")
+            + (f" tokens={timing['estimated_tokens']}" if "estimated_tokens" in timing else ""),
+            file=sys.stderr,
+        )
+    return results
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    # Median time and peak memory are both checked; a benchmark missing from either
+    # side is reported but not counted as a regression.
+    regressions = []
+    for name, result in sorted(current.items()):
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"{name:50} new", file=sys.stderr)
+            continue
+        time_ratio = result["median_seconds"] / previous["median_seconds"] if previous["median_seconds"] else 1.0
+        memory_ratio = result["peak_bytes"] / previous["peak_bytes"] if previous["peak_bytes"] else 1.0
+        flags = []
+        if time_ratio > 1 + threshold:
+            flags.append("TIME")
+        if memory_ratio > 1 + threshold:
+            flags.append("MEMORY")
+        print(f"{name:50} time x{time_ratio:5.2f} memory x{memory_ratio:5.2f} {' '.join(flags)}", file=sys.stderr)
+        if flags:
+            regressions.append(name)
+    for name in sorted(set(baseline) - set(current)):
+        print(f"{name:50} missing", file=sys.stderr)
+    return regressions
+
+
+def run(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the backend's CPU-bound helpers.")
+    parser.add_argument("--filter", help="Only run benchmarks whose name contains this text.")
+    parser.add_argument("--repeat", type=int, default=7, help="Timing samples per benchmark.")
+    parser.add_argument("--min-sample-seconds", type=float, default=0.05)
+    parser.add_argument("--output", help="Write results to this JSON file.")
+    parser.add_argument("--compare", help="Baseline JSON file from an earlier --output run.")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed slowdown or growth, 0.10 = 10%%.")
+    parser.add_argument(
+        "--ai-client", action="store_true", help="Also time a Cohere chat call, fresh vs pooled client, on a local fake."
+    )
+    parser.add_argument(
+        "--legacy-extract", action="store_true", help="Also time the previous raw_decode JSON extractor on the same replies."
+    )
+    args = parser.parse_args(argv)
+
+    extra = _extract_benchmarks(_legacy_extract_json_object, ",legacy") if args.legacy_extract else []
+    if args.ai_client:
+        fake = fake_cohere.FakeCohere(fake_cohere.ModelProfile(fake_cohere.LatencyModel("fixed", 0)))
+        with fake_cohere.serve_in_thread(fake) as base_url:
+            ai.COHERE_BASE_URL = base_url
+            os.environ.setdefault("COHERE_API_KEY", "bench")
+            try:
+                results = run_benchmarks(
+                    args.filter, max(args.repeat, 1), args.min_sample_seconds, extra + _ai_client_benchmarks(base_url)
+                )
+            finally:
+                ai.close_client()
+    else:
+        results = run_benchmarks(args.filter, max(args.repeat, 1), args.min_sample_seconds, extra)
+    document = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "benchmarks": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(document, handle, indent=2, sort_keys=True)
+            handle.write("\n")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as handle:
+            baseline = json.load(handle)["benchmarks"]
+        if args.filter:
+            baseline = {name: result for name, result in baseline.items() if args.filter in name}
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold:.0%}: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
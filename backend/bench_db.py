@@ -0,0 +1,262 @@
+import argparse
+import json
+import statistics
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+import main
+import migrate
+
+# Benchmarks for the database-bound endpoints, run against a throwaway database that is
+# created on the given server, seeded deterministically and dropped afterwards.
+#
+#   python bench_db.py --database-admin-url postgresql://postgres@127.0.0.1/postgres search --rows 1000000
+#   python bench_db.py --database-admin-url postgresql://postgres@127.0.0.1/postgres report --visits 10 1000 10000
+
+FIRST_NAMES = [
+    "Aarav", "Aditi", "Akash", "Ananya", "Anand", "Arjun", "Bhavna", "Deepak", "Divya", "Farhan",
+    "Gauri", "Harish", "Isha", "Jaya", "Karan", "Kavya", "Lakshmi", "Manoj", "Meera", "Mohit",
+    "Neha", "Nikhil", "Pooja", "Pradeep", "Priya", "Rahul", "Rakesh", "Ritu", "Rohan", "Sanjay",
+    "Shreya", "Suresh", "Tanvi", "Uday", "Varun", "Vidya", "Vikram", "Yash", "Zara", "Zoya",
+]
+LAST_NAMES = [
+    "Agarwal", "Bhat", "Chopra", "Das", "Desai", "Gupta", "Iyer", "Jain", "Joshi", "Kapoor",
+    "Khan", "Kulkarni", "Kumar", "Menon", "Mehta", "Mishra", "Nair", "Pandey", "Patel", "Pillai",
+    "Rao", "Reddy", "Saxena", "Sen", "Shah", "Sharma", "Singh", "Sinha", "Srinivasan", "Verma",
+]
+
+# The query GET /patients/search ran before it was split into per-index branches.
+LEGACY_SEARCH_SQL = """
+    SELECT
+        id, health_id, full_name, phone,
+        CASE
+            WHEN health_id = %(term)s OR phone = %(term)s THEN 0
+            WHEN health_id LIKE %(raw_prefix)s OR phone LIKE %(raw_prefix)s THEN 1
+            WHEN lower(full_name) LIKE %(name_prefix)s THEN 2
+            ELSE 3
+        END AS match_rank,
+        similarity(full_name, %(term)s) AS score
+    FROM patients
+    WHERE health_id LIKE %(raw_prefix)s
+       OR phone LIKE %(raw_prefix)s
+       OR lower(full_name) LIKE %(name_prefix)s
+       OR full_name %% %(term)s
+    ORDER BY match_rank, score DESC, full_name
+    LIMIT %(limit)s
+"""
+
+
+@contextmanager
+def throwaway_database(admin_url: str, keep: bool = False) -> Iterator[Any]:
+    name = f"careaxis_bench_{uuid.uuid4().hex[:8]}"
+    admin = psycopg2.connect(admin_url)
+    admin.autocommit = True
+    admin.cursor().execute(f"CREATE DATABASE \"{name}\" TEMPLATE template0 ENCODING 'UTF8'")
+    conn = psycopg2.connect(admin_url, dbname=name, cursor_factory=RealDictCursor)
+    try:
+        migrate.apply_migrations(conn)
+        yield conn
+    finally:
+        conn.close()
+        if keep:
+            print(f"Kept database {name}", file=sys.stderr)
+        else:
+            admin.cursor().execute(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+        admin.close()
+
+
+def _analyze(conn: Any) -> None:
+    conn.commit()
+    conn.autocommit = True
+    conn.cursor().execute("VACUUM ANALYZE")
+    conn.autocommit = False
+
+
+def seed_patients(conn: Any, rows: int, seed: float = 0.42) -> None:
+    cur = conn.cursor()
+    cur.execute("SELECT setseed(%s)", (seed,))
+    cur.execute(
+        """
+        INSERT INTO patients (id, health_id, full_name, phone, age, gender, created_at)
+        SELECT gen_random_uuid(),
+               'CAX-' || lpad(to_hex(n), 6, '0'),
+               (%(first)s::text[])[1 + floor(random() * cardinality(%(first)s::text[]))::int]
+                   || ' ' || (%(last)s::text[])[1 + floor(random() * cardinality(%(last)s::text[]))::int],
+               '+91' || (6000000000 + floor(random() * 4000000000))::bigint,
+               1 + floor(random() * 95)::int,
+               CASE WHEN random() < 0.5 THEN 'female' ELSE 'male' END,
+               TIMESTAMP '2020-01-01' + n * INTERVAL '1 minute'
+        FROM generate_series(1, %(rows)s) AS n
+        """,
+        {"first": FIRST_NAMES, "last": LAST_NAMES, "rows": rows},
+    )
+    _analyze(conn)
+
+
+def _time_query(conn: Any, run: Callable[[Any], Any], repeat: int) -> Dict[str, Any]:
+    cur = conn.cursor()
+    run(cur)
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = run(cur)
+        samples.append(time.perf_counter() - started)
+    conn.rollback()
+    samples.sort()
+    return {
+        "rows": len(rows),
+        "p50_ms": round(statistics.median(samples) * 1000, 3),
+        "p95_ms": round(samples[min(int(0.95 * len(samples)), len(samples) - 1)] * 1000, 3),
+        "max_ms": round(samples[-1] * 1000, 3),
+    }
+
+
+def bench_search(conn: Any, args: argparse.Namespace) -> Dict[str, Any]:
+    started = time.perf_counter()
+    seed_patients(conn, args.rows)
+    print(f"Seeded {args.rows} patients in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    cur = conn.cursor()
+    cur.execute("SELECT health_id, phone, full_name FROM patients ORDER BY health_id LIMIT 1 OFFSET %s", (args.rows // 2,))
+    sample = cur.fetchone()
+    conn.rollback()
+
+    terms = [
+        "a", "pr", "pri", "priy", "Priya Sharma", "priya shrma", "Zoya Kulk",
+        sample["health_id"], "CAX-0", sample["phone"], sample["phone"][:7], sample["full_name"],
+    ]
+    results: Dict[str, Any] = {}
+    for term in terms:
+        sql, params = main._patient_search_query(term, args.limit)
+        current = _time_query(conn, lambda c: (c.execute(sql, params), c.fetchall())[1], args.repeat)
+        entry = {"current": current}
+        if args.legacy:
+            legacy = _time_query(conn, lambda c: (c.execute(LEGACY_SEARCH_SQL, params), c.fetchall())[1], args.repeat)
+            entry["legacy"] = legacy
+        results[term] = entry
+        print(
+            f"{term!r:24} p50={current['p50_ms']:8.3f}ms p95={current['p95_ms']:8.3f}ms rows={current['rows']}"
+            + (f"   legacy p50={entry['legacy']['p50_ms']:8.3f}ms" if args.legacy else ""),
+            file=sys.stderr,
+        )
+    return {"rows": args.rows, "limit": args.limit, "terms": results}
+
+
+def seed_report_patient(conn: Any, visits: int, seed: float = 0.42) -> str:
+    # One patient with `visits` fully populated visits, shaped like what POST /visits writes.
+    cur = conn.cursor()
+    cur.execute("SELECT setseed(%s)", (seed,))
+    cur.execute(
+        """
+        INSERT INTO users (id, full_name, email, password_hash, role)
+        VALUES (gen_random_uuid(), 'Dr. Bench', 'bench-' || gen_random_uuid() || '@example.test', 'x', 'doctor')
+        RETURNING id
+        """
+    )
+    doctor_id = cur.fetchone()["id"]
+    cur.execute(
+        """
+        INSERT INTO patients (id, health_id, full_name, phone, age, gender)
+        VALUES (gen_random_uuid(), 'CAX-R' || lpad(%s::text, 6, '0'), 'Report Bench', '+919800000000', 54, 'male')
+        RETURNING id
+        """,
+        (visits,),
+    )
+    patient_id = cur.fetchone()["id"]
+    cur.execute(
+        """
+        INSERT INTO visits (id, patient_id, doctor_id, created_at)
+        SELECT gen_random_uuid(), %s, %s, TIMESTAMP '2020-01-01' + n * INTERVAL '1 hour' + random() * INTERVAL '1 second'
+        FROM generate_series(1, %s) AS n
+        """,
+        (patient_id, doctor_id, visits),
+    )
+    cur.execute(
+        """
+        INSERT INTO clinical_inputs (id, visit_id, symptoms, duration, severity, vitals, notes, doctor_diagnosis)
+        SELECT gen_random_uuid(), v.id, '["fever", "cough", "fatigue"]', '3 days', 'moderate',
+               jsonb_build_object('temperature', 37 + round((random() * 3)::numeric, 1), 'pulse', 60 + floor(random() * 60)),
+               repeat('Patient reports intermittent symptoms. ', 5), 'Viral illness'
+        FROM visits v WHERE v.patient_id = %s
+        """,
+        (patient_id,),
+    )
+    cur.execute(
+        """
+        INSERT INTO ai_analysis (id, visit_id, probable_causes, risk_level, specialist_recommendation, summary,
+                                 confidence_score, deviation_percentage, suggested_doctors, created_at)
+        SELECT gen_random_uuid(), v.id, '["Viral infection", "Influenza"]', 'medium', 'General Medicine',
+               repeat('Likely self-limiting viral illness. ', 4), round(random()::numeric, 2),
+               round((random() * 100)::numeric, 2),
+               '[{"name": "Dr. Rao", "specialty": "General Medicine", "reason": "Fever with cough."}]',
+               v.created_at + INTERVAL '5 minutes'
+        FROM visits v WHERE v.patient_id = %s
+        """,
+        (patient_id,),
+    )
+    _analyze(conn)
+    return str(patient_id)
+
+
+def bench_report(conn: Any, args: argparse.Namespace) -> Dict[str, Any]:
+    # Both builders end in the bytes GET /reports/patients/{id} sends, so the Python path
+    # includes the json.dumps JSONResponse would do.
+    results: Dict[str, Any] = {}
+    for visits in args.visits:
+        patient_id = seed_report_patient(conn, visits)
+        payload = _time_query(
+            conn,
+            lambda c: [json.dumps(main._build_patient_report_payload(c.connection, patient_id, None, None)).encode()],
+            args.repeat,
+        )
+        in_db = _time_query(
+            conn,
+            lambda c: [main._build_patient_report_json(c.connection, patient_id, None, None).encode()],
+            args.repeat,
+        )
+        results[str(visits)] = {"payload": payload, "json_from_db": in_db}
+        print(
+            f"visits={visits:<6} payload p50={payload['p50_ms']:9.3f}ms p95={payload['p95_ms']:9.3f}ms"
+            f"   json-from-db p50={in_db['p50_ms']:9.3f}ms p95={in_db['p95_ms']:9.3f}ms",
+            file=sys.stderr,
+        )
+    return {"visits": results}
+
+
+def run(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark database-bound endpoints on seeded data.")
+    parser.add_argument("--database-admin-url", required=True, help="Postgres URL allowed to CREATE DATABASE.")
+    parser.add_argument("--keep-database", action="store_true")
+    parser.add_argument("--repeat", type=int, default=50, help="Timed runs per query.")
+    parser.add_argument("--output", help="Write results to this JSON file.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    search = commands.add_parser("search", help="GET /patients/search on a large patients table.")
+    search.add_argument("--rows", type=int, default=1_000_000)
+    search.add_argument("--limit", type=int, default=main.PATIENT_SEARCH_LIMIT_DEFAULT)
+    search.add_argument("--legacy", action="store_true", help="Also time the previous single-query search.")
+    search.set_defaults(bench=bench_search)
+
+    report = commands.add_parser("report", help="GET /reports/patients/{id}, Python payload vs REPORT_JSON_FROM_DB.")
+    report.add_argument("--visits", type=int, nargs="+", default=[10, 1_000, 10_000], help="Visits per patient.")
+    report.set_defaults(bench=bench_report)
+
+    args = parser.parse_args(argv)
+    with throwaway_database(args.database_admin_url, args.keep_database) as conn:
+        results = args.bench(conn, args)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump({"command": args.command, **results}, handle, indent=2, sort_keys=True)
+            handle.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -1,121 +1,232 @@
 import psycopg2
+from psycopg2 import extensions
 from psycopg2.extras import RealDictCursor
 import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, Optional, Tuple
 from dotenv import load_dotenv
 
+import migrate
+
 load_dotenv()
 
-def get_connection():
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN", "1"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX", "10"))
+POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Idle connections older than this are pinged with SELECT 1 before reuse.
+POOL_HEALTHCHECK_AFTER_SECONDS = float(os.getenv("DB_POOL_HEALTHCHECK_AFTER", "30"))
+# Web processes can leave DDL to `python migrate.py` by setting DB_AUTO_MIGRATE=false.
+AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "true").lower() in ("1", "true", "yes")
+# libpq sslmode; local databases without TLS (tests, load tests) set DB_SSLMODE=disable or prefer.
+SSLMODE = os.getenv("DB_SSLMODE", "require")
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def _connect():
     return psycopg2.connect(
         host=os.getenv("DB_HOST"),
         port=int(os.getenv("DB_PORT")),
         database=os.getenv("DB_NAME"),
         user=os.getenv("DB_USER"),
         password=os.getenv("DB_PASSWORD"),
-        sslmode="require",
+        sslmode=SSLMODE,
         cursor_factory=RealDictCursor
     )
 
 
-def ensure_schema():
-    conn = get_connection()
-    cur = conn.cursor()
+class ConnectionPool:
+    def __init__(self, min_size: int, max_size: int, timeout: float, healthcheck_after: float):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("Invalid pool bounds: require 0 <= min_size <= max_size and max_size >= 1")
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.healthcheck_after = healthcheck_after
+
+        self._idle: Deque[Tuple[Any, float]] = deque()
+        self._size = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._created = 0
+
+        for _ in range(min_size):
+            self._idle.append((_connect(), time.monotonic()))
+            self._size += 1
+            self._created += 1
+
+    def _discard(self, conn) -> None:
+        # Caller must hold self._cond.
+        self._size -= 1
+        self._discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, idle_since: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.healthcheck_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _reserve(self, deadline: float) -> Tuple[Optional[Any], float]:
+        # Returns an idle connection, or (None, 0) after reserving a slot for a new one.
+        with self._cond:
+            waited = False
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                if self._idle:
+                    return self._idle.pop()
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None, 0.0
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f"Timed out after {self.timeout}s waiting for a database connection"
+                    )
+                if not waited:
+                    self._waits += 1
+                    waited = True
+                self._cond.wait(remaining)
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            conn, idle_since = self._reserve(deadline)
+
+            # Connecting and pinging happen outside the lock so other threads are not blocked.
+            if conn is None:
+                try:
+                    conn = _connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._created += 1
+                    self._checkouts += 1
+                return conn
+
+            if self._is_healthy(conn, idle_since):
+                with self._cond:
+                    self._checkouts += 1
+                return conn
 
+            with self._cond:
+                self._discard(conn)
+                self._cond.notify()
+
+    def putconn(self, conn) -> None:
+        reusable = not conn.closed
+        if reusable:
+            try:
+                status = conn.info.transaction_status
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    reusable = False
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                reusable = False
+
+        with self._cond:
+            if self._closed or not reusable or len(self._idle) >= self.max_size:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._discard(conn)
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": idle,
+                "in_use": self._size - idle,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "created": self._created,
+                "discarded": self._discarded,
+            }
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    min_size=POOL_MIN_SIZE,
+                    max_size=POOL_MAX_SIZE,
+                    timeout=POOL_TIMEOUT_SECONDS,
+                    healthcheck_after=POOL_HEALTHCHECK_AFTER_SECONDS,
+                )
+    return _pool
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def pool_stats() -> Dict[str, Any]:
+    if _pool is None:
+        return {"initialized": False}
+    return {"initialized": True, **_pool.stats()}
+
+
+@contextmanager
+def get_connection() -> Iterator[Any]:
+    # Borrow a pooled connection; any open transaction is rolled back on return.
+    pool = get_pool()
+    conn = pool.getconn()
     try:
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                id UUID PRIMARY KEY,
-                full_name TEXT NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                role TEXT CHECK (role IN ('doctor')),
-                organization TEXT,
-                created_at TIMESTAMP DEFAULT NOW()
-            );
-            """
-        )
-
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS patients (
-                id UUID PRIMARY KEY,
-                health_id TEXT UNIQUE NOT NULL,
-                full_name TEXT,
-                phone TEXT,
-                age INTEGER,
-                gender TEXT,
-                created_at TIMESTAMP DEFAULT NOW()
-            );
-            """
-        )
-
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS visits (
-                id UUID PRIMARY KEY,
-                patient_id UUID REFERENCES patients(id) ON DELETE CASCADE,
-                doctor_id UUID REFERENCES users(id) ON DELETE SET NULL,
-                created_at TIMESTAMP DEFAULT NOW()
-            );
-            """
-        )
-
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS clinical_inputs (
-                id UUID PRIMARY KEY,
-                visit_id UUID REFERENCES visits(id) ON DELETE CASCADE,
-                symptoms JSONB,
-                duration TEXT,
-                severity TEXT,
-                vitals JSONB,
-                notes TEXT,
-                doctor_diagnosis TEXT,
-                created_at TIMESTAMP DEFAULT NOW()
-            );
-            """
-        )
-
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS ai_analysis (
-                id UUID PRIMARY KEY,
-                visit_id UUID REFERENCES visits(id) ON DELETE CASCADE,
-                probable_causes JSONB,
-                risk_level TEXT,
-                specialist_recommendation TEXT,
-                summary TEXT,
-                confidence_score NUMERIC(3,2),
-                deviation_percentage NUMERIC(5,2),
-                suggested_doctors JSONB,
-                created_at TIMESTAMP DEFAULT NOW()
-            );
-            """
-        )
-
-        # Backfill columns for environments where tables already existed.
-        cur.execute(
-            """
-            ALTER TABLE clinical_inputs
-            ADD COLUMN IF NOT EXISTS doctor_diagnosis TEXT;
-            """
-        )
-
-        cur.execute(
-            """
-            ALTER TABLE ai_analysis
-            ADD COLUMN IF NOT EXISTS deviation_percentage NUMERIC(5,2);
-            """
-        )
-
-        cur.execute(
-            """
-            ALTER TABLE ai_analysis
-            ADD COLUMN IF NOT EXISTS suggested_doctors JSONB;
-            """
-        )
-
-        conn.commit()
+        yield conn
     finally:
-        conn.close()
+        pool.putconn(conn)
+
+
+def ensure_schema():
+    with get_connection() as conn:
+        return migrate.ensure_current(conn, auto_migrate=AUTO_MIGRATE)
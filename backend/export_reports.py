@@ -0,0 +1,47 @@
+import argparse
+import sys
+from datetime import datetime
+from typing import List, Optional
+
+import main
+
+
+def _parse_date(value: str):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def run(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export PDF reports for every patient seen in a date range.")
+    parser.add_argument("--from-date", required=True, type=_parse_date, help="First visit day, YYYY-MM-DD.")
+    parser.add_argument("--to-date", required=True, type=_parse_date, help="Last visit day, YYYY-MM-DD.")
+    parser.add_argument("--output", required=True, help="Path of the ZIP archive to write.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=main.REPORT_EXPORT_WORKERS,
+        help="Rendering processes (defaults to the number of CPU cores).",
+    )
+    args = parser.parse_args(argv)
+
+    if args.from_date > args.to_date:
+        parser.error("--from-date must be on or before --to-date")
+
+    def print_progress(done: int, total: int) -> None:
+        print(f"\rRendered {done}/{total} reports", end="", file=sys.stderr, flush=True)
+
+    pool = main._new_export_pool(args.workers)
+    try:
+        with open(args.output, "wb") as handle:
+            for chunk in main._iter_bulk_report_zip(
+                args.from_date, args.to_date, on_progress=print_progress, workers=args.workers, pool=pool
+            ):
+                handle.write(chunk)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    print(f"\nWrote {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,319 @@
+import argparse
+import asyncio
+import json
+import math
+import random
+import socket
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# A local stand-in for the Cohere v2 chat endpoint, for load tests and routing
+# experiments that should not spend real quota. Point the backend at it with
+# COHERE_BASE_URL=http://127.0.0.1:<port> and any non-empty COHERE_API_KEY.
+
+DEFAULT_RESPONSE: Dict[str, Any] = {
+    "probable_causes": ["Viral upper respiratory infection", "Early community-acquired pneumonia"],
+    "risk_level": "medium",
+    "specialist_recommendation": "Pulmonology review if symptoms persist beyond 72 hours.",
+    "summary": "Febrile respiratory illness without red-flag vitals; supportive care and reassessment.",
+    "confidence_score": 0.72,
+    "deviation_percentage": 12,
+    "suggested_doctors": [
+        {"name": "Dr. Asha Menon", "specialty": "Pulmonology", "reason": "Persistent cough with fever."},
+        {"name": "Dr. Rahul Iyer", "specialty": "Internal Medicine", "reason": "Follow-up of systemic symptoms."},
+    ],
+}
+
+# Returned when a model profile decides to produce output that fails validation.
+INVALID_RESPONSE: Dict[str, Any] = {
+    "probable_causes": "Viral infection",
+    "risk_level": "medium",
+    "summary": "Incomplete answer.",
+}
+
+ERROR_MESSAGES = {
+    429: "You are using a Trial key, which is limited to 10 API calls / minute.",
+    500: "internal server error, this has been reported to our developers",
+    503: "service unavailable",
+}
+
+
+class LatencyModel:
+    def __init__(self, distribution: str, median_ms: float, sigma: float = 0.5, max_ms: Optional[float] = None):
+        if distribution not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        self.distribution = distribution
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.max_ms = max_ms
+
+    def sample(self, rng: random.Random) -> float:
+        if self.distribution == "fixed":
+            value = self.median_ms
+        elif self.distribution == "uniform":
+            value = rng.uniform(0, 2 * self.median_ms)
+        else:
+            value = self.median_ms * math.exp(self.sigma * rng.gauss(0, 1))
+        if self.max_ms is not None:
+            value = min(value, self.max_ms)
+        return max(value, 0.0) / 1000.0
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "distribution": self.distribution,
+            "median_ms": self.median_ms,
+            "sigma": self.sigma,
+            "max_ms": self.max_ms,
+        }
+
+
+class ModelProfile:
+    def __init__(self, latency: LatencyModel, invalid_rate: float = 0.0):
+        self.latency = latency
+        self.invalid_rate = invalid_rate
+
+
+class FakeCohere:
+    def __init__(
+        self,
+        default_profile: ModelProfile,
+        profiles: Optional[Dict[str, ModelProfile]] = None,
+        error_rate: float = 0.0,
+        error_statuses: Tuple[int, ...] = (429, 500, 503),
+        responses: Optional[List[Any]] = None,
+        stream_chunk_chars: int = 24,
+        seed: Optional[int] = None,
+    ):
+        self.default_profile = default_profile
+        self.profiles = profiles or {}
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.responses = responses or [DEFAULT_RESPONSE]
+        self.stream_chunk_chars = max(stream_chunk_chars, 1)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._scripted: Deque[Tuple[Optional[float], Optional[int]]] = deque()
+
+    def _count(self, model: str, key: str) -> None:
+        counters = self._stats.setdefault(model, {"requests": 0, "errors": 0, "invalid": 0, "streams": 0})
+        counters[key] += 1
+
+    def inject(self, count: int = 1, status: Optional[int] = None, delay_seconds: Optional[float] = None) -> None:
+        # Scripts the next `count` requests: a fixed delay, an error status, or both. Scripted
+        # requests bypass the random error rate, so tests get exact sequences.
+        with self._lock:
+            self._scripted.extend([(delay_seconds, status)] * count)
+
+    def next_reply(self, model: str, stream: bool) -> Tuple[float, Optional[int], str]:
+        # Returns (delay seconds, error status or None, reply text).
+        profile = self.profiles.get(model, self.default_profile)
+        with self._lock:
+            self._count(model, "requests")
+            if stream:
+                self._count(model, "streams")
+            delay = profile.latency.sample(self._rng)
+            if self._scripted:
+                scripted_delay, scripted_status = self._scripted.popleft()
+                delay = delay if scripted_delay is None else scripted_delay
+                if scripted_status is not None:
+                    self._count(model, "errors")
+                    return delay, scripted_status, ""
+            elif self.error_rate and self._rng.random() < self.error_rate:
+                self._count(model, "errors")
+                return delay, self._rng.choice(self.error_statuses), ""
+            if profile.invalid_rate and self._rng.random() < profile.invalid_rate:
+                self._count(model, "invalid")
+                return delay, None, json.dumps(INVALID_RESPONSE)
+            reply = self._rng.choice(self.responses)
+        return delay, None, reply if isinstance(reply, str) else json.dumps(reply)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            per_model = {model: dict(counters) for model, counters in self._stats.items()}
+        return {
+            "models": per_model,
+            "error_rate": self.error_rate,
+            "default_latency": self.default_profile.latency.describe(),
+            "profiles": {
+                name: {**profile.latency.describe(), "invalid_rate": profile.invalid_rate}
+                for name, profile in self.profiles.items()
+            },
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+            self._scripted.clear()
+
+
+def _usage(body: Dict[str, Any], text: str) -> Dict[str, Any]:
+    prompt_chars = sum(len(str(message.get("content", ""))) for message in body.get("messages") or [])
+    input_tokens = prompt_chars // 4
+    output_tokens = len(text) // 4
+    return {
+        "billed_units": {"input_tokens": input_tokens, "output_tokens": output_tokens},
+        "tokens": {"input_tokens": input_tokens, "output_tokens": output_tokens},
+    }
+
+
+def _sse(event: Dict[str, Any]) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def _stream_events(
+    message_id: str, text: str, delay: float, chunk_chars: int, usage: Dict[str, Any]
+) -> AsyncIterator[str]:
+    chunks = [text[index:index + chunk_chars] for index in range(0, len(text), chunk_chars)] or [""]
+    # Half of the latency goes to time-to-first-token, the rest is spread across chunks.
+    await asyncio.sleep(delay / 2)
+    yield _sse(
+        {
+            "type": "message-start",
+            "id": message_id,
+            "delta": {"message": {"role": "assistant", "content": [], "tool_plan": "", "tool_calls": [], "citations": []}},
+        }
+    )
+    yield _sse({"type": "content-start", "index": 0, "delta": {"message": {"content": {"type": "text", "text": ""}}}})
+    per_chunk = delay / 2 / len(chunks)
+    for chunk in chunks:
+        yield _sse({"type": "content-delta", "index": 0, "delta": {"message": {"content": {"text": chunk}}}})
+        if per_chunk:
+            await asyncio.sleep(per_chunk)
+    yield _sse({"type": "content-end", "index": 0})
+    yield _sse({"type": "message-end", "delta": {"finish_reason": "COMPLETE", "usage": usage}})
+
+
+def create_app(fake: FakeCohere) -> FastAPI:
+    app = FastAPI(title="Fake Cohere")
+
+    @app.post("/v2/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        model = str(body.get("model") or "")
+        stream = bool(body.get("stream"))
+        delay, error_status, text = fake.next_reply(model, stream)
+
+        if error_status is not None:
+            await asyncio.sleep(delay / 4)
+            return JSONResponse(status_code=error_status, content={"message": ERROR_MESSAGES.get(error_status, "error")})
+
+        message_id = str(uuid.uuid4())
+        usage = _usage(body, text)
+        if stream:
+            return StreamingResponse(
+                _stream_events(message_id, text, delay, fake.stream_chunk_chars, usage),
+                media_type="text/event-stream",
+            )
+
+        await asyncio.sleep(delay)
+        return {
+            "id": message_id,
+            "finish_reason": "COMPLETE",
+            "message": {"role": "assistant", "content": [{"type": "text", "text": text}]},
+            "usage": usage,
+        }
+
+    @app.get("/stats")
+    def stats():
+        return fake.stats()
+
+    @app.post("/stats/reset")
+    def reset_stats():
+        fake.reset()
+        return {"reset": True}
+
+    return app
+
+
+@contextmanager
+def serve_in_thread(fake: FakeCohere, host: str = "127.0.0.1") -> Iterator[str]:
+    # Serves the fake on an ephemeral port inside this process, for tests and benchmarks.
+    # Yields the base URL to use as COHERE_BASE_URL.
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    # Accepted sockets inherit TCP_NODELAY; without it small keep-alive replies wait on delayed ACKs.
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.bind((host, 0))
+    server = uvicorn.Server(uvicorn.Config(create_app(fake), log_level="warning"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    try:
+        deadline = time.monotonic() + 10
+        while not server.started:
+            if not thread.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError("fake Cohere server did not start")
+            time.sleep(0.01)
+        yield f"http://{host}:{sock.getsockname()[1]}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+        sock.close()
+
+
+def _parse_profile(value: str, distribution: str, sigma: float, max_ms: Optional[float]) -> Tuple[str, ModelProfile]:
+    # NAME=MEDIAN_MS or NAME=MEDIAN_MS:INVALID_RATE
+    try:
+        name, spec = value.split("=", 1)
+        median, _, invalid = spec.partition(":")
+        return name, ModelProfile(
+            LatencyModel(distribution, float(median), sigma, max_ms), float(invalid) if invalid else 0.0
+        )
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(f"Invalid --model profile {value!r}: {exc}") from exc
+
+
+def _load_responses(path: str) -> List[Any]:
+    with open(path, "r", encoding="utf-8") as handle:
+        data = json.load(handle)
+    if not isinstance(data, list) or not data:
+        raise ValueError(f"{path} must contain a non-empty JSON array of objects or raw reply strings")
+    return data
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Serve a fake Cohere v2 chat endpoint for local load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", choices=("fixed", "uniform", "lognormal"), default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="Median reply latency.")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Spread of the lognormal distribution.")
+    parser.add_argument("--latency-max-ms", type=float, default=None, help="Upper bound on any sampled latency.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls answered with an error.")
+    parser.add_argument("--error-statuses", default="429,500,503", help="Comma-separated statuses to pick from.")
+    parser.add_argument(
+        "--model",
+        action="append",
+        default=[],
+        metavar="NAME=MEDIAN_MS[:INVALID_RATE]",
+        help="Per-model latency and rate of replies that fail validation (repeatable).",
+    )
+    parser.add_argument("--responses", help="JSON array of canned replies (objects or raw text).")
+    parser.add_argument("--stream-chunk-chars", type=int, default=24)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    profiles = dict(_parse_profile(value, args.latency, args.latency_sigma, args.latency_max_ms) for value in args.model)
+    fake = FakeCohere(
+        default_profile=ModelProfile(LatencyModel(args.latency, args.latency_ms, args.latency_sigma, args.latency_max_ms)),
+        profiles=profiles,
+        error_rate=args.error_rate,
+        error_statuses=tuple(int(status) for status in args.error_statuses.split(",") if status.strip()),
+        responses=_load_responses(args.responses) if args.responses else None,
+        stream_chunk_chars=args.stream_chunk_chars,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(fake), host=args.host, port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
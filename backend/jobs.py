@@ -0,0 +1,253 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from psycopg2.extras import Json
+
+from db import get_connection
+
+logger = logging.getLogger(__name__)
+
+WORKERS = int(os.getenv("ANALYSIS_WORKERS", "4"))
+MAX_ATTEMPTS = int(os.getenv("ANALYSIS_JOB_MAX_ATTEMPTS", "3"))
+POLL_INTERVAL_SECONDS = float(os.getenv("ANALYSIS_JOB_POLL_INTERVAL", "2"))
+RETRY_DELAY_SECONDS = float(os.getenv("ANALYSIS_JOB_RETRY_DELAY", "10"))
+# Running jobs older than this are assumed orphaned by a crashed process and re-queued.
+STALE_AFTER_SECONDS = float(os.getenv("ANALYSIS_JOB_STALE_AFTER", "300"))
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+def enqueue(conn: Any, job_id: str, visit_id: str, patient_id: str, payload: Dict[str, Any]) -> None:
+    # Runs inside the caller's transaction so the job commits together with the visit.
+    cur = conn.cursor()
+    cur.execute(
+        """
+        INSERT INTO analysis_jobs (id, visit_id, patient_id, payload)
+        VALUES (%s, %s, %s, %s)
+        """,
+        (job_id, visit_id, patient_id, Json(payload)),
+    )
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT id, visit_id, patient_id, status, attempts, result, error,
+                   created_at, started_at, finished_at
+            FROM analysis_jobs
+            WHERE id = %s
+            """,
+            (job_id,),
+        )
+        return cur.fetchone()
+
+
+class AnalysisJobRunner:
+    def __init__(
+        self,
+        run_job: Callable[[Dict[str, Any]], Dict[str, Any]],
+        save_result: Callable[[Any, Dict[str, Any], Dict[str, Any]], None],
+        on_failure: Callable[[Dict[str, Any], str], None],
+        workers: int = WORKERS,
+    ):
+        self.run_job = run_job
+        self.save_result = save_result
+        self.on_failure = on_failure
+        self.workers = workers
+        self._slots = threading.Semaphore(max(workers, 1))
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._dispatcher: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.workers <= 0 or self._dispatcher is not None:
+            return
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="analysis-job")
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="analysis-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+            self._dispatcher = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    def run_forever(self) -> None:
+        self.start()
+        try:
+            while self._dispatcher is not None and self._dispatcher.is_alive():
+                self._dispatcher.join(timeout=1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def _requeue_stale(self) -> None:
+        # The claim already counted the orphaned attempt, so a job that has used its last
+        # attempt is failed here the same way _record_failure fails it, not run again.
+        error = f"Analysis job was still running after {STALE_AFTER_SECONDS:g}s; the worker was lost."
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                UPDATE analysis_jobs
+                SET status = 'failed', error = %s, finished_at = NOW()
+                WHERE status = 'running'
+                  AND started_at < NOW() - make_interval(secs => %s)
+                  AND attempts >= %s
+                RETURNING id, visit_id, patient_id, attempts
+                """,
+                (error, STALE_AFTER_SECONDS, MAX_ATTEMPTS),
+            )
+            failed = cur.fetchall()
+            cur.execute(
+                """
+                UPDATE analysis_jobs
+                SET status = 'pending', available_at = NOW()
+                WHERE status = 'running'
+                  AND started_at < NOW() - make_interval(secs => %s)
+                """,
+                (STALE_AFTER_SECONDS,),
+            )
+            if cur.rowcount:
+                logger.warning("Re-queued %d stale analysis jobs", cur.rowcount)
+            conn.commit()
+
+        for job in failed:
+            logger.warning("Analysis job %s lost its worker on attempt %d; giving up", job["id"], job["attempts"])
+            self.on_failure(job, error)
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                UPDATE analysis_jobs
+                SET status = 'running', attempts = attempts + 1, started_at = NOW()
+                WHERE id = (
+                    SELECT id
+                    FROM analysis_jobs
+                    WHERE status = 'pending' AND available_at <= NOW()
+                    ORDER BY available_at
+                    FOR UPDATE SKIP LOCKED
+                    LIMIT 1
+                )
+                RETURNING id, visit_id, patient_id, payload, attempts
+                """
+            )
+            job = cur.fetchone()
+            conn.commit()
+            return job
+
+    def _dispatch_loop(self) -> None:
+        next_stale_check = 0.0
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if now >= next_stale_check:
+                next_stale_check = now + STALE_AFTER_SECONDS / 2
+                try:
+                    self._requeue_stale()
+                except Exception:
+                    logger.exception("Analysis job dispatcher failed to re-queue stale jobs")
+
+            if not self._slots.acquire(timeout=POLL_INTERVAL_SECONDS):
+                continue
+            # From here the slot is ours until a job takes it over or it is released.
+            try:
+                job = self._claim()
+            except Exception:
+                self._slots.release()
+                logger.exception("Analysis job dispatcher failed to claim work")
+                self._stop.wait(POLL_INTERVAL_SECONDS)
+                continue
+
+            if job is None:
+                self._slots.release()
+                self._wake.wait(POLL_INTERVAL_SECONDS)
+                self._wake.clear()
+                continue
+
+            try:
+                self._executor.submit(self._run, job)
+            except Exception:
+                # The executor is shutting down; the claimed job is re-queued once it goes stale.
+                self._slots.release()
+                logger.exception("Analysis job dispatcher could not start job %s", job.get("id"))
+
+    def _run(self, job: Dict[str, Any]) -> None:
+        try:
+            try:
+                result = self.run_job(job)
+            except Exception as exc:
+                self._record_failure(job, str(exc))
+                return
+
+            save_error = None
+            with get_connection() as conn:
+                try:
+                    self.save_result(conn, job, result)
+                    cur = conn.cursor()
+                    cur.execute(
+                        """
+                        UPDATE analysis_jobs
+                        SET status = 'completed', result = %s, error = NULL, finished_at = NOW()
+                        WHERE id = %s
+                        """,
+                        (Json(result), str(job["id"])),
+                    )
+                    conn.commit()
+                except Exception as exc:
+                    conn.rollback()
+                    save_error = f"Could not save analysis: {exc}"
+
+            if save_error:
+                self._record_failure(job, save_error)
+        except Exception:
+            logger.exception("Analysis job %s crashed", job.get("id"))
+        finally:
+            self._slots.release()
+
+    def _record_failure(self, job: Dict[str, Any], error: str) -> None:
+        final = job["attempts"] >= MAX_ATTEMPTS
+        with get_connection() as conn:
+            cur = conn.cursor()
+            if final:
+                cur.execute(
+                    """
+                    UPDATE analysis_jobs
+                    SET status = 'failed', error = %s, finished_at = NOW()
+                    WHERE id = %s
+                    """,
+                    (error[:1000], str(job["id"])),
+                )
+            else:
+                cur.execute(
+                    """
+                    UPDATE analysis_jobs
+                    SET status = 'pending', error = %s,
+                        available_at = NOW() + make_interval(secs => %s)
+                    WHERE id = %s
+                    """,
+                    (error[:1000], RETRY_DELAY_SECONDS * job["attempts"], str(job["id"])),
+                )
+            conn.commit()
+
+        if final:
+            self.on_failure(job, error)
+        else:
+            logger.warning("Analysis job %s attempt %d failed: %s", job["id"], job["attempts"], error)
@@ -0,0 +1,353 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+import psycopg2
+
+# End-to-end load test: register/login, patient creation, visit analysis and report
+# downloads against a running API. With --database-admin-url it starts the whole stack
+# itself: a throwaway database, the fake Cohere server and the API, and tears them down
+# afterwards. Per-endpoint results are written as JSON so runs can be diffed.
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SYMPTOM_SETS = [
+    ["fever", "cough"],
+    ["headache", "nausea"],
+    ["chest pain", "shortness of breath"],
+    ["abdominal pain"],
+    ["fatigue", "dizziness", "palpitations"],
+]
+SEVERITIES = ["low", "medium", "high", "critical"]
+
+
+class _Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples: Dict[str, List[float]] = {}
+        self._statuses: Dict[str, Counter] = {}
+
+    def record(self, name: str, seconds: float, status: str) -> None:
+        with self._lock:
+            self._samples.setdefault(name, []).append(seconds)
+            self._statuses.setdefault(name, Counter())[status] += 1
+
+    def summary(self, wall_seconds: float) -> Dict[str, Any]:
+        with self._lock:
+            names = sorted(self._samples)
+            result = {}
+            for name in names:
+                samples = sorted(self._samples[name])
+                statuses = self._statuses[name]
+                errors = sum(count for status, count in statuses.items() if not status.startswith("2"))
+                result[name] = {
+                    "requests": len(samples),
+                    "errors": errors,
+                    "rps": round(len(samples) / wall_seconds, 3) if wall_seconds else None,
+                    "p50_ms": _percentile_ms(samples, 0.50),
+                    "p95_ms": _percentile_ms(samples, 0.95),
+                    "p99_ms": _percentile_ms(samples, 0.99),
+                    "mean_ms": round(sum(samples) / len(samples) * 1000, 2),
+                    "max_ms": round(samples[-1] * 1000, 2),
+                    "statuses": dict(sorted(statuses.items())),
+                }
+            return result
+
+
+def _percentile_ms(sorted_samples: List[float], q: float) -> Optional[float]:
+    if not sorted_samples:
+        return None
+    rank = max(int(round(q * len(sorted_samples) + 0.5)) - 1, 0)
+    return round(sorted_samples[min(rank, len(sorted_samples) - 1)] * 1000, 2)
+
+
+def _timed(
+    recorder: _Recorder, name: str, send: Callable[[], httpx.Response]
+) -> Optional[httpx.Response]:
+    started = time.perf_counter()
+    try:
+        response = send()
+    except httpx.HTTPError as exc:
+        recorder.record(name, time.perf_counter() - started, type(exc).__name__)
+        return None
+    recorder.record(name, time.perf_counter() - started, str(response.status_code))
+    return response
+
+
+def _visit_payload(rng: random.Random, patient_id: str, doctor_id: str, unique: str) -> Dict[str, Any]:
+    return {
+        "patient_id": patient_id,
+        "doctor_id": doctor_id,
+        "symptoms": rng.choice(SYMPTOM_SETS),
+        "duration": f"{rng.randint(1, 14)} days",
+        "severity": rng.choice(SEVERITIES),
+        "vitals": {
+            "blood_pressure": {"systolic": rng.randint(85, 170), "diastolic": rng.randint(55, 105)},
+            "pulse": rng.randint(55, 135),
+            "spo2": rng.randint(88, 100),
+            "temperature_c": round(rng.uniform(36.0, 40.0), 1),
+            "weight_kg": rng.randint(45, 110),
+        },
+        # Unique per request so the analysis cache and single-flight do not absorb the load.
+        "notes": f"Load test visit {unique}",
+        "doctor_diagnosis": "Viral illness",
+    }
+
+
+def _virtual_user(
+    client: httpx.Client,
+    recorder: _Recorder,
+    run_id: str,
+    index: int,
+    iterations: int,
+    deadline: float,
+    reports: bool,
+) -> None:
+    rng = random.Random(f"{run_id}-{index}")
+    email = f"load-{run_id}-{index}@example.test"
+    password = f"load-{run_id}"
+
+    _timed(
+        recorder,
+        "POST /auth/register",
+        lambda: client.post(
+            "/auth/register",
+            json={"full_name": f"Load User {index}", "email": email, "password": password, "organization": "Load"},
+        ),
+    )
+    login = _timed(recorder, "POST /auth/login", lambda: client.post("/auth/login", json={"email": email, "password": password}))
+    if login is None or login.status_code != 200:
+        return
+    doctor_id = login.json()["user"]["id"]
+
+    iteration = 0
+    while (iterations <= 0 or iteration < iterations) and time.monotonic() < deadline:
+        iteration += 1
+        created = _timed(
+            recorder,
+            "POST /patients",
+            lambda: client.post(
+                "/patients",
+                json={
+                    "full_name": f"Load Patient {index}-{iteration}",
+                    "phone": f"+91{rng.randint(6000000000, 9999999999)}",
+                    "age": rng.randint(1, 95),
+                    "gender": rng.choice(["female", "male"]),
+                },
+            ),
+        )
+        if created is None or created.status_code != 200:
+            continue
+        patient_id = created.json()["patient_id"]
+
+        payload = _visit_payload(rng, patient_id, doctor_id, f"{run_id}-{index}-{iteration}")
+        _timed(recorder, "POST /visits/analyze", lambda: client.post("/visits/analyze", json=payload))
+
+        if reports:
+            _timed(recorder, "GET /reports/patients/{id}", lambda: client.get(f"/reports/patients/{patient_id}"))
+            _timed(recorder, "GET /reports/patients/{id}/pdf", lambda: client.get(f"/reports/patients/{patient_id}/pdf"))
+
+
+def _wait_until_ready(url: str, timeout: float, process: Optional[subprocess.Popen] = None) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Process for {url} exited with code {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready within {timeout}s")
+
+
+def _admin_connect(admin_url: str):
+    conn = psycopg2.connect(admin_url)
+    conn.autocommit = True
+    return conn
+
+
+def _create_database(admin_url: str, name: str) -> Dict[str, str]:
+    conn = _admin_connect(admin_url)
+    try:
+        conn.cursor().execute(f'CREATE DATABASE "{name}"')
+        params = conn.get_dsn_parameters()
+        password = conn.info.password
+    finally:
+        conn.close()
+    return {
+        "DB_HOST": params.get("host") or "localhost",
+        "DB_PORT": params.get("port") or "5432",
+        "DB_NAME": name,
+        "DB_USER": params.get("user") or "",
+        "DB_PASSWORD": password or "",
+        # Connect the way the admin connection did, so a local server without TLS works.
+        "DB_SSLMODE": params.get("sslmode") or "prefer",
+    }
+
+
+def _drop_database(admin_url: str, name: str) -> None:
+    conn = _admin_connect(admin_url)
+    try:
+        conn.cursor().execute(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+    finally:
+        conn.close()
+
+
+def _stop(process: Optional[subprocess.Popen]) -> None:
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def _fetch_json(url: str) -> Optional[Dict[str, Any]]:
+    try:
+        response = httpx.get(url, timeout=5.0)
+        return response.json() if response.status_code == 200 else None
+    except (httpx.HTTPError, ValueError):
+        return None
+
+
+def run(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the CareAxis end-to-end load test.")
+    parser.add_argument("--base-url", help="Test an already running API instead of starting one.")
+    parser.add_argument(
+        "--database-admin-url",
+        default=os.getenv("LOADTEST_DATABASE_ADMIN_URL"),
+        help="Postgres URL allowed to CREATE DATABASE; a throwaway database is created on it.",
+    )
+    parser.add_argument("--keep-database", action="store_true", help="Do not drop the throwaway database.")
+    parser.add_argument("--cohere-base-url", help="Use this Cohere endpoint instead of starting the fake server.")
+    parser.add_argument("--api-port", type=int, default=8200)
+    parser.add_argument("--api-workers", type=int, default=1)
+    parser.add_argument("--fake-port", type=int, default=8100)
+    parser.add_argument(
+        "--fake-arg",
+        action="append",
+        default=[],
+        help="Extra argument passed to fake_cohere.py, e.g. --fake-arg=--latency-ms=400 (repeatable).",
+    )
+    parser.add_argument("--users", type=int, default=10, help="Concurrent virtual users.")
+    parser.add_argument("--iterations", type=int, default=20, help="Visits per user; 0 runs until --duration.")
+    parser.add_argument("--duration", type=float, default=300.0, help="Upper bound on the run, in seconds.")
+    parser.add_argument("--no-reports", action="store_true", help="Skip the report JSON and PDF downloads.")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request client timeout.")
+    parser.add_argument("--label", default="", help="Free-form label stored in the results, e.g. a release tag.")
+    parser.add_argument("--output", default="loadtest-results.json")
+    args = parser.parse_args(argv)
+
+    if not args.base_url and not args.database_admin_url:
+        parser.error("either --base-url or --database-admin-url is required")
+
+    run_id = uuid.uuid4().hex[:8]
+    processes: List[subprocess.Popen] = []
+    database_name: Optional[str] = None
+    base_url = args.base_url
+    fake_url = args.cohere_base_url
+
+    try:
+        if not base_url:
+            env = dict(os.environ)
+            if not fake_url:
+                fake_url = f"http://127.0.0.1:{args.fake_port}"
+                fake = subprocess.Popen(
+                    [sys.executable, os.path.join(BACKEND_DIR, "fake_cohere.py"), "--port", str(args.fake_port), *args.fake_arg],
+                    cwd=BACKEND_DIR,
+                )
+                processes.append(fake)
+                _wait_until_ready(f"{fake_url}/stats", 30, fake)
+
+            database_name = f"careaxis_loadtest_{run_id}"
+            env.update(_create_database(args.database_admin_url, database_name))
+            env.update(
+                {
+                    "COHERE_BASE_URL": fake_url,
+                    "COHERE_API_KEY": env.get("COHERE_API_KEY") or "loadtest",
+                    "JWT_SECRET": env.get("JWT_SECRET") or "loadtest",
+                    "DB_AUTO_MIGRATE": "true",
+                }
+            )
+            base_url = f"http://127.0.0.1:{args.api_port}"
+            api = subprocess.Popen(
+                [
+                    sys.executable, "-m", "uvicorn", "main:app",
+                    "--port", str(args.api_port),
+                    "--workers", str(args.api_workers),
+                    "--log-level", "warning",
+                ],
+                cwd=BACKEND_DIR,
+                env=env,
+            )
+            processes.append(api)
+            _wait_until_ready(f"{base_url}/", 60, api)
+
+        recorder = _Recorder()
+        limits = httpx.Limits(max_connections=args.users * 2, max_keepalive_connections=args.users * 2)
+        with httpx.Client(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+            started = time.monotonic()
+            deadline = started + args.duration
+            threads = [
+                threading.Thread(
+                    target=_virtual_user,
+                    args=(client, recorder, run_id, index, args.iterations, deadline, not args.no_reports),
+                    daemon=True,
+                )
+                for index in range(args.users)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            wall_seconds = time.monotonic() - started
+
+        results = {
+            "label": args.label,
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "config": {
+                "users": args.users,
+                "iterations": args.iterations,
+                "duration_limit_seconds": args.duration,
+                "reports": not args.no_reports,
+                "api_workers": args.api_workers,
+                "fake_args": args.fake_arg,
+            },
+            "wall_seconds": round(wall_seconds, 3),
+            "endpoints": recorder.summary(wall_seconds),
+            "ai_client": _fetch_json(f"{base_url}/health/ai-client"),
+            "fake_cohere": _fetch_json(f"{fake_url}/stats") if fake_url else None,
+        }
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2, sort_keys=True)
+            handle.write("\n")
+
+        for name, stats in results["endpoints"].items():
+            print(
+                f"{name:32} n={stats['requests']:<6} err={stats['errors']:<4} rps={stats['rps']:<8} "
+                f"p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms p99={stats['p99_ms']}ms"
+            )
+        print(f"Wrote {args.output}")
+        return 0
+    finally:
+        for process in reversed(processes):
+            _stop(process)
+        if database_name and not args.keep_database:
+            _drop_database(args.database_admin_url, database_name)
+
+
+if __name__ == "__main__":
+    sys.exit(run())
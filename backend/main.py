@@ -1,19 +1,72 @@
-from datetime import date, datetime
+import asyncio
+import base64
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import closing
+from datetime import date, datetime, time, timedelta
+import io
+import json
+import logging
+import math
+from multiprocessing import get_context
 import textwrap
-from fastapi import FastAPI, HTTPException, Query, Response
+import threading
+from time import monotonic
+import zipfile
+import anyio.to_thread
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 import uuid
-from psycopg2.extras import Json
+import weakref
+from psycopg2 import extensions
+from psycopg2.extras import Json, execute_values
 import os
 
-from db import ensure_schema, get_connection
+from db import PoolTimeout, close_pool, ensure_schema, get_connection, pool_stats
 import auth
+import admission
 import ai
+from analysis_cache import analysis_cache
+import jobs
+import pdf_writer
+import resilience
+import triage
+from report_cache import etag_matches, make_etag, make_key, report_cache
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
+PATIENTS_PAGE_SIZE_DEFAULT = 50
+PATIENTS_PAGE_SIZE_MAX = 200
+# Sort key for the patient listing. Rows without created_at sort last instead of
+# producing a cursor the endpoint cannot decode; migration 0009 indexes this expression.
+PATIENTS_SORT_KEY = "COALESCE(created_at, 'epoch'::timestamp)"
+PATIENT_SEARCH_LIMIT_DEFAULT = 10
+PATIENT_SEARCH_LIMIT_MAX = 25
+# Shorter search terms skip fuzzy trigram matching and use prefix matches only.
+PATIENT_SEARCH_FUZZY_MIN_CHARS = int(os.getenv("PATIENT_SEARCH_FUZZY_MIN_CHARS", "4"))
+# Reports hold patient data, so browsers must revalidate with the ETag on every use.
+REPORT_CACHE_CONTROL = "private, no-cache"
+# Let Postgres assemble the report JSON instead of shaping rows in Python.
+REPORT_JSON_FROM_DB = os.getenv("REPORT_JSON_FROM_DB", "false").lower() in ("1", "true", "yes")
+ANALYSIS_JOB_EVENTS_POLL_SECONDS = float(os.getenv("ANALYSIS_JOB_EVENTS_POLL_SECONDS", "1"))
+ANALYSIS_JOB_EVENTS_TIMEOUT_SECONDS = float(os.getenv("ANALYSIS_JOB_EVENTS_TIMEOUT_SECONDS", "300"))
+REPORT_EXPORT_WORKERS = int(os.getenv("REPORT_EXPORT_WORKERS", "0")) or (os.cpu_count() or 1)
+# Exports running at once share one process pool; further requests get 429.
+REPORT_EXPORT_MAX_CONCURRENT = int(os.getenv("REPORT_EXPORT_MAX_CONCURRENT", "2"))
+# Patients fetched per set-based query; also bounds the payloads held in memory.
+REPORT_EXPORT_BATCH_SIZE = int(os.getenv("REPORT_EXPORT_BATCH_SIZE", "100"))
+# Visit rows fetched per round trip when a single patient PDF is streamed.
+REPORT_STREAM_BATCH_ROWS = int(os.getenv("REPORT_STREAM_BATCH_ROWS", "200"))
+ANALYZE_BATCH_MAX_ITEMS = int(os.getenv("ANALYZE_BATCH_MAX_ITEMS", "100"))
+# Upper bound on simultaneous model calls per batch request, to stay within provider rate limits.
+ANALYZE_BATCH_CONCURRENCY = int(os.getenv("ANALYZE_BATCH_CONCURRENCY", "8"))
+
 origins = [
     "http://localhost:5173",
     "http://127.0.0.1:5173",
@@ -32,11 +85,43 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(PoolTimeout)
+def handle_pool_timeout(request: Request, exc: PoolTimeout):
+    return JSONResponse(status_code=503, content={"detail": "Database is busy. Please retry shortly."})
+
+
 @app.get("/")
 def health_check():
     return {"status": "healthy", "service": "CareAxis Backend"}
 
 
+@app.get("/health/db-pool")
+def db_pool_health():
+    return pool_stats()
+
+
+@app.get("/health/report-cache")
+def report_cache_health():
+    return report_cache.stats()
+
+
+@app.get("/health/ai-client")
+def ai_client_health():
+    return {
+        **ai.client_stats(),
+        "single_flight": ai.inflight_stats(),
+        "prompts": ai.prompt_stats(),
+        "resilience": ai.resilience_stats(),
+        "admission": ai.admission_stats(),
+        "routing": ai.routing_stats(),
+    }
+
+
+@app.get("/health/analysis-cache")
+def analysis_cache_health():
+    return analysis_cache.stats()
+
+
 def _parse_report_date(value: Optional[str], field_name: str) -> Optional[date]:
     if value is None:
         return None
@@ -56,6 +141,68 @@ def _parse_uuid(value: str, field_name: str) -> str:
         raise HTTPException(status_code=400, detail=f"Invalid {field_name}. Expected UUID.") from exc
 
 
+def _encode_patients_cursor(created_at: Any, patient_id: Any) -> str:
+    raw = json.dumps([_to_iso(created_at), str(patient_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_patients_cursor(cursor: str) -> tuple:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, patient_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(created_at), str(uuid.UUID(patient_id))
+    except (ValueError, TypeError) as exc:
+        raise HTTPException(status_code=400, detail="Invalid cursor.") from exc
+
+
+def _fetch_report_version(conn: Any, patient_id: str) -> Optional[tuple]:
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT
+            (SELECT COUNT(*) FROM visits v WHERE v.patient_id = p.id) AS visit_count,
+            (SELECT MAX(v.created_at) FROM visits v WHERE v.patient_id = p.id) AS last_visit_at,
+            (
+                SELECT MAX(a.created_at)
+                FROM ai_analysis a
+                JOIN visits v ON v.id = a.visit_id
+                WHERE v.patient_id = p.id
+            ) AS last_analysis_at
+        FROM patients p
+        WHERE p.id = %s
+        """,
+        (patient_id,),
+    )
+    row = cur.fetchone()
+    if not row:
+        return None
+    return (row["visit_count"], _to_iso(row["last_visit_at"]), _to_iso(row["last_analysis_at"]))
+
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": REPORT_CACHE_CONTROL})
+
+
+def _iter_and_cache_pdf(chunks: Iterator[bytes], key: tuple, version: tuple) -> Iterator[bytes]:
+    buffered: Optional[List[bytes]] = []
+    size = 0
+    for chunk in chunks:
+        yield chunk
+        if buffered is None:
+            continue
+        size += len(chunk)
+        if size > report_cache.max_pdf_bytes:
+            buffered = None
+        else:
+            buffered.append(chunk)
+    if buffered is not None:
+        report_cache.put_pdf(key, version, b"".join(buffered))
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
 def _to_iso(value: Any) -> Optional[str]:
     if value is None:
         return None
@@ -101,12 +248,129 @@ def _as_suggested_doctors(value: Any) -> List[Dict[str, str]]:
     return doctors
 
 
-def _build_patient_report_payload(
-    conn: Any, patient_id: str, from_date: Optional[date], to_date: Optional[date]
-) -> Dict[str, Any]:
+REPORT_VISIT_COLUMNS = """
+    v.id AS visit_id,
+    v.patient_id AS patient_id,
+    v.created_at AS visit_created_at,
+    v.doctor_id AS doctor_id,
+    u.full_name AS doctor_name,
+    ci.symptoms AS symptoms,
+    ci.duration AS duration,
+    ci.severity AS severity,
+    ci.vitals AS vitals,
+    ci.notes AS notes,
+    ci.doctor_diagnosis AS doctor_diagnosis,
+    a.id AS ai_id,
+    a.probable_causes AS probable_causes,
+    a.risk_level AS risk_level,
+    a.specialist_recommendation AS specialist_recommendation,
+    a.summary AS summary,
+    a.confidence_score AS confidence_score,
+    a.deviation_percentage AS deviation_percentage,
+    a.suggested_doctors AS suggested_doctors,
+    a.created_at AS ai_created_at
+"""
+
+REPORT_VISIT_JOINS = """
+    FROM visits v
+    LEFT JOIN users u ON u.id = v.doctor_id
+    LEFT JOIN clinical_inputs ci ON ci.visit_id = v.id
+    LEFT JOIN ai_analysis a ON a.visit_id = v.id
+"""
+
+
+def _validate_report_range(from_date: Optional[date], to_date: Optional[date]) -> None:
     if from_date and to_date and from_date > to_date:
         raise HTTPException(status_code=400, detail="from_date must be on or before to_date.")
 
+
+def _visit_range_filters(from_date: Optional[date], to_date: Optional[date]) -> tuple:
+    # Half-open timestamp range keeps the filter sargable on (patient_id, created_at).
+    filters: List[str] = []
+    params: List[Any] = []
+    if from_date:
+        filters.append("v.created_at >= %s")
+        params.append(datetime.combine(from_date, time.min))
+    if to_date:
+        filters.append("v.created_at < %s")
+        params.append(datetime.combine(to_date + timedelta(days=1), time.min))
+    return filters, params
+
+
+def _shape_report_visit(row: Dict[str, Any]) -> Dict[str, Any]:
+    ai_analysis = None
+    if row.get("ai_id"):
+        ai_analysis = {
+            "probable_causes": _as_string_list(row.get("probable_causes")),
+            "risk_level": row.get("risk_level"),
+            "specialist_recommendation": row.get("specialist_recommendation"),
+            "summary": row.get("summary"),
+            "confidence_score": _safe_float(row.get("confidence_score")),
+            "deviation_percentage": _safe_float(row.get("deviation_percentage")),
+            "suggested_doctors": _as_suggested_doctors(row.get("suggested_doctors")),
+            "created_at": _to_iso(row.get("ai_created_at")),
+        }
+
+    return {
+        "visit_id": str(row["visit_id"]),
+        "visit_created_at": _to_iso(row.get("visit_created_at")),
+        "doctor": {
+            "id": str(row["doctor_id"]) if row.get("doctor_id") else None,
+            "full_name": row.get("doctor_name"),
+        },
+        "clinical_input": {
+            "symptoms": _as_string_list(row.get("symptoms")),
+            "duration": row.get("duration"),
+            "severity": row.get("severity"),
+            "vitals": row.get("vitals"),
+            "notes": row.get("notes"),
+            "doctor_diagnosis": row.get("doctor_diagnosis"),
+        },
+        "ai_analysis": ai_analysis,
+    }
+
+
+def _shape_report_patient(patient: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": str(patient["id"]),
+        "health_id": patient["health_id"],
+        "full_name": patient["full_name"],
+        "phone": patient.get("phone"),
+        "age": patient.get("age"),
+        "gender": patient.get("gender"),
+        "created_at": _to_iso(patient.get("created_at")),
+    }
+
+
+def _shape_report_period(from_date: Optional[date], to_date: Optional[date]) -> Dict[str, Any]:
+    return {
+        "from_date": str(from_date) if from_date else None,
+        "to_date": str(to_date) if to_date else None,
+        "generated_at": datetime.utcnow().replace(microsecond=0).isoformat() + "Z",
+    }
+
+
+def _shape_report_document(
+    patient: Dict[str, Any],
+    rows: List[Dict[str, Any]],
+    from_date: Optional[date],
+    to_date: Optional[date],
+) -> Dict[str, Any]:
+    visits = [_shape_report_visit(row) for row in rows]
+    ai_count = sum(1 for visit in visits if visit["ai_analysis"] is not None)
+
+    return {
+        "patient": _shape_report_patient(patient),
+        "report_period": _shape_report_period(from_date, to_date),
+        "totals": {
+            "total_visits": len(visits),
+            "total_ai_analyses": ai_count,
+        },
+        "visits": visits,
+    }
+
+
+def _fetch_report_patient(conn: Any, patient_id: str) -> Dict[str, Any]:
     cur = conn.cursor()
     cur.execute(
         """
@@ -119,113 +383,42 @@ def _build_patient_report_payload(
     patient = cur.fetchone()
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
-
-    cur.execute(
-        """
-        SELECT
-            v.id AS visit_id,
-            v.created_at AS visit_created_at,
-            v.doctor_id AS doctor_id,
-            u.full_name AS doctor_name,
-            ci.symptoms AS symptoms,
-            ci.duration AS duration,
-            ci.severity AS severity,
-            ci.vitals AS vitals,
-            ci.notes AS notes,
-            ci.doctor_diagnosis AS doctor_diagnosis,
-            a.id AS ai_id,
-            a.probable_causes AS probable_causes,
-            a.risk_level AS risk_level,
-            a.specialist_recommendation AS specialist_recommendation,
-            a.summary AS summary,
-            a.confidence_score AS confidence_score,
-            a.deviation_percentage AS deviation_percentage,
-            a.suggested_doctors AS suggested_doctors,
-            a.created_at AS ai_created_at
-        FROM visits v
-        LEFT JOIN users u ON u.id = v.doctor_id
-        LEFT JOIN clinical_inputs ci ON ci.visit_id = v.id
-        LEFT JOIN ai_analysis a ON a.visit_id = v.id
-        WHERE v.patient_id = %s
-          AND (%s::date IS NULL OR v.created_at::date >= %s::date)
-          AND (%s::date IS NULL OR v.created_at::date <= %s::date)
-        ORDER BY v.created_at DESC
-        """,
-        (patient_id, from_date, from_date, to_date, to_date),
+    return patient
+
+
+def _report_visits_query(
+    patient_id: str, from_date: Optional[date], to_date: Optional[date]
+) -> Tuple[str, List[Any]]:
+    range_filters, range_params = _visit_range_filters(from_date, to_date)
+    filters = ["v.patient_id = %s", *range_filters]
+    query = (
+        "SELECT"
+        + REPORT_VISIT_COLUMNS
+        + REPORT_VISIT_JOINS
+        + "WHERE "
+        + " AND ".join(filters)
+        + "\nORDER BY v.created_at DESC"
     )
-    rows = cur.fetchall()
-
-    visits: List[Dict[str, Any]] = []
-    ai_count = 0
-    for row in rows:
-        ai_analysis = None
-        if row.get("ai_id"):
-            ai_count += 1
-            ai_analysis = {
-                "probable_causes": _as_string_list(row.get("probable_causes")),
-                "risk_level": row.get("risk_level"),
-                "specialist_recommendation": row.get("specialist_recommendation"),
-                "summary": row.get("summary"),
-                "confidence_score": _safe_float(row.get("confidence_score")),
-                "deviation_percentage": _safe_float(row.get("deviation_percentage")),
-                "suggested_doctors": _as_suggested_doctors(row.get("suggested_doctors")),
-                "created_at": _to_iso(row.get("ai_created_at")),
-            }
-
-        visits.append(
-            {
-                "visit_id": str(row["visit_id"]),
-                "visit_created_at": _to_iso(row.get("visit_created_at")),
-                "doctor": {
-                    "id": str(row["doctor_id"]) if row.get("doctor_id") else None,
-                    "full_name": row.get("doctor_name"),
-                },
-                "clinical_input": {
-                    "symptoms": _as_string_list(row.get("symptoms")),
-                    "duration": row.get("duration"),
-                    "severity": row.get("severity"),
-                    "vitals": row.get("vitals"),
-                    "notes": row.get("notes"),
-                    "doctor_diagnosis": row.get("doctor_diagnosis"),
-                },
-                "ai_analysis": ai_analysis,
-            }
-        )
+    return query, [patient_id, *range_params]
 
-    return {
-        "patient": {
-            "id": str(patient["id"]),
-            "health_id": patient["health_id"],
-            "full_name": patient["full_name"],
-            "phone": patient.get("phone"),
-            "age": patient.get("age"),
-            "gender": patient.get("gender"),
-            "created_at": _to_iso(patient.get("created_at")),
-        },
-        "report_period": {
-            "from_date": str(from_date) if from_date else None,
-            "to_date": str(to_date) if to_date else None,
-            "generated_at": datetime.utcnow().replace(microsecond=0).isoformat() + "Z",
-        },
-        "totals": {
-            "total_visits": len(visits),
-            "total_ai_analyses": ai_count,
-        },
-        "visits": visits,
-    }
 
+def _build_patient_report_payload(
+    conn: Any, patient_id: str, from_date: Optional[date], to_date: Optional[date]
+) -> Dict[str, Any]:
+    _validate_report_range(from_date, to_date)
 
-def _escape_pdf_text(text: str) -> str:
-    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    patient = _fetch_report_patient(conn, patient_id)
+    cur = conn.cursor()
+    cur.execute(*_report_visits_query(patient_id, from_date, to_date))
+    return _shape_report_document(patient, cur.fetchall(), from_date, to_date)
 
 
-def _to_report_lines(report: Dict[str, Any]) -> List[str]:
+def _iter_report_header_lines(report: Dict[str, Any]) -> Iterator[str]:
     patient = report["patient"]
     period = report["report_period"]
     totals = report["totals"]
-    visits = report["visits"]
 
-    lines: List[str] = [
+    yield from [
         "CareAxis CoPilot - Patient Detailed Report",
         "",
         f"Generated At: {period['generated_at']}",
@@ -244,121 +437,384 @@ def _to_report_lines(report: Dict[str, Any]) -> List[str]:
         "",
     ]
 
-    if not visits:
-        lines.append("No visits found for the selected period.")
-        return lines
 
-    for idx, visit in enumerate(visits, start=1):
-        clinical = visit["clinical_input"]
-        ai_analysis = visit.get("ai_analysis")
-
-        lines.extend(
-            [
-                f"Visit {idx}",
-                f"Visit ID: {visit['visit_id']}",
-                f"Created At: {visit['visit_created_at'] or 'N/A'}",
-                f"Doctor: {visit['doctor']['full_name'] or 'N/A'}",
-                f"Symptoms: {', '.join(clinical['symptoms']) if clinical['symptoms'] else 'N/A'}",
-                f"Duration: {clinical['duration'] or 'N/A'}",
-                f"Severity: {clinical['severity'] or 'N/A'}",
-                f"Doctor Diagnosis: {clinical['doctor_diagnosis'] or 'N/A'}",
-                f"Clinical Notes: {clinical['notes'] or 'N/A'}",
-            ]
-        )
+def _iter_report_visit_lines(idx: int, visit: Dict[str, Any]) -> Iterator[str]:
+    clinical = visit["clinical_input"]
+    ai_analysis = visit.get("ai_analysis")
+
+    yield from [
+        f"Visit {idx}",
+        f"Visit ID: {visit['visit_id']}",
+        f"Created At: {visit['visit_created_at'] or 'N/A'}",
+        f"Doctor: {visit['doctor']['full_name'] or 'N/A'}",
+        f"Symptoms: {', '.join(clinical['symptoms']) if clinical['symptoms'] else 'N/A'}",
+        f"Duration: {clinical['duration'] or 'N/A'}",
+        f"Severity: {clinical['severity'] or 'N/A'}",
+        f"Doctor Diagnosis: {clinical['doctor_diagnosis'] or 'N/A'}",
+        f"Clinical Notes: {clinical['notes'] or 'N/A'}",
+    ]
 
-        if ai_analysis:
-            lines.extend(
-                [
-                    "AI Analysis",
-                    f"Risk Level: {ai_analysis['risk_level'] or 'N/A'}",
-                    "Probable Causes: "
-                    + (", ".join(ai_analysis["probable_causes"]) if ai_analysis["probable_causes"] else "N/A"),
-                    f"Specialist Recommendation: {ai_analysis['specialist_recommendation'] or 'N/A'}",
-                    f"Summary: {ai_analysis['summary'] or 'N/A'}",
-                    f"Confidence Score: {ai_analysis['confidence_score'] if ai_analysis['confidence_score'] is not None else 'N/A'}",
-                    f"Guideline Deviation (%): {ai_analysis['deviation_percentage'] if ai_analysis['deviation_percentage'] is not None else 'N/A'}",
-                ]
-            )
+    if ai_analysis:
+        yield from [
+            "AI Analysis",
+            f"Risk Level: {ai_analysis['risk_level'] or 'N/A'}",
+            "Probable Causes: "
+            + (", ".join(ai_analysis["probable_causes"]) if ai_analysis["probable_causes"] else "N/A"),
+            f"Specialist Recommendation: {ai_analysis['specialist_recommendation'] or 'N/A'}",
+            f"Summary: {ai_analysis['summary'] or 'N/A'}",
+            f"Confidence Score: {ai_analysis['confidence_score'] if ai_analysis['confidence_score'] is not None else 'N/A'}",
+            f"Guideline Deviation (%): {ai_analysis['deviation_percentage'] if ai_analysis['deviation_percentage'] is not None else 'N/A'}",
+        ]
 
-            if ai_analysis["suggested_doctors"]:
-                lines.append("Suggested Doctors:")
-                for doctor in ai_analysis["suggested_doctors"]:
-                    lines.append(f"- {doctor['name']} ({doctor['specialty']}): {doctor['reason']}")
-        else:
-            lines.append("AI Analysis: Not available for this visit.")
+        if ai_analysis["suggested_doctors"]:
+            yield "Suggested Doctors:"
+            for doctor in ai_analysis["suggested_doctors"]:
+                yield f"- {doctor['name']} ({doctor['specialty']}): {doctor['reason']}"
+    else:
+        yield "AI Analysis: Not available for this visit."
 
-        lines.extend(["", "-" * 95, ""])
+    yield from ["", "-" * 95, ""]
 
-    wrapped: List[str] = []
+
+def _iter_raw_report_lines(report: Dict[str, Any]) -> Iterator[str]:
+    yield from _iter_report_header_lines(report)
+
+    visits = report["visits"]
+    if not visits:
+        yield "No visits found for the selected period."
+        return
+
+    for idx, visit in enumerate(visits, start=1):
+        yield from _iter_report_visit_lines(idx, visit)
+
+
+def _wrap_report_lines(lines: Iterable[str]) -> Iterator[str]:
     for line in lines:
         if not line:
-            wrapped.append("")
+            yield ""
             continue
-        wrapped.extend(textwrap.wrap(line, width=95) or [""])
-    return wrapped
+        yield from textwrap.wrap(line, width=95) or [""]
+
+
+def _iter_report_lines(report: Dict[str, Any]) -> Iterator[str]:
+    return _wrap_report_lines(_iter_raw_report_lines(report))
+
+
+def _iter_streamed_report_lines(
+    patient: Dict[str, Any], from_date: Optional[date], to_date: Optional[date]
+) -> Iterator[str]:
+    # Same lines as _iter_report_lines over _build_patient_report_payload, but visit rows
+    # come from a server-side cursor a batch at a time, so the first page is written before
+    # the last row is read. The connection is only borrowed once the stream is consumed and
+    # goes back to the pool when it ends or the client goes away.
+    patient_id = str(patient["id"])
+    with get_connection() as conn:
+        if conn.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE:
+            # The totals and the rows must come from one snapshot.
+            conn.cursor().execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+        query, params = _report_visits_query(patient_id, from_date, to_date)
+        cur = conn.cursor()
+        cur.execute(f"SELECT COUNT(*) AS visits, COUNT(ai_id) AS ai FROM ({query}) AS report_visits", params)
+        totals = cur.fetchone()
+
+        header = {
+            "patient": _shape_report_patient(patient),
+            "report_period": _shape_report_period(from_date, to_date),
+            "totals": {"total_visits": totals["visits"], "total_ai_analyses": totals["ai"]},
+            "visits": [],
+        }
+        yield from _wrap_report_lines(_iter_report_header_lines(header))
+        if not totals["visits"]:
+            yield "No visits found for the selected period."
+            return
 
+        rows = conn.cursor(name=f"report_visits_{uuid.uuid4().hex}")
+        rows.itersize = REPORT_STREAM_BATCH_ROWS
+        try:
+            rows.execute(query, params)
+            for idx, row in enumerate(rows, start=1):
+                yield from _wrap_report_lines(_iter_report_visit_lines(idx, _shape_report_visit(row)))
+        finally:
+            rows.close()
 
-def _build_pdf_from_lines(lines: List[str]) -> bytes:
-    max_lines_per_page = 48
-    pages = [lines[i : i + max_lines_per_page] for i in range(0, len(lines), max_lines_per_page)] or [["No data"]]
-    page_count = len(pages)
-    font_obj_id = 3 + page_count * 2
-    object_count = font_obj_id
-    objects: List[bytes] = [b""] * (object_count + 1)
 
-    objects[1] = b"<< /Type /Catalog /Pages 2 0 R >>"
+def _to_report_lines(report: Dict[str, Any]) -> List[str]:
+    return list(_iter_report_lines(report))
+
 
-    page_ids = [str(3 + idx * 2) + " 0 R" for idx in range(page_count)]
-    objects[2] = (
-        f"<< /Type /Pages /Kids [{' '.join(page_ids)}] /Count {page_count} >>".encode("ascii")
+def _sql_string_list(column: str) -> str:
+    # Mirrors _as_string_list: non-arrays become [], scalar elements become their text.
+    return (
+        f"CASE WHEN jsonb_typeof({column}) = 'array' THEN ("
+        "SELECT COALESCE(json_agg(e.value #>> '{}' ORDER BY e.ordinality), '[]'::json) "
+        f"FROM jsonb_array_elements({column}) WITH ORDINALITY AS e(value, ordinality)"
+        ") ELSE '[]'::json END"
     )
 
-    for idx, page_lines in enumerate(pages):
-        page_obj_id = 3 + idx * 2
-        content_obj_id = page_obj_id + 1
-
-        commands = ["BT", "/F1 10 Tf", "40 770 Td"]
-        for line_index, line in enumerate(page_lines):
-            if line_index == 0:
-                commands.append(f"({_escape_pdf_text(line)}) Tj")
-            else:
-                commands.append("0 -15 Td")
-                commands.append(f"({_escape_pdf_text(line)}) Tj")
-        commands.append("ET")
-        stream = "\n".join(commands).encode("latin-1", errors="replace")
-
-        objects[page_obj_id] = (
-            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 {font_obj_id} 0 R >> >> /Contents {content_obj_id} 0 R >>".encode(
-                "ascii"
-            )
-        )
-        objects[content_obj_id] = (
-            f"<< /Length {len(stream)} >>\nstream\n".encode("ascii") + stream + b"\nendstream"
-        )
 
-    objects[font_obj_id] = b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+def _sql_suggested_doctors(column: str) -> str:
+    # Mirrors _as_suggested_doctors: keep named objects in order and fill blank fields.
+    return (
+        f"CASE WHEN jsonb_typeof({column}) = 'array' THEN ("
+        "SELECT COALESCE(json_agg(json_build_object("
+        "'name', btrim(d.value->>'name'), "
+        "'specialty', COALESCE(NULLIF(btrim(d.value->>'specialty'), ''), 'General Medicine'), "
+        "'reason', COALESCE(NULLIF(btrim(d.value->>'reason'), ''), 'Specialist fit based on reported symptoms.')"
+        ") ORDER BY d.ordinality), '[]'::json) "
+        f"FROM jsonb_array_elements({column}) WITH ORDINALITY AS d(value, ordinality) "
+        "WHERE jsonb_typeof(d.value) = 'object' AND btrim(COALESCE(d.value->>'name', '')) <> ''"
+        ") ELSE '[]'::json END"
+    )
 
-    pdf = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
-    offsets = [0] * (object_count + 1)
 
-    for obj_id in range(1, object_count + 1):
-        offsets[obj_id] = len(pdf)
-        pdf.extend(f"{obj_id} 0 obj\n".encode("ascii"))
-        pdf.extend(objects[obj_id])
-        pdf.extend(b"\nendobj\n")
+def _build_patient_report_json(
+    conn: Any, patient_id: str, from_date: Optional[date], to_date: Optional[date]
+) -> str:
+    # Same document as _build_patient_report_payload, serialized by Postgres. json_build_object
+    # keeps key order; timestamps use Postgres' ISO format, which trims trailing zero microseconds.
+    _validate_report_range(from_date, to_date)
 
-    xref_start = len(pdf)
-    pdf.extend(f"xref\n0 {object_count + 1}\n".encode("ascii"))
-    pdf.extend(b"0000000000 65535 f \n")
-    for obj_id in range(1, object_count + 1):
-        pdf.extend(f"{offsets[obj_id]:010d} 00000 n \n".encode("ascii"))
+    range_filters, range_params = _visit_range_filters(from_date, to_date)
+    filters = ["v.patient_id = %s", *range_filters]
 
-    pdf.extend(
-        f"trailer\n<< /Size {object_count + 1} /Root 1 0 R >>\nstartxref\n{xref_start}\n%%EOF".encode(
-            "ascii"
+    cur = conn.cursor()
+    cur.execute(
+        "WITH visit_rows AS (SELECT"
+        + REPORT_VISIT_COLUMNS
+        + REPORT_VISIT_JOINS
+        + "WHERE "
+        + " AND ".join(filters)
+        + """
         )
+        SELECT json_build_object(
+            'patient', json_build_object(
+                'id', p.id,
+                'health_id', p.health_id,
+                'full_name', p.full_name,
+                'phone', p.phone,
+                'age', p.age,
+                'gender', p.gender,
+                'created_at', p.created_at
+            ),
+            'report_period', json_build_object(
+                'from_date', %s::text,
+                'to_date', %s::text,
+                'generated_at', to_char(now() AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS"Z"')
+            ),
+            'totals', json_build_object(
+                'total_visits', (SELECT COUNT(*) FROM visit_rows),
+                'total_ai_analyses', (SELECT COUNT(ai_id) FROM visit_rows)
+            ),
+            'visits', COALESCE((
+                SELECT json_agg(json_build_object(
+                    'visit_id', r.visit_id,
+                    'visit_created_at', r.visit_created_at,
+                    'doctor', json_build_object('id', r.doctor_id, 'full_name', r.doctor_name),
+                    'clinical_input', json_build_object(
+                        'symptoms', """
+        + _sql_string_list("r.symptoms")
+        + """,
+                        'duration', r.duration,
+                        'severity', r.severity,
+                        'vitals', r.vitals,
+                        'notes', r.notes,
+                        'doctor_diagnosis', r.doctor_diagnosis
+                    ),
+                    'ai_analysis', CASE WHEN r.ai_id IS NULL THEN NULL ELSE json_build_object(
+                        'probable_causes', """
+        + _sql_string_list("r.probable_causes")
+        + """,
+                        'risk_level', r.risk_level,
+                        'specialist_recommendation', r.specialist_recommendation,
+                        'summary', r.summary,
+                        'confidence_score', r.confidence_score::float8,
+                        'deviation_percentage', r.deviation_percentage::float8,
+                        'suggested_doctors', """
+        + _sql_suggested_doctors("r.suggested_doctors")
+        + """,
+                        'created_at', r.ai_created_at
+                    ) END
+                ) ORDER BY r.visit_created_at DESC)
+                FROM visit_rows r
+            ), '[]'::json)
+        )::text AS document
+        FROM patients p
+        WHERE p.id = %s
+        """,
+        [
+            patient_id,
+            *range_params,
+            str(from_date) if from_date else None,
+            str(to_date) if to_date else None,
+            patient_id,
+        ],
     )
-    return bytes(pdf)
+    row = cur.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    return row["document"]
+
+
+def _render_report_pdf(report: Dict[str, Any]) -> Tuple[str, bytes]:
+    # Runs in a worker process during bulk export, so it must stay a top-level function.
+    safe_health_id = str(report["patient"]["health_id"]).replace(" ", "_")
+    return f"patient-report-{safe_health_id}.pdf", pdf_writer.build_pdf_from_lines(_iter_report_lines(report))
+
+
+def _iter_bulk_report_payloads(
+    from_date: date, to_date: date, patient_ids: List[str], batch_size: int = REPORT_EXPORT_BATCH_SIZE
+) -> Iterator[Dict[str, Any]]:
+    range_filters, range_params = _visit_range_filters(from_date, to_date)
+
+    for start in range(0, len(patient_ids), batch_size):
+        batch = patient_ids[start : start + batch_size]
+        # Each batch borrows its own connection so a long export does not pin one.
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT id, health_id, full_name, phone, age, gender, created_at
+                FROM patients
+                WHERE id = ANY(%s::uuid[])
+                """,
+                (batch,),
+            )
+            patients = {str(row["id"]): row for row in cur.fetchall()}
+
+            cur.execute(
+                "SELECT"
+                + REPORT_VISIT_COLUMNS
+                + REPORT_VISIT_JOINS
+                + "WHERE "
+                + " AND ".join(["v.patient_id = ANY(%s::uuid[])", *range_filters])
+                + "\nORDER BY v.patient_id, v.created_at DESC",
+                [batch, *range_params],
+            )
+            rows_by_patient: Dict[str, List[Dict[str, Any]]] = {}
+            for row in cur.fetchall():
+                rows_by_patient.setdefault(str(row["patient_id"]), []).append(row)
+
+        for patient_id in batch:
+            patient = patients.get(patient_id)
+            if patient:
+                yield _shape_report_document(patient, rows_by_patient.get(patient_id, []), from_date, to_date)
+
+
+def _fetch_patients_seen(from_date: date, to_date: date) -> List[str]:
+    range_filters, range_params = _visit_range_filters(from_date, to_date)
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT DISTINCT v.patient_id FROM visits v WHERE "
+            + " AND ".join(range_filters)
+            + " ORDER BY v.patient_id",
+            range_params,
+        )
+        return [str(row["patient_id"]) for row in cur.fetchall()]
+
+
+class _ZipStreamSink(io.RawIOBase):
+    # Unseekable sink: zipfile falls back to data descriptors and we drain bytes as they are written.
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        chunk = b"".join(self._chunks)
+        self._chunks = []
+        return chunk
+
+
+def _new_export_pool(workers: int = REPORT_EXPORT_WORKERS) -> ProcessPoolExecutor:
+    # forkserver children start from a clean single-threaded process instead of forking
+    # this one, which runs the job dispatcher, hedge executor and request threads.
+    return ProcessPoolExecutor(max_workers=workers, mp_context=get_context("forkserver"))
+
+
+_export_pool: Optional[ProcessPoolExecutor] = None
+_export_pool_lock = threading.Lock()
+_export_slots = threading.BoundedSemaphore(max(REPORT_EXPORT_MAX_CONCURRENT, 1))
+
+
+def _get_export_pool() -> ProcessPoolExecutor:
+    global _export_pool
+    with _export_pool_lock:
+        if _export_pool is None:
+            _export_pool = _new_export_pool()
+        return _export_pool
+
+
+def _close_export_pool() -> None:
+    global _export_pool
+    with _export_pool_lock:
+        if _export_pool is not None:
+            _export_pool.shutdown(wait=True, cancel_futures=True)
+            _export_pool = None
+
+
+def _iter_holding_export_slot(chunks: Iterator[bytes], release: Callable[[], Any]) -> Iterator[bytes]:
+    try:
+        yield from chunks
+    finally:
+        release()
+
+
+def _iter_bulk_report_zip(
+    from_date: date,
+    to_date: date,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    workers: int = REPORT_EXPORT_WORKERS,
+    pool: Optional[ProcessPoolExecutor] = None,
+) -> Iterator[bytes]:
+    patient_ids = _fetch_patients_seen(from_date, to_date)
+    total = len(patient_ids)
+    done = 0
+    # At most two PDFs per worker are queued or waiting to be written.
+    max_in_flight = workers * 2
+
+    sink = _ZipStreamSink()
+    archive = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED)
+    pool = pool or _get_export_pool()
+    in_flight: Deque[Future] = deque()
+
+    def write_next() -> bytes:
+        nonlocal done
+        filename, pdf_bytes = in_flight.popleft().result()
+        archive.writestr(filename, pdf_bytes)
+        done += 1
+        if on_progress:
+            on_progress(done, total)
+        return sink.drain()
+
+    try:
+        for report in _iter_bulk_report_payloads(from_date, to_date, patient_ids):
+            in_flight.append(pool.submit(_render_report_pdf, report))
+            if len(in_flight) >= max_in_flight:
+                yield write_next()
+
+        while in_flight:
+            yield write_next()
+
+        manifest = {
+            "from_date": str(from_date),
+            "to_date": str(to_date),
+            "patients": total,
+            "reports": done,
+            "generated_at": datetime.utcnow().replace(microsecond=0).isoformat() + "Z",
+        }
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2))
+        archive.close()
+        yield sink.drain()
+    finally:
+        # The pool is shared, so only this export's queued renders are dropped.
+        for future in in_flight:
+            future.cancel()
 
 
 # ---------- SCHEMAS ----------
@@ -396,48 +852,64 @@ class AnalyzeVisitRequest(ClinicalRequest):
     doctor_id: str
 
 
+class AnalyzeVisitBatchRequest(BaseModel):
+    items: List[AnalyzeVisitRequest]
+
+
 @app.on_event("startup")
 def initialize_database():
     ensure_schema()
+    analysis_jobs.start()
+
+
+@app.on_event("startup")
+async def bound_ai_queue():
+    # Sync endpoints share AnyIO's threadpool and an AI call waiting for admission holds
+    # one of its threads, so the admission queue must stay well below the pool size.
+    limit = ai.bound_admission_queue(anyio.to_thread.current_default_thread_limiter().total_tokens)
+    logger.info("AI admission queue capped at %d waiters", limit)
+
+
+@app.on_event("shutdown")
+def release_resources():
+    analysis_jobs.stop()
+    _close_export_pool()
+    close_pool()
+    ai.close_client()
 
 
 # ---------- AUTH ----------
 
 @app.post("/auth/register")
 def register(data: RegisterRequest):
-    conn = get_connection()
-    cur = conn.cursor()
-
     hashed = auth.hash_password(data.password)
 
-    try:
-        cur.execute(
-            """
-            INSERT INTO users (id, full_name, email, password_hash, role, organization)
-            VALUES (%s, %s, %s, %s, 'doctor', %s)
-            """,
-            (str(uuid.uuid4()), data.full_name, data.email, hashed, data.organization)
-        )
-        conn.commit()
-    except Exception:
-        raise HTTPException(status_code=400, detail="User already exists")
-    finally:
-        conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                """
+                INSERT INTO users (id, full_name, email, password_hash, role, organization)
+                VALUES (%s, %s, %s, %s, 'doctor', %s)
+                """,
+                (str(uuid.uuid4()), data.full_name, data.email, hashed, data.organization)
+            )
+            conn.commit()
+        except Exception:
+            raise HTTPException(status_code=400, detail="User already exists")
 
     return {"message": "Registration successful"}
 
 
 @app.post("/auth/login")
 def login(data: LoginRequest):
-    conn = get_connection()
-    cur = conn.cursor()
-
-    cur.execute(
-        "SELECT * FROM users WHERE email = %s",
-        (data.email,)
-    )
-    user = cur.fetchone()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT * FROM users WHERE email = %s",
+            (data.email,)
+        )
+        user = cur.fetchone()
 
     if not user or not auth.verify_password(data.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -455,34 +927,182 @@ def login(data: LoginRequest):
 # ---------- PATIENTS ----------
 
 @app.get("/patients")
-def get_patients():
-    conn = get_connection()
-    cur = conn.cursor()
+def get_patients(
+    limit: int = Query(default=PATIENTS_PAGE_SIZE_DEFAULT, ge=1, le=PATIENTS_PAGE_SIZE_MAX),
+    cursor: Optional[str] = Query(default=None),
+    name: Optional[str] = Query(default=None),
+    health_id: Optional[str] = Query(default=None),
+    phone: Optional[str] = Query(default=None),
+):
+    filters: List[str] = []
+    params: List[Any] = []
+
+    if cursor:
+        cursor_created_at, cursor_id = _decode_patients_cursor(cursor)
+        filters.append(f"({PATIENTS_SORT_KEY}, id) < (%s, %s)")
+        params.extend([cursor_created_at, cursor_id])
+    if name:
+        filters.append("lower(full_name) LIKE %s")
+        params.append(_escape_like(name.strip().lower()) + "%")
+    if health_id:
+        filters.append("health_id = %s")
+        params.append(health_id.strip())
+    if phone:
+        filters.append("phone = %s")
+        params.append(phone.strip())
+
+    where = f"WHERE {' AND '.join(filters)}" if filters else ""
+
+    # Fetch one extra row to learn whether another page exists.
+    params.append(limit + 1)
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""
+            SELECT id, health_id, full_name, phone, {PATIENTS_SORT_KEY} AS sort_key
+            FROM patients
+            {where}
+            ORDER BY {PATIENTS_SORT_KEY} DESC, id DESC
+            LIMIT %s
+            """,
+            params,
+        )
+        rows = cur.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = _encode_patients_cursor(last["sort_key"], last["id"])
+
+    patients = [
+        {
+            "id": row["id"],
+            "health_id": row["health_id"],
+            "full_name": row["full_name"],
+            "phone": row["phone"],
+        }
+        for row in rows
+    ]
+    return {"patients": patients, "next_cursor": next_cursor}
+
+
+@app.get("/patients/count")
+def count_patients():
+    # For dashboards that show the total without paging through the list.
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*) AS count FROM patients")
+        return {"count": cur.fetchone()["count"]}
+
+
+def _patient_search_query(term: str, limit: int) -> Tuple[str, Dict[str, Any]]:
+    # One branch per index, each stopping at `limit` rows, so a short prefix that matches
+    # much of the table still reads only a few rows. Exact ID/phone hits rank first, then
+    # ID/phone prefixes, then name prefixes, then fuzzy trigram matches. The trigram branch
+    # is skipped for short terms, where nearly every name is a candidate, and only runs
+    # when the prefix branches did not already fill the page.
+    prefix_branches = [
+        "SELECT id, 0 AS match_rank FROM patients WHERE health_id = %(term)s",
+        "SELECT id, 0 FROM patients WHERE phone = %(term)s",
+        "SELECT id, 1 FROM patients WHERE health_id LIKE %(raw_prefix)s",
+        "SELECT id, 1 FROM patients WHERE phone LIKE %(raw_prefix)s",
+        "SELECT id, 2 FROM patients WHERE lower(full_name) LIKE %(name_prefix)s",
+    ]
+    ctes = [
+        "prefix AS (\n"
+        + "\n    UNION ALL\n".join(f"    ({branch} LIMIT %(limit)s)" for branch in prefix_branches)
+        + "\n)"
+    ]
+    candidates = "SELECT id, match_rank FROM prefix"
+
+    if len(term) >= PATIENT_SEARCH_FUZZY_MIN_CHARS:
+        ctes.append(
+            # The lateral gate also keeps the planner from launching parallel workers
+            # for a scan that usually never runs.
+            """fuzzy AS (
+    SELECT matches.id, 3 AS match_rank
+    FROM (SELECT COUNT(DISTINCT id) AS found FROM prefix) AS gate
+    CROSS JOIN LATERAL (
+        SELECT id
+        FROM patients
+        WHERE full_name %% %(term)s AND gate.found < %(limit)s
+        ORDER BY similarity(full_name, %(term)s) DESC
+        LIMIT %(limit)s
+    ) AS matches
+)"""
+        )
+        candidates += " UNION ALL SELECT id, match_rank FROM fuzzy"
+
+    sql = (
+        "WITH "
+        + ",\n".join(ctes)
+        + f""",
+best AS (
+    SELECT id, MIN(match_rank) AS match_rank
+    FROM ({candidates}) AS candidates
+    GROUP BY id
+)
+SELECT p.id, p.health_id, p.full_name, p.phone, best.match_rank,
+       similarity(p.full_name, %(term)s) AS score
+FROM best
+JOIN patients p ON p.id = best.id
+ORDER BY best.match_rank, score DESC, p.full_name
+LIMIT %(limit)s"""
+    )
+    params = {
+        "term": term,
+        "raw_prefix": _escape_like(term) + "%",
+        "name_prefix": _escape_like(term.lower()) + "%",
+        "limit": limit,
+    }
+    return sql, params
+
+
+@app.get("/patients/search")
+def search_patients(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(default=PATIENT_SEARCH_LIMIT_DEFAULT, ge=1, le=PATIENT_SEARCH_LIMIT_MAX),
+):
+    term = q.strip()
+    if not term:
+        raise HTTPException(status_code=400, detail="Search query must not be blank.")
 
-    cur.execute("SELECT id, health_id, full_name, phone FROM patients")
-    patients = cur.fetchall()
+    sql, params = _patient_search_query(term, limit)
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        rows = cur.fetchall()
 
-    conn.close()
-    return {"patients": patients}
+    return {
+        "results": [
+            {
+                "id": row["id"],
+                "health_id": row["health_id"],
+                "full_name": row["full_name"],
+                "phone": row["phone"],
+                "score": _safe_float(row["score"]),
+            }
+            for row in rows
+        ]
+    }
 
 
 @app.post("/patients")
 def create_patient(data: PatientCreate):
-    conn = get_connection()
-    cur = conn.cursor()
-
     patient_id = str(uuid.uuid4())
     health_id = f"CAX-{uuid.uuid4().hex[:6]}"
 
-    cur.execute(
-        """
-        INSERT INTO patients (id, health_id, full_name, phone, age, gender)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        """,
-        (patient_id, health_id, data.full_name, data.phone, data.age, data.gender)
-    )
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            INSERT INTO patients (id, health_id, full_name, phone, age, gender)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            """,
+            (patient_id, health_id, data.full_name, data.phone, data.age, data.gender)
+        )
+        conn.commit()
 
     return {
         "patient_id": patient_id,
@@ -495,16 +1115,41 @@ def get_patient_report(
     patient_id: str,
     from_date: Optional[str] = Query(default=None),
     to_date: Optional[str] = Query(default=None),
+    if_none_match: Optional[str] = Header(default=None),
 ):
     parsed_patient_id = _parse_uuid(patient_id, "patient_id")
     parsed_from = _parse_report_date(from_date, "from_date")
     parsed_to = _parse_report_date(to_date, "to_date")
+    key = make_key(parsed_patient_id, parsed_from, parsed_to)
 
-    conn = get_connection()
-    try:
-        return _build_patient_report_payload(conn, parsed_patient_id, parsed_from, parsed_to)
-    finally:
-        conn.close()
+    with get_connection() as conn:
+        version = _fetch_report_version(conn, parsed_patient_id)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Patient not found")
+
+        headers = {"Cache-Control": REPORT_CACHE_CONTROL}
+
+        if REPORT_JSON_FROM_DB:
+            etag = make_etag(key, version, "json-db")
+            if etag_matches(if_none_match, etag):
+                return _not_modified(etag)
+
+            document = report_cache.get_json(key, version)
+            if document is None:
+                document = _build_patient_report_json(conn, parsed_patient_id, parsed_from, parsed_to)
+                report_cache.put_json(key, version, document)
+            return Response(content=document, media_type="application/json", headers={**headers, "ETag": etag})
+
+        etag = make_etag(key, version, "json")
+        if etag_matches(if_none_match, etag):
+            return _not_modified(etag)
+
+        report = report_cache.get_payload(key, version)
+        if report is None:
+            report = _build_patient_report_payload(conn, parsed_patient_id, parsed_from, parsed_to)
+            report_cache.put_payload(key, version, report)
+
+    return JSONResponse(content=report, headers={**headers, "ETag": etag})
 
 
 @app.get("/reports/patients/{patient_id}/pdf")
@@ -512,25 +1157,81 @@ def download_patient_report_pdf(
     patient_id: str,
     from_date: Optional[str] = Query(default=None),
     to_date: Optional[str] = Query(default=None),
+    if_none_match: Optional[str] = Header(default=None),
 ):
     parsed_patient_id = _parse_uuid(patient_id, "patient_id")
     parsed_from = _parse_report_date(from_date, "from_date")
     parsed_to = _parse_report_date(to_date, "to_date")
+    key = make_key(parsed_patient_id, parsed_from, parsed_to)
 
-    conn = get_connection()
-    try:
-        report = _build_patient_report_payload(conn, parsed_patient_id, parsed_from, parsed_to)
-    finally:
-        conn.close()
+    with get_connection() as conn:
+        version = _fetch_report_version(conn, parsed_patient_id)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Patient not found")
 
-    pdf_lines = _to_report_lines(report)
-    pdf_bytes = _build_pdf_from_lines(pdf_lines)
-    safe_health_id = str(report["patient"]["health_id"]).replace(" ", "_")
+        # Writer settings change the bytes, so they are part of the PDF's identity.
+        etag = make_etag(
+            key, version + (pdf_writer.COMPRESSION_LEVEL, pdf_writer.OBJECT_STREAMS), "pdf"
+        )
+        if etag_matches(if_none_match, etag):
+            return _not_modified(etag)
+
+        _validate_report_range(parsed_from, parsed_to)
+        pdf_bytes = report_cache.get_pdf(key, version)
+        report = report_cache.get_payload(key, version)
+        patient = report["patient"] if report is not None else _fetch_report_patient(conn, parsed_patient_id)
+
+    safe_health_id = str(patient["health_id"]).replace(" ", "_")
+    headers = {
+        "Content-Disposition": f'attachment; filename="patient-report-{safe_health_id}.pdf"',
+        "ETag": etag,
+        "Cache-Control": REPORT_CACHE_CONTROL,
+    }
+
+    if pdf_bytes is not None:
+        return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
 
-    return Response(
-        content=pdf_bytes,
+    if report is not None:
+        lines = _iter_report_lines(report)
+    else:
+        lines = _iter_streamed_report_lines(patient, parsed_from, parsed_to)
+    return StreamingResponse(
+        _iter_and_cache_pdf(pdf_writer.iter_pdf_from_lines(lines), key, version),
         media_type="application/pdf",
-        headers={"Content-Disposition": f'attachment; filename="patient-report-{safe_health_id}.pdf"'},
+        headers=headers,
+    )
+
+
+@app.get("/reports/export")
+def export_patient_reports(
+    from_date: str = Query(...),
+    to_date: str = Query(...),
+):
+    parsed_from = _parse_report_date(from_date, "from_date")
+    parsed_to = _parse_report_date(to_date, "to_date")
+    _validate_report_range(parsed_from, parsed_to)
+
+    def log_progress(done: int, total: int) -> None:
+        if done == total or done % 50 == 0:
+            logger.info("Bulk report export %s..%s: %d/%d", parsed_from, parsed_to, done, total)
+
+    if not _export_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=429,
+            detail="Too many report exports are running; try again shortly.",
+            headers={"Retry-After": "30"},
+        )
+
+    # The slot is released when the stream ends, or when it is garbage collected if the
+    # client went away before streaming started; weakref.finalize runs at most once.
+    chunks = _iter_bulk_report_zip(parsed_from, parsed_to, on_progress=log_progress)
+    release = weakref.finalize(chunks, _export_slots.release)
+    return StreamingResponse(
+        _iter_holding_export_slot(chunks, release),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="patient-reports-{parsed_from}-{parsed_to}.zip"'
+        },
     )
 
 
@@ -538,95 +1239,586 @@ def download_patient_report_pdf(
 
 # ---------- AI ANALYSIS ----------
 
+def _reserve_admission(clinical_payload: Dict[str, Any]) -> admission.Ticket:
+    try:
+        return ai.reserve_admission(clinical_payload)
+    except admission.AdmissionRejected as exc:
+        raise HTTPException(
+            status_code=exc.status_code,
+            detail=f"{exc} The visit was not saved. "
+            + _triage_fallback_text(triage.score_case(clinical_payload)),
+            headers={"Retry-After": str(math.ceil(exc.retry_after))},
+        ) from exc
+
+
+def _store_visit_for_analysis(data: AnalyzeVisitRequest) -> Tuple[str, Dict[str, Any], List[Dict[str, Any]]]:
+    with get_connection() as conn:
+        try:
+            visit_id, provisional = _persist_visit_inputs(conn, data)
+            history = _load_analysis_history(conn, data.patient_id)
+            conn.commit()
+        except HTTPException:
+            conn.rollback()
+            raise
+        except Exception as exc:
+            conn.rollback()
+            raise HTTPException(status_code=500, detail=f"Failed to analyze visit: {exc}") from exc
+    return visit_id, provisional, history
+
+
+def _persist_visit_inputs(conn: Any, data: AnalyzeVisitRequest) -> Tuple[str, Dict[str, Any]]:
+    cur = conn.cursor()
+
+    cur.execute("SELECT id FROM patients WHERE id = %s", (data.patient_id,))
+    if not cur.fetchone():
+        raise HTTPException(status_code=404, detail="Patient not found")
+
+    cur.execute("SELECT id FROM users WHERE id = %s", (data.doctor_id,))
+    if not cur.fetchone():
+        raise HTTPException(status_code=404, detail="Doctor not found")
+
+    visit_id = str(uuid.uuid4())
+    provisional = triage.score_case(data.model_dump())
+    cur.execute(
+        """
+        INSERT INTO visits (id, patient_id, doctor_id, analysis_status, triage_risk_level, triage_score)
+        VALUES (%s, %s, %s, 'pending', %s, %s)
+        """,
+        (visit_id, data.patient_id, data.doctor_id, provisional["risk_level"], provisional["score"])
+    )
+
+    # Save clinical inputs
+    cur.execute(
+        """
+        INSERT INTO clinical_inputs
+        (id, visit_id, symptoms, duration, severity, vitals, notes, doctor_diagnosis)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """,
+        (
+            str(uuid.uuid4()),
+            visit_id,
+            Json(data.symptoms),
+            data.duration,
+            data.severity,
+            Json(data.vitals),
+            data.notes,
+            data.doctor_diagnosis,
+        )
+    )
+
+    return visit_id, provisional
+
+
+def _load_analysis_history(conn: Any, patient_id: str) -> List[Dict[str, Any]]:
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT a.*
+        FROM ai_analysis a
+        JOIN visits v ON a.visit_id = v.id
+        WHERE v.patient_id = %s
+        ORDER BY a.created_at DESC
+        LIMIT 5
+        """,
+        (patient_id,)
+    )
+    return cur.fetchall()
+
+
+def _save_analysis_result(conn: Any, visit_id: str, ai_result: Dict[str, Any]) -> None:
+    cur = conn.cursor()
+    cur.execute(
+        """
+        INSERT INTO ai_analysis
+        (id, visit_id, probable_causes, risk_level,
+         specialist_recommendation, summary, confidence_score,
+         deviation_percentage, suggested_doctors)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """,
+        (
+            str(uuid.uuid4()),
+            visit_id,
+            Json(ai_result["probable_causes"]),
+            ai_result["risk_level"],
+            ai_result["specialist_recommendation"],
+            ai_result["summary"],
+            ai_result["confidence_score"],
+            ai_result["deviation_percentage"],
+            Json(ai_result["suggested_doctors"]),
+        )
+    )
+    cur.execute(
+        "UPDATE visits SET analysis_status = 'completed', analysis_error = NULL WHERE id = %s",
+        (visit_id,),
+    )
+
+
+def _triage_fallback_text(provisional: Dict[str, Any]) -> str:
+    return f"Provisional triage risk: {provisional['risk_level']} (score {provisional['score']})."
+
+
+def _mark_analysis_failed(visit_id: str, error: str) -> None:
+    try:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "UPDATE visits SET analysis_status = 'failed', analysis_error = %s WHERE id = %s",
+                (error[:1000], visit_id),
+            )
+            conn.commit()
+    except Exception:
+        logger.exception("Could not mark visit %s as analysis-failed", visit_id)
+
+
 @app.post("/visits/analyze")
 def analyze_visit(data: AnalyzeVisitRequest):
-    conn = get_connection()
-    cur = conn.cursor()
+    # Admission comes first, so a shed request stores nothing and its retry cannot
+    # leave a duplicate visit behind.
+    clinical_payload = data.model_dump(exclude={"patient_id", "doctor_id"})
+    ticket = _reserve_admission(clinical_payload)
 
+    # Phase 1: store the visit and inputs and read history, then release the connection
+    # so no connection or row lock is held during the model call.
     try:
-        cur.execute("SELECT id FROM patients WHERE id = %s", (data.patient_id,))
-        if not cur.fetchone():
-            raise HTTPException(status_code=404, detail="Patient not found")
+        visit_id, provisional, history = _store_visit_for_analysis(data)
+    except BaseException:
+        ticket.release()
+        raise
+
+    # Phase 2: AI call with no database resources held.
+    try:
+        ai_result = ai.analyze_case(clinical_payload, history, ticket)
+    except admission.AdmissionRejected as exc:
+        _mark_analysis_failed(visit_id, str(exc))
+        raise HTTPException(
+            status_code=exc.status_code,
+            detail=f"{exc} Visit {visit_id} was saved. " + _triage_fallback_text(provisional),
+            headers={"Retry-After": str(math.ceil(exc.retry_after))},
+        ) from exc
+    except resilience.CircuitOpenError as exc:
+        _mark_analysis_failed(visit_id, str(exc))
+        raise HTTPException(
+            status_code=503,
+            detail=f"AI provider is temporarily unavailable; visit {visit_id} was saved. "
+            + _triage_fallback_text(provisional),
+        ) from exc
+    except Exception as exc:
+        _mark_analysis_failed(visit_id, str(exc))
+        raise HTTPException(
+            status_code=502,
+            detail=f"Failed to analyze visit {visit_id}: {exc}. " + _triage_fallback_text(provisional),
+        ) from exc
+
+    # Phase 3: short transaction to record the result.
+    try:
+        with get_connection() as conn:
+            try:
+                _save_analysis_result(conn, visit_id, ai_result)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    except Exception as exc:
+        _mark_analysis_failed(visit_id, f"Could not save analysis: {exc}")
+        raise HTTPException(status_code=500, detail=f"Failed to analyze visit {visit_id}: {exc}") from exc
+
+    report_cache.invalidate_patient(str(uuid.UUID(data.patient_id)))
+    return {"visit_id": visit_id, **ai_result, "triage": provisional}
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _iter_visit_analysis_events(
+    visit_id: str,
+    patient_id: str,
+    provisional: Dict[str, Any],
+    clinical_payload: Dict[str, Any],
+    history: List[Dict[str, Any]],
+    settled: Dict[str, bool],
+    ticket: Optional[admission.Ticket] = None,
+) -> Iterator[str]:
+    # settled["done"] is set once the visit has a final status, before the last event.
+    yield _sse("visit", {"visit_id": visit_id})
+    yield _sse("triage", provisional)
+
+    ai_result = None
+    try:
+        # closing() ends the upstream call as soon as this generator is closed.
+        with closing(ai.analyze_case_stream(clinical_payload, history, ticket)) as analysis:
+            for kind, value in analysis:
+                if kind == "field":
+                    name, field_value = value
+                    yield _sse("field", {"name": name, "value": field_value})
+                else:
+                    ai_result = value
+    except Exception as exc:
+        _mark_analysis_failed(visit_id, str(exc))
+        settled["done"] = True
+        yield _sse("error", {"visit_id": visit_id, "detail": f"Failed to analyze visit: {exc}"})
+        return
+
+    try:
+        with get_connection() as conn:
+            try:
+                _save_analysis_result(conn, visit_id, ai_result)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    except Exception as exc:
+        _mark_analysis_failed(visit_id, f"Could not save analysis: {exc}")
+        settled["done"] = True
+        yield _sse("error", {"visit_id": visit_id, "detail": f"Failed to save analysis: {exc}"})
+        return
+
+    settled["done"] = True
+    report_cache.invalidate_patient(str(uuid.UUID(patient_id)))
+    yield _sse("result", {"visit_id": visit_id, **ai_result})
+
+
+def _fail_abandoned_visits(visit_ids: List[str], error: str) -> None:
+    # Runs from finalizers and generator cleanup, which can happen on the event loop, so
+    # the database writes go to their own thread.
+    def mark() -> None:
+        for visit_id in visit_ids:
+            _mark_analysis_failed(visit_id, error)
+
+    threading.Thread(target=mark, name="abandoned-visit", daemon=True).start()
 
-        cur.execute("SELECT id FROM users WHERE id = %s", (data.doctor_id,))
-        if not cur.fetchone():
-            raise HTTPException(status_code=404, detail="Doctor not found")
+
+def _fail_abandoned_visit(visit_id: str, settled: Dict[str, bool]) -> None:
+    # Finalizer for a dropped analysis stream.
+    if settled["done"]:
+        return
+    _fail_abandoned_visits([visit_id], "Client disconnected before the analysis completed")
+
+
+@app.post("/visits/analyze/stream")
+def analyze_visit_stream(data: AnalyzeVisitRequest):
+    # Same phases as analyze_visit, but model output is relayed over server-sent events.
+    clinical_payload = data.model_dump(exclude={"patient_id", "doctor_id"})
+    ticket = _reserve_admission(clinical_payload)
+    try:
+        visit_id, provisional, history = _store_visit_for_analysis(data)
+    except BaseException:
+        ticket.release()
+        raise
+
+    settled = {"done": False}
+    stream = _iter_visit_analysis_events(
+        visit_id, data.patient_id, provisional, clinical_payload, history, settled, ticket
+    )
+    # A client that disconnects, before or during the stream, drops the generator; the
+    # visit is then marked failed instead of staying pending, and an unspent admission
+    # goes back to the bucket.
+    weakref.finalize(stream, _fail_abandoned_visit, visit_id, settled)
+    weakref.finalize(stream, ticket.release)
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _persist_visit_batch(
+    conn: Any, items: List[AnalyzeVisitRequest]
+) -> Tuple[Dict[int, str], Dict[int, str], Dict[str, List[Dict[str, Any]]], Dict[int, Dict[str, Any]]]:
+    # Returns visit ids, errors and provisional triage by item index, and history by patient id.
+    errors: Dict[int, str] = {}
+    for index, item in enumerate(items):
+        try:
+            item.patient_id = str(uuid.UUID(item.patient_id))
+            item.doctor_id = str(uuid.UUID(item.doctor_id))
+        except ValueError:
+            errors[index] = "Invalid patient_id or doctor_id. Expected UUID."
+
+    valid = [index for index in range(len(items)) if index not in errors]
+    patient_ids = sorted({items[index].patient_id for index in valid})
+    doctor_ids = sorted({items[index].doctor_id for index in valid})
+
+    cur = conn.cursor()
+    cur.execute("SELECT id FROM patients WHERE id = ANY(%s::uuid[])", (patient_ids,))
+    known_patients = {str(row["id"]) for row in cur.fetchall()}
+    cur.execute("SELECT id FROM users WHERE id = ANY(%s::uuid[])", (doctor_ids,))
+    known_doctors = {str(row["id"]) for row in cur.fetchall()}
+
+    visit_ids: Dict[int, str] = {}
+    cases: List[Dict[str, Any]] = []
+    visit_rows: List[tuple] = []
+    input_rows: List[tuple] = []
+    for index in valid:
+        item = items[index]
+        if item.patient_id not in known_patients:
+            errors[index] = "Patient not found"
+            continue
+        if item.doctor_id not in known_doctors:
+            errors[index] = "Doctor not found"
+            continue
 
         visit_id = str(uuid.uuid4())
-        cur.execute(
+        visit_ids[index] = visit_id
+        visit_rows.append((visit_id, item.patient_id, item.doctor_id, "pending"))
+        cases.append(item.model_dump())
+        input_rows.append(
+            (
+                str(uuid.uuid4()),
+                visit_id,
+                Json(item.symptoms),
+                item.duration,
+                item.severity,
+                Json(item.vitals),
+                item.notes,
+                item.doctor_diagnosis,
+            )
+        )
+
+    triage_results: Dict[int, Dict[str, Any]] = {}
+    if visit_rows:
+        scores = triage.engine.score_batch(cases)
+        triage_results = dict(zip(visit_ids, scores))
+        visit_rows = [row + (score["risk_level"], score["score"]) for row, score in zip(visit_rows, scores)]
+        execute_values(
+            cur,
             """
-            INSERT INTO visits (id, patient_id, doctor_id)
-            VALUES (%s, %s, %s)
+            INSERT INTO visits (id, patient_id, doctor_id, analysis_status, triage_risk_level, triage_score)
+            VALUES %s
             """,
-            (visit_id, data.patient_id, data.doctor_id)
+            visit_rows,
         )
-
-        # Save clinical inputs
-        cur.execute(
+        execute_values(
+            cur,
             """
             INSERT INTO clinical_inputs
             (id, visit_id, symptoms, duration, severity, vitals, notes, doctor_diagnosis)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            VALUES %s
             """,
-            (
-                str(uuid.uuid4()),
-                visit_id,
-                Json(data.symptoms),
-                data.duration,
-                data.severity,
-                Json(data.vitals),
-                data.notes,
-                data.doctor_diagnosis,
-            )
+            input_rows,
         )
 
-        # Fetch patient history
+    histories: Dict[str, List[Dict[str, Any]]] = {}
+    batch_patients = sorted({items[index].patient_id for index in visit_ids})
+    if batch_patients:
+        # Latest five analyses per patient, matching _load_analysis_history.
         cur.execute(
             """
-            SELECT a.*
-            FROM ai_analysis a
-            JOIN visits v ON a.visit_id = v.id
-            WHERE v.patient_id = %s
-            ORDER BY a.created_at DESC
-            LIMIT 5
+            SELECT ranked.*
+            FROM (
+                SELECT a.*, v.patient_id AS history_patient_id,
+                       ROW_NUMBER() OVER (PARTITION BY v.patient_id ORDER BY a.created_at DESC) AS history_rank
+                FROM ai_analysis a
+                JOIN visits v ON a.visit_id = v.id
+                WHERE v.patient_id = ANY(%s::uuid[])
+            ) ranked
+            WHERE ranked.history_rank <= 5
+            ORDER BY ranked.history_patient_id, ranked.history_rank
             """,
-            (data.patient_id,)
+            (batch_patients,),
         )
-        history = cur.fetchall()
+        for row in cur.fetchall():
+            patient_id = str(row.pop("history_patient_id"))
+            row.pop("history_rank", None)
+            histories.setdefault(patient_id, []).append(row)
 
-        # AI call
-        clinical_payload = data.model_dump(exclude={"patient_id", "doctor_id"})
-        ai_result = ai.analyze_case(clinical_payload, history)
+    return visit_ids, errors, histories, triage_results
 
-        # Save AI result
-        cur.execute(
-            """
-            INSERT INTO ai_analysis
-            (id, visit_id, probable_causes, risk_level,
-             specialist_recommendation, summary, confidence_score,
-             deviation_percentage, suggested_doctors)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """,
-            (
-                str(uuid.uuid4()),
-                visit_id,
-                Json(ai_result["probable_causes"]),
-                ai_result["risk_level"],
-                ai_result["specialist_recommendation"],
-                ai_result["summary"],
-                ai_result["confidence_score"],
-                ai_result["deviation_percentage"],
-                Json(ai_result["suggested_doctors"]),
-            )
-        )
 
-        conn.commit()
-        return {"visit_id": visit_id, **ai_result}
-    except HTTPException:
-        conn.rollback()
+def _analyze_batch_item(
+    visit_id: str, item: AnalyzeVisitRequest, history: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    clinical_payload = item.model_dump(exclude={"patient_id", "doctor_id"})
+    try:
+        ai_result = ai.analyze_case(clinical_payload, history)
+    except Exception as exc:
+        _mark_analysis_failed(visit_id, str(exc))
         raise
+
+    try:
+        with get_connection() as conn:
+            try:
+                _save_analysis_result(conn, visit_id, ai_result)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
     except Exception as exc:
-        conn.rollback()
-        raise HTTPException(status_code=500, detail=f"Failed to analyze visit: {exc}") from exc
+        _mark_analysis_failed(visit_id, f"Could not save analysis: {exc}")
+        raise
+
+    report_cache.invalidate_patient(item.patient_id)
+    return ai_result
+
+
+def _iter_batch_results(
+    items: List[AnalyzeVisitRequest],
+    visit_ids: Dict[int, str],
+    errors: Dict[int, str],
+    histories: Dict[str, List[Dict[str, Any]]],
+    triage_results: Dict[int, Dict[str, Any]],
+    state: Dict[str, bool],
+) -> Iterator[str]:
+    # One JSON line per item, in completion order.
+    state["started"] = True
+    for index, error in sorted(errors.items()):
+        yield json.dumps({"index": index, "status": "error", "error": error}) + "\n"
+
+    if not visit_ids:
+        return
+
+    executor = ThreadPoolExecutor(
+        max_workers=min(ANALYZE_BATCH_CONCURRENCY, len(visit_ids)), thread_name_prefix="analyze-batch"
+    )
+    futures: Dict[Future, int] = {}
+    try:
+        for index, visit_id in visit_ids.items():
+            item = items[index]
+            futures[executor.submit(_analyze_batch_item, visit_id, item, histories.get(item.patient_id, []))] = index
+        for future in as_completed(futures):
+            index = futures[future]
+            line: Dict[str, Any] = {
+                "index": index,
+                "visit_id": visit_ids[index],
+                "triage": triage_results.get(index),
+            }
+            try:
+                line.update(status="completed", result=future.result())
+            except Exception as exc:
+                line.update(status="error", error=f"Failed to analyze visit: {exc}")
+            yield json.dumps(line, default=str) + "\n"
     finally:
-        conn.close()
+        # On a disconnect the generator is closed mid-stream, possibly on the event loop:
+        # drop the queued items without waiting for the running ones, which finish and
+        # record their own outcome.
+        executor.shutdown(wait=False, cancel_futures=True)
+        submitted = set(futures.values())
+        abandoned = [visit_ids[index] for future, index in futures.items() if future.cancelled()]
+        abandoned += [visit_id for index, visit_id in visit_ids.items() if index not in submitted]
+        if abandoned:
+            _fail_abandoned_visits(abandoned, "Client disconnected before the analysis started")
+
+
+def _fail_unstarted_batch(visit_ids: List[str], state: Dict[str, bool]) -> None:
+    # Finalizer for a batch stream dropped before its first line.
+    if not state["started"]:
+        _fail_abandoned_visits(visit_ids, "Client disconnected before the analysis started")
+
+
+@app.post("/visits/analyze/batch")
+def analyze_visit_batch(data: AnalyzeVisitBatchRequest):
+    if not data.items:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one item.")
+    if len(data.items) > ANALYZE_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400, detail=f"Batch is limited to {ANALYZE_BATCH_MAX_ITEMS} items."
+        )
+
+    with get_connection() as conn:
+        try:
+            visit_ids, errors, histories, triage_results = _persist_visit_batch(conn, data.items)
+            conn.commit()
+        except Exception as exc:
+            conn.rollback()
+            raise HTTPException(status_code=500, detail=f"Failed to store batch: {exc}") from exc
+
+    state = {"started": False}
+    stream = _iter_batch_results(data.items, visit_ids, errors, histories, triage_results, state)
+    # A client that disconnects before the stream starts drops the generator unstarted;
+    # every stored visit is then marked failed instead of staying pending.
+    weakref.finalize(stream, _fail_unstarted_batch, list(visit_ids.values()), state)
+    return StreamingResponse(stream, media_type="application/x-ndjson")
+
+
+def _run_analysis_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    with get_connection() as conn:
+        history = _load_analysis_history(conn, str(job["patient_id"]))
+    return ai.analyze_case(job["payload"], history)
+
+
+def _save_analysis_job_result(conn: Any, job: Dict[str, Any], ai_result: Dict[str, Any]) -> None:
+    _save_analysis_result(conn, str(job["visit_id"]), ai_result)
+    report_cache.invalidate_patient(str(job["patient_id"]))
+
+
+def _fail_analysis_job(job: Dict[str, Any], error: str) -> None:
+    _mark_analysis_failed(str(job["visit_id"]), error)
+
+
+analysis_jobs = jobs.AnalysisJobRunner(
+    run_job=_run_analysis_job,
+    save_result=_save_analysis_job_result,
+    on_failure=_fail_analysis_job,
+)
+
+
+def _serialize_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "job_id": str(job["id"]),
+        "visit_id": str(job["visit_id"]) if job.get("visit_id") else None,
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "result": job.get("result"),
+        "error": job.get("error"),
+        "created_at": _to_iso(job.get("created_at")),
+        "started_at": _to_iso(job.get("started_at")),
+        "finished_at": _to_iso(job.get("finished_at")),
+    }
+
+
+@app.post("/visits/analyze/jobs", status_code=202)
+def submit_analysis_job(data: AnalyzeVisitRequest, response: Response):
+    job_id = str(uuid.uuid4())
+    with get_connection() as conn:
+        try:
+            visit_id, provisional = _persist_visit_inputs(conn, data)
+            clinical_payload = data.model_dump(exclude={"patient_id", "doctor_id"})
+            jobs.enqueue(conn, job_id, visit_id, data.patient_id, clinical_payload)
+            conn.commit()
+        except HTTPException:
+            conn.rollback()
+            raise
+        except Exception as exc:
+            conn.rollback()
+            raise HTTPException(status_code=500, detail=f"Failed to queue analysis: {exc}") from exc
+
+    analysis_jobs.notify()
+    response.headers["Location"] = f"/visits/analyze/jobs/{job_id}"
+    return {"job_id": job_id, "visit_id": visit_id, "status": "pending", "triage": provisional}
+
+
+@app.get("/visits/analyze/jobs/{job_id}")
+def get_analysis_job(job_id: str):
+    job = jobs.get_job(_parse_uuid(job_id, "job_id"))
+    if not job:
+        raise HTTPException(status_code=404, detail="Analysis job not found")
+    return _serialize_job(job)
+
+
+@app.get("/visits/analyze/jobs/{job_id}/events")
+def stream_analysis_job(job_id: str):
+    parsed_job_id = _parse_uuid(job_id, "job_id")
+    if not jobs.get_job(parsed_job_id):
+        raise HTTPException(status_code=404, detail="Analysis job not found")
+
+    async def events() -> AsyncIterator[str]:
+        # Async so an idle subscriber holds no threadpool thread between polls; each poll
+        # borrows a thread and a pooled connection only for the status read.
+        deadline = monotonic() + ANALYSIS_JOB_EVENTS_TIMEOUT_SECONDS
+        last_status = None
+        while True:
+            job = await run_in_threadpool(jobs.get_job, parsed_job_id)
+            if job is None:
+                yield "event: error\ndata: {\"detail\": \"Analysis job not found\"}\n\n"
+                return
+            if job["status"] != last_status:
+                last_status = job["status"]
+                yield _sse("status", _serialize_job(job))
+            if job["status"] in jobs.TERMINAL_STATUSES:
+                return
+            if monotonic() >= deadline:
+                yield "event: timeout\ndata: {}\n\n"
+                return
+            yield ": keep-alive\n\n"
+            await asyncio.sleep(ANALYSIS_JOB_EVENTS_POLL_SECONDS)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
@@ -0,0 +1,138 @@
+import argparse
+import os
+import re
+import sys
+from typing import Any, List, Optional, Tuple
+
+from psycopg2 import errors
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_FILE_PATTERN = re.compile(r"^(\d+)_([A-Za-z0-9_]+)\.sql$")
+
+# Arbitrary constant shared by every process so concurrent cold starts apply migrations once.
+MIGRATION_LOCK_KEY = 72_114_015
+
+
+def list_migrations(directory: str = MIGRATIONS_DIR) -> List[Tuple[int, str, str]]:
+    migrations: List[Tuple[int, str, str]] = []
+    for filename in os.listdir(directory):
+        match = MIGRATION_FILE_PATTERN.match(filename)
+        if not match:
+            continue
+        migrations.append((int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+
+    migrations.sort()
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+def latest_version(directory: str = MIGRATIONS_DIR) -> int:
+    migrations = list_migrations(directory)
+    return migrations[-1][0] if migrations else 0
+
+
+def current_version(conn: Any) -> int:
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT COALESCE(MAX(version), 0) AS version FROM schema_version")
+    except errors.UndefinedTable:
+        conn.rollback()
+        return 0
+    row = cur.fetchone()
+    conn.rollback()
+    return int(row["version"])
+
+
+def apply_migrations(conn: Any, target: Optional[int] = None, directory: str = MIGRATIONS_DIR) -> List[int]:
+    applied: List[int] = []
+    cur = conn.cursor()
+
+    # The lock comes first: concurrent CREATE TABLE IF NOT EXISTS can still collide on
+    # the catalog and fail one of the runners.
+    cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT NOW()
+        );
+        """
+    )
+    conn.commit()
+
+    for version, name, path in list_migrations(directory):
+        if target is not None and version > target:
+            break
+
+        # Each migration runs in its own transaction under a shared advisory lock,
+        # re-checking the version so a concurrent runner cannot apply it twice.
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+        cur.execute("SELECT 1 FROM schema_version WHERE version = %s", (version,))
+        if cur.fetchone():
+            conn.rollback()
+            continue
+
+        with open(path, "r", encoding="utf-8") as handle:
+            sql = handle.read()
+
+        try:
+            cur.execute(sql)
+            cur.execute(
+                "INSERT INTO schema_version (version, name) VALUES (%s, %s)",
+                (version, name),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+
+    return applied
+
+
+def ensure_current(conn: Any, auto_migrate: bool) -> int:
+    # Fast path: a single version query and no DDL when the schema is up to date.
+    version = current_version(conn)
+    expected = latest_version()
+    if version >= expected:
+        return version
+
+    if not auto_migrate:
+        raise RuntimeError(
+            f"Database schema is at version {version} but {expected} is required. "
+            "Run `python migrate.py` before starting the API."
+        )
+
+    apply_migrations(conn)
+    return current_version(conn)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Apply CareAxis database migrations.")
+    parser.add_argument("--target", type=int, default=None, help="Stop after this migration version.")
+    parser.add_argument("--status", action="store_true", help="Print the current and latest versions and exit.")
+    args = parser.parse_args(argv)
+
+    from db import get_connection
+
+    with get_connection() as conn:
+        version = current_version(conn)
+        latest = latest_version()
+        if args.status:
+            print(f"current={version} latest={latest}")
+            return 0 if version >= latest else 1
+
+        applied = apply_migrations(conn, target=args.target)
+
+    if applied:
+        print(f"Applied migrations: {', '.join(str(v) for v in applied)}")
+    else:
+        print(f"Schema already at version {version}; nothing to apply.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,12 @@
+-- Secondary indexes for the patient report and history lookups.
+-- Plain CREATE INDEX because migrations run inside a transaction; run
+-- migrate.py during a quiet window on large tables.
+
+CREATE INDEX IF NOT EXISTS idx_visits_patient_created_at
+ON visits (patient_id, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_clinical_inputs_visit_id
+ON clinical_inputs (visit_id);
+
+CREATE INDEX IF NOT EXISTS idx_ai_analysis_visit_id
+ON ai_analysis (visit_id);
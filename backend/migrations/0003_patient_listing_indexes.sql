@@ -0,0 +1,10 @@
+-- Keyset pagination and filters for GET /patients.
+
+CREATE INDEX IF NOT EXISTS idx_patients_created_at_id
+ON patients (created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_patients_lower_full_name
+ON patients (lower(full_name) text_pattern_ops);
+
+CREATE INDEX IF NOT EXISTS idx_patients_phone
+ON patients (phone);
@@ -0,0 +1,13 @@
+-- Type-ahead patient search: trigram matching on names and prefix
+-- matching on phone numbers and health IDs.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_patients_full_name_trgm
+ON patients USING gin (full_name gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_patients_phone_pattern
+ON patients (phone text_pattern_ops);
+
+CREATE INDEX IF NOT EXISTS idx_patients_health_id_pattern
+ON patients (health_id text_pattern_ops);
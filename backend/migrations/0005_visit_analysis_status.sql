@@ -0,0 +1,9 @@
+-- Track the AI analysis outcome on each visit now that the visit is committed
+-- before the model call. Existing rows predate the status and stay NULL.
+
+ALTER TABLE visits
+ADD COLUMN IF NOT EXISTS analysis_status TEXT
+CHECK (analysis_status IN ('pending', 'completed', 'failed'));
+
+ALTER TABLE visits
+ADD COLUMN IF NOT EXISTS analysis_error TEXT;
@@ -0,0 +1,26 @@
+-- Durable queue for asynchronous visit analysis. Pending and stale running
+-- jobs are picked up again after a restart.
+
+CREATE TABLE IF NOT EXISTS analysis_jobs (
+    id UUID PRIMARY KEY,
+    visit_id UUID REFERENCES visits(id) ON DELETE CASCADE,
+    patient_id UUID REFERENCES patients(id) ON DELETE CASCADE,
+    payload JSONB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('pending', 'running', 'completed', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result JSONB,
+    error TEXT,
+    available_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    created_at TIMESTAMP DEFAULT NOW(),
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_analysis_jobs_pending
+ON analysis_jobs (available_at)
+WHERE status = 'pending';
+
+CREATE INDEX IF NOT EXISTS idx_analysis_jobs_running
+ON analysis_jobs (started_at)
+WHERE status = 'running';
@@ -0,0 +1,12 @@
+-- Shared tier of the AI analysis cache, keyed by a hash of the normalized
+-- clinical payload and patient history digest.
+
+CREATE TABLE IF NOT EXISTS analysis_cache (
+    cache_key TEXT PRIMARY KEY,
+    result JSONB NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_analysis_cache_expires_at
+ON analysis_cache (expires_at);
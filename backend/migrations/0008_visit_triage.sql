@@ -0,0 +1,7 @@
+-- Provisional rule-based triage, computed before the AI analysis runs.
+
+ALTER TABLE visits
+ADD COLUMN IF NOT EXISTS triage_risk_level TEXT;
+
+ALTER TABLE visits
+ADD COLUMN IF NOT EXISTS triage_score INTEGER;
@@ -0,0 +1,7 @@
+-- GET /patients sorts on COALESCE(created_at, 'epoch') so rows without a
+-- created_at still get a usable cursor; index that expression instead.
+
+CREATE INDEX IF NOT EXISTS idx_patients_sort_key_id
+ON patients ((COALESCE(created_at, 'epoch'::timestamp)) DESC, id DESC);
+
+DROP INDEX IF EXISTS idx_patients_created_at_id;
@@ -0,0 +1,4 @@
+-- idx_patients_phone_pattern (0004) serves phone equality as well as prefix
+-- matches, so the plain btree from 0003 only costs writes.
+
+DROP INDEX IF EXISTS idx_patients_phone;
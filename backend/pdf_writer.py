@@ -0,0 +1,183 @@
+import os
+import zlib
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+MAX_LINES_PER_PAGE = 48
+# 0 disables FlateDecode; 1-9 trade CPU for size like zlib levels.
+COMPRESSION_LEVEL = int(os.getenv("PDF_COMPRESSION_LEVEL", "6"))
+OBJECT_STREAMS = os.getenv("PDF_OBJECT_STREAMS", "true").lower() in ("1", "true", "yes")
+# Non-stream objects are flushed into an object stream once this many are pending.
+OBJECT_STREAM_BATCH = 100
+
+CATALOG_ID = 1
+PAGES_ID = 2
+FONT_ID = 3
+
+
+def _escape_pdf_text(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _render_page_stream(page_lines: List[str]) -> bytes:
+    commands = ["BT", "/F1 10 Tf", "40 770 Td"]
+    for line_index, line in enumerate(page_lines):
+        if line_index == 0:
+            commands.append(f"({_escape_pdf_text(line)}) Tj")
+        else:
+            commands.append("0 -15 Td")
+            commands.append(f"({_escape_pdf_text(line)}) Tj")
+    commands.append("ET")
+    return "\n".join(commands).encode("latin-1", errors="replace")
+
+
+class _PdfStreamWriter:
+    # Tracks byte positions and cross-reference entries while objects are yielded.
+    # Entries are (1, offset) for objects written directly and (2, objstm_id, index)
+    # for objects packed into an object stream.
+
+    def __init__(self, compression_level: int, object_streams: bool):
+        if compression_level < 0 or compression_level > 9:
+            raise ValueError("compression_level must be between 0 and 9")
+        self.compression_level = compression_level
+        self.object_streams = object_streams
+        self.position = 0
+        self.next_id = FONT_ID + 1
+        self.entries: Dict[int, Tuple[int, int, int]] = {}
+        self.pending: List[Tuple[int, bytes]] = []
+
+    def header(self) -> bytes:
+        version = b"1.5" if self.object_streams else b"1.4"
+        chunk = b"%PDF-" + version + b"\n%\xe2\xe3\xcf\xd3\n"
+        self.position += len(chunk)
+        return chunk
+
+    def reserve(self) -> int:
+        obj_id = self.next_id
+        self.next_id += 1
+        return obj_id
+
+    def _write(self, obj_id: int, body: bytes) -> bytes:
+        self.entries[obj_id] = (1, self.position, 0)
+        chunk = f"{obj_id} 0 obj\n".encode("ascii") + body + b"\nendobj\n"
+        self.position += len(chunk)
+        return chunk
+
+    def _stream_body(self, data: bytes, extra: str = "") -> bytes:
+        filter_entry = ""
+        if self.compression_level:
+            data = zlib.compress(data, self.compression_level)
+            filter_entry = " /Filter /FlateDecode"
+        return (
+            f"<<{extra} /Length {len(data)}{filter_entry} >>\nstream\n".encode("ascii")
+            + data
+            + b"\nendstream"
+        )
+
+    def add_object(self, obj_id: int, body: bytes) -> bytes:
+        if not self.object_streams:
+            return self._write(obj_id, body)
+        self.pending.append((obj_id, body))
+        if len(self.pending) >= OBJECT_STREAM_BATCH:
+            return self.flush()
+        return b""
+
+    def add_stream(self, obj_id: int, data: bytes) -> bytes:
+        return self._write(obj_id, self._stream_body(data))
+
+    def flush(self) -> bytes:
+        if not self.pending:
+            return b""
+        objstm_id = self.reserve()
+        offsets: List[str] = []
+        bodies = bytearray()
+        for index, (obj_id, body) in enumerate(self.pending):
+            offsets.append(f"{obj_id} {len(bodies)}")
+            bodies.extend(body)
+            bodies.extend(b"\n")
+            self.entries[obj_id] = (2, objstm_id, index)
+        header = (" ".join(offsets) + "\n").encode("ascii")
+        extra = f" /Type /ObjStm /N {len(self.pending)} /First {len(header)}"
+        self.pending = []
+        return self._write(objstm_id, self._stream_body(header + bytes(bodies), extra))
+
+    def finish(self) -> bytes:
+        tail = bytearray(self.flush())
+        xref_start = self.position
+
+        if not self.object_streams:
+            size = self.next_id
+            tail.extend(f"xref\n0 {size}\n".encode("ascii"))
+            tail.extend(b"0000000000 65535 f \n")
+            for obj_id in range(1, size):
+                tail.extend(f"{self.entries[obj_id][1]:010d} 00000 n \n".encode("ascii"))
+            tail.extend(
+                f"trailer\n<< /Size {size} /Root {CATALOG_ID} 0 R >>\nstartxref\n{xref_start}\n%%EOF".encode(
+                    "ascii"
+                )
+            )
+            return bytes(tail)
+
+        xref_id = self.reserve()
+        self.entries[xref_id] = (1, xref_start, 0)
+        size = self.next_id
+        rows = bytearray(b"\x00" + (0).to_bytes(4, "big") + (65535).to_bytes(2, "big"))
+        for obj_id in range(1, size):
+            kind, field2, field3 = self.entries[obj_id]
+            rows.extend(bytes([kind]) + field2.to_bytes(4, "big") + field3.to_bytes(2, "big"))
+        extra = f" /Type /XRef /Size {size} /W [1 4 2] /Root {CATALOG_ID} 0 R"
+        tail.extend(f"{xref_id} 0 obj\n".encode("ascii"))
+        tail.extend(self._stream_body(bytes(rows), extra))
+        tail.extend(f"\nendobj\nstartxref\n{xref_start}\n%%EOF".encode("ascii"))
+        return bytes(tail)
+
+
+def iter_pdf_from_lines(
+    lines: Iterable[str],
+    compression_level: Optional[int] = None,
+    object_streams: Optional[bool] = None,
+) -> Iterator[bytes]:
+    # The page tree is written last, once every page id is known, so memory stays
+    # bounded by one page plus the cross-reference table.
+    writer = _PdfStreamWriter(
+        COMPRESSION_LEVEL if compression_level is None else compression_level,
+        OBJECT_STREAMS if object_streams is None else object_streams,
+    )
+
+    yield writer.header() + writer.add_object(
+        CATALOG_ID, f"<< /Type /Catalog /Pages {PAGES_ID} 0 R >>".encode("ascii")
+    ) + writer.add_object(FONT_ID, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    page_ids: List[int] = []
+    line_iter = iter(lines)
+    while True:
+        page_lines = list(islice(line_iter, MAX_LINES_PER_PAGE))
+        if not page_lines:
+            if page_ids:
+                break
+            page_lines = ["No data"]
+
+        page_obj_id = writer.reserve()
+        content_obj_id = writer.reserve()
+        page_ids.append(page_obj_id)
+
+        page = (
+            f"<< /Type /Page /Parent {PAGES_ID} 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 {FONT_ID} 0 R >> >> /Contents {content_obj_id} 0 R >>".encode(
+                "ascii"
+            )
+        )
+        yield writer.add_stream(content_obj_id, _render_page_stream(page_lines)) + writer.add_object(
+            page_obj_id, page
+        )
+
+    kids = " ".join(f"{obj_id} 0 R" for obj_id in page_ids)
+    pages = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode("ascii")
+    yield writer.add_object(PAGES_ID, pages) + writer.finish()
+
+
+def build_pdf_from_lines(
+    lines: Iterable[str],
+    compression_level: Optional[int] = None,
+    object_streams: Optional[bool] = None,
+) -> bytes:
+    return b"".join(iter_pdf_from_lines(lines, compression_level, object_streams))
@@ -0,0 +1,119 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+MAX_ENTRIES = int(os.getenv("REPORT_CACHE_MAX_ENTRIES", "256"))
+# Rendered PDFs larger than this are served but not kept in memory.
+MAX_PDF_BYTES = int(os.getenv("REPORT_CACHE_MAX_PDF_BYTES", str(2 * 1024 * 1024)))
+
+CacheKey = Tuple[str, Optional[str], Optional[str]]
+
+
+def make_key(patient_id: str, from_date: Any, to_date: Any) -> CacheKey:
+    return (
+        patient_id,
+        str(from_date) if from_date else None,
+        str(to_date) if to_date else None,
+    )
+
+
+def make_etag(key: CacheKey, version: Tuple[Any, ...], representation: str) -> str:
+    # Weak: the tag follows the data version, but each build stamps its own generated_at,
+    # so two responses with the same tag are equivalent rather than byte-identical.
+    seed = "|".join([representation, *(part or "" for part in key), *(str(part) for part in version)])
+    return 'W/"' + hashlib.sha256(seed.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def _opaque_tag(etag: str) -> str:
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match uses the weak comparison (RFC 9110, 13.1.2): W/ prefixes are ignored.
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or _opaque_tag(etag) in {_opaque_tag(candidate) for candidate in candidates}
+
+
+class ReportCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_pdf_bytes: int = MAX_PDF_BYTES):
+        self.max_entries = max_entries
+        self.max_pdf_bytes = max_pdf_bytes
+        self._entries: "OrderedDict[CacheKey, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def _lookup(self, key: CacheKey, version: Tuple[Any, ...], field: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry["version"] != version or entry.get(field) is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[field]
+
+    def _store(self, key: CacheKey, version: Tuple[Any, ...], field: str, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry["version"] != version:
+                entry = {"version": version}
+                self._entries[key] = entry
+            entry[field] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def get_payload(self, key: CacheKey, version: Tuple[Any, ...]) -> Optional[Dict[str, Any]]:
+        return self._lookup(key, version, "payload")
+
+    def put_payload(self, key: CacheKey, version: Tuple[Any, ...], payload: Dict[str, Any]) -> None:
+        self._store(key, version, "payload", payload)
+
+    def get_json(self, key: CacheKey, version: Tuple[Any, ...]) -> Optional[str]:
+        return self._lookup(key, version, "json")
+
+    def put_json(self, key: CacheKey, version: Tuple[Any, ...], document: str) -> None:
+        self._store(key, version, "json", document)
+
+    def get_pdf(self, key: CacheKey, version: Tuple[Any, ...]) -> Optional[bytes]:
+        return self._lookup(key, version, "pdf")
+
+    def put_pdf(self, key: CacheKey, version: Tuple[Any, ...], pdf: bytes) -> None:
+        if len(pdf) > self.max_pdf_bytes:
+            return
+        self._store(key, version, "pdf", pdf)
+
+    def invalidate_patient(self, patient_id: str) -> None:
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == patient_id]
+            for key in stale:
+                del self._entries[key]
+            self._invalidations += len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+            }
+
+
+report_cache = ReportCache()
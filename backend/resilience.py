@@ -0,0 +1,196 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class CircuitBreaker:
+    # closed -> open after `failure_threshold` consecutive failures; after `reset_seconds`
+    # a single half-open trial decides whether to close again or re-open.
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._rejected = 0
+        self._opens = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self._state = "half_open"
+                self._trial_in_flight = False
+            if self._state == "closed":
+                return True
+            if self._state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self._rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = "closed"
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def abandon(self) -> None:
+        # The caller gave up without an outcome (e.g. its client disconnected). That says
+        # nothing about the provider, so a half-open trial is handed to the next caller.
+        with self._lock:
+            if self._state == "half_open":
+                self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == "half_open" or self._failures >= self.failure_threshold:
+                if self._state != "open":
+                    self._opens += 1
+                self._state = "open"
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "opens": self._opens,
+                "rejected": self._rejected,
+            }
+
+
+class LatencyWindow:
+    def __init__(self, size: int = 200):
+        self._lock = threading.Lock()
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, fraction: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < max(min_samples, 1):
+                return None
+            ordered = sorted(self._samples)
+        index = min(int(fraction * len(ordered)), len(ordered) - 1)
+        return ordered[index]
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    # Full jitter: uniform in [0, min(cap, base * 2^(attempt-1))].
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+
+def call_with_retries(
+    fn: Callable[[float], T],
+    *,
+    deadline_seconds: float,
+    attempt_timeout_seconds: float,
+    max_retries: int,
+    backoff_base: float,
+    backoff_cap: float,
+    is_retryable: Callable[[BaseException], bool],
+    breaker: Optional[CircuitBreaker] = None,
+    on_retry: Optional[Callable[[int, BaseException], None]] = None,
+    admit: Optional[Callable[[float], Any]] = None,
+) -> T:
+    # `fn` receives the timeout for its attempt, bounded by what is left of the deadline.
+    # `admit`, if given, runs before every attempt with the time left; it blocks until the
+    # attempt may go upstream or raises to give up, and its wait comes out of the deadline.
+    deadline = time.monotonic() + deadline_seconds
+    attempt = 0
+    while True:
+        if admit is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded(f"AI call exceeded its {deadline_seconds}s deadline")
+            admit(remaining)
+
+        if breaker is not None and not breaker.allow():
+            raise CircuitOpenError("AI provider circuit is open; failing fast")
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"AI call exceeded its {deadline_seconds}s deadline")
+
+        try:
+            result = fn(min(attempt_timeout_seconds, remaining))
+        except Exception as exc:
+            retryable = is_retryable(exc)
+            if breaker is not None:
+                # Non-retryable errors (bad requests) mean the provider answered, so they
+                # do not count against its health.
+                if retryable:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+            attempt += 1
+            if not retryable or attempt > max_retries:
+                raise
+            delay = backoff_delay(attempt, backoff_base, backoff_cap)
+            if time.monotonic() + delay >= deadline:
+                raise
+            if on_retry:
+                on_retry(attempt, exc)
+            time.sleep(delay)
+            continue
+
+        if breaker is not None:
+            breaker.record_success()
+        return result
+
+
+def hedged_call(
+    fn: Callable[[], T],
+    executor: ThreadPoolExecutor,
+    hedge_after: Optional[float],
+    on_hedge: Optional[Callable[[], None]] = None,
+    on_hedge_win: Optional[Callable[[], None]] = None,
+    admit_hedge: Optional[Callable[[], bool]] = None,
+) -> T:
+    # Runs `fn`; if it has not finished after `hedge_after` seconds, starts a second copy
+    # and returns whichever succeeds first. The slower copy is left to finish on its own.
+    # `admit_hedge`, if given, must return True right away for the second copy to start.
+    if hedge_after is None:
+        return fn()
+
+    primary: Future = executor.submit(fn)
+    done, _ = wait([primary], timeout=hedge_after)
+    if done or (admit_hedge is not None and not admit_hedge()):
+        return primary.result()
+
+    hedge: Future = executor.submit(fn)
+    if on_hedge:
+        on_hedge()
+
+    pending = {primary, hedge}
+    last_error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            error = future.exception()
+            if error is None:
+                if future is hedge and on_hedge_win:
+                    on_hedge_win()
+                return future.result()
+            last_error = error
+    raise last_error
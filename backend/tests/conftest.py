@@ -0,0 +1,39 @@
+import os
+import sys
+import uuid
+from typing import Any, Iterator
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# Database tests run against a disposable database created on this server, e.g.
+#   DATABASE_URL=postgresql://postgres@127.0.0.1:5432/postgres python -m pytest tests
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+
+@pytest.fixture(scope="module")
+def pg_conn() -> Iterator[Any]:
+    if not DATABASE_URL:
+        pytest.skip("DATABASE_URL is not set")
+
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+
+    import migrate
+
+    name = f"careaxis_test_{uuid.uuid4().hex[:8]}"
+    admin = psycopg2.connect(DATABASE_URL)
+    admin.autocommit = True
+    admin.cursor().execute(f"CREATE DATABASE \"{name}\" TEMPLATE template0 ENCODING 'UTF8'")
+
+    conn = psycopg2.connect(DATABASE_URL, dbname=name, cursor_factory=RealDictCursor)
+    try:
+        migrate.apply_migrations(conn)
+        yield conn
+    finally:
+        conn.close()
+        admin.cursor().execute(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+        admin.close()
@@ -0,0 +1,298 @@
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import admission
+import ai
+import analysis_cache
+import fake_cohere
+import main
+import resilience
+
+MESSAGES = [{"role": "user", "content": "ping"}]
+
+
+class _RecordingScheduler(admission.AdmissionScheduler):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waits = []
+
+    def acquire(self, priority, max_wait_seconds=None):
+        self.waits.append(max_wait_seconds)
+        return super().acquire(priority, max_wait_seconds)
+
+
+@pytest.fixture(scope="module")
+def server():
+    fake = fake_cohere.FakeCohere(fake_cohere.ModelProfile(fake_cohere.LatencyModel("fixed", 0)))
+    with fake_cohere.serve_in_thread(fake) as url:
+        yield fake, url
+
+
+@pytest.fixture
+def fake(server, monkeypatch):
+    fake, url = server
+    fake.reset()
+    manager = ai._CohereClientManager()
+    monkeypatch.setattr(ai, "COHERE_BASE_URL", url)
+    monkeypatch.setattr(ai, "_client_manager", manager)
+    monkeypatch.setattr(ai, "_breaker", resilience.CircuitBreaker(failure_threshold=10, reset_seconds=60))
+    monkeypatch.setattr(ai, "AI_BACKOFF_BASE_SECONDS", 0.01)
+    monkeypatch.setattr(ai, "AI_BACKOFF_MAX_SECONDS", 0.02)
+    monkeypatch.setenv("COHERE_API_KEY", "test")
+    yield fake
+    manager.close()
+
+
+def _use_scheduler(monkeypatch, **overrides):
+    options = dict(rate_per_second=0, burst=1, max_queue=10, max_wait_seconds=5)
+    options.update(overrides)
+    scheduler = _RecordingScheduler(**options)
+    monkeypatch.setattr(ai, "_admission", scheduler)
+    return scheduler
+
+
+def _requests(fake):
+    return sum(model["requests"] for model in fake.stats()["models"].values())
+
+
+def test_every_retry_takes_its_own_token(fake, monkeypatch):
+    scheduler = _use_scheduler(monkeypatch)
+    fake.inject(2, status=503)
+
+    assert ai._chat(MESSAGES, ai.MODEL_NAME, 0, ai.AI_CALL_DEADLINE_SECONDS).message is not None
+
+    assert _requests(fake) == 3
+    assert scheduler.stats()["admitted"] == 3
+    # Each wait is bounded by what is left of the call's deadline.
+    assert all(wait <= ai.AI_CALL_DEADLINE_SECONDS for wait in scheduler.waits)
+
+
+def test_rejected_retry_does_not_count_against_the_provider(fake, monkeypatch):
+    # One token and no refill: the first attempt gets it, the retry cannot queue.
+    _use_scheduler(monkeypatch, rate_per_second=0.001, max_queue=0)
+    fake.inject(1, status=503)
+
+    with pytest.raises(admission.QueueFull):
+        ai._chat(MESSAGES, ai.MODEL_NAME, 0, ai.AI_CALL_DEADLINE_SECONDS)
+
+    assert _requests(fake) == 1
+    assert ai._breaker.stats()["consecutive_failures"] == 1
+
+
+def test_hedge_is_skipped_without_a_free_token(fake, monkeypatch):
+    scheduler = _use_scheduler(monkeypatch, rate_per_second=0.001)
+    monkeypatch.setattr(ai, "AI_HEDGE_ENABLED", True)
+    monkeypatch.setattr(ai._router, "latency", lambda model, fraction, min_samples=1: 0.05)
+    hedges = ai.resilience_stats()["hedges"]
+    fake.inject(1, delay_seconds=0.3)
+
+    assert ai._chat(MESSAGES, ai.MODEL_NAME, 0, ai.AI_CALL_DEADLINE_SECONDS).message is not None
+
+    assert _requests(fake) == 1
+    assert ai.resilience_stats()["hedges"] == hedges
+    assert scheduler.stats()["declined"] == 1
+
+
+def test_queue_is_capped_below_the_request_threadpool(monkeypatch):
+    scheduler = _use_scheduler(monkeypatch, rate_per_second=0.001, max_queue=100)
+
+    assert ai.bound_admission_queue(40) == 40 - ai.AI_QUEUE_RESERVED_THREADS
+    assert ai.bound_admission_queue(10) == 0
+
+    scheduler.acquire(0)
+    started = time.monotonic()
+    with pytest.raises(admission.QueueFull):
+        scheduler.acquire(0)
+    # Shed at once instead of holding a thread for the queue wait.
+    assert time.monotonic() - started < 0.5
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Admission time only moves when a test advances it; waiters still block on the
+    # condition, so every step below is taken under the scheduler's lock.
+    clock = _Clock()
+    monkeypatch.setattr(admission, "time", SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def _advance(scheduler, clock, seconds):
+    clock.now += seconds
+    with scheduler._cond:
+        scheduler._cond.notify_all()
+
+
+def _until(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.002)
+
+
+def _enqueue(scheduler, priority, outcomes, label, max_wait_seconds=None):
+    # Starts a waiter and returns once it is in the queue, so arrival order is fixed.
+    depth = scheduler.stats()["queue_depth"]
+
+    def wait():
+        try:
+            scheduler.acquire(priority, max_wait_seconds)
+            outcomes.append(label)
+        except admission.AdmissionRejected as exc:
+            outcomes.append((label, exc))
+
+    thread = threading.Thread(target=wait, daemon=True)
+    thread.start()
+    _until(lambda: scheduler.stats()["queue_depth"] > depth or len(outcomes) > 0)
+    return thread
+
+
+def test_waiters_are_admitted_most_urgent_first_then_in_arrival_order(clock):
+    scheduler = admission.AdmissionScheduler(rate_per_second=1, burst=1, max_queue=10, max_wait_seconds=60)
+    scheduler.acquire(0)
+    admitted = []
+    threads = [
+        _enqueue(scheduler, priority, admitted, label)
+        for priority, label in [(5, "low"), (-3, "urgent-1"), (0, "medium"), (-3, "urgent-2")]
+    ]
+
+    for step in range(len(threads)):
+        # One token per second: exactly one waiter gets in per step.
+        _advance(scheduler, clock, 1.0)
+        _until(lambda: len(admitted) == step + 1)
+
+    assert admitted == ["urgent-1", "urgent-2", "medium", "low"]
+    for thread in threads:
+        thread.join(5)
+    assert scheduler.stats()["queue_depth"] == 0
+
+
+def test_full_queue_evicts_the_least_urgent_waiter_or_sheds_the_newcomer(clock):
+    scheduler = admission.AdmissionScheduler(rate_per_second=1, burst=1, max_queue=2, max_wait_seconds=60)
+    scheduler.acquire(0)
+    outcomes = []
+    threads = [_enqueue(scheduler, 5, outcomes, "low"), _enqueue(scheduler, 1, outcomes, "medium")]
+
+    threads.append(_enqueue(scheduler, -2, outcomes, "urgent"))
+    _until(lambda: len(outcomes) == 1)
+    (label, evicted), = outcomes
+    assert label == "low"
+    assert isinstance(evicted, admission.QueueFull) and evicted.status_code == 429
+    assert evicted.retry_after >= 1
+
+    # Not more urgent than anyone queued: shed at once, nobody is displaced.
+    with pytest.raises(admission.QueueFull) as shed:
+        scheduler.acquire(1)
+    assert shed.value.status_code == 429
+    stats = scheduler.stats()
+    assert (stats["evicted"], stats["shed_full"], stats["queue_depth"]) == (1, 1, 2)
+
+    _advance(scheduler, clock, 1.0)
+    _until(lambda: len(outcomes) == 2)
+    _advance(scheduler, clock, 1.0)
+    _until(lambda: len(outcomes) == 3)
+    assert outcomes[1:] == ["urgent", "medium"]
+    for thread in threads:
+        thread.join(5)
+
+
+def test_waiter_times_out_after_max_wait(clock):
+    scheduler = admission.AdmissionScheduler(rate_per_second=0.01, burst=1, max_queue=10, max_wait_seconds=60)
+    scheduler.acquire(0)
+    outcomes = []
+    thread = _enqueue(scheduler, 0, outcomes, "waiter", max_wait_seconds=5)
+
+    _advance(scheduler, clock, 4.9)
+    time.sleep(0.05)
+    assert outcomes == [] and scheduler.stats()["queue_depth"] == 1
+
+    _advance(scheduler, clock, 0.2)
+    _until(lambda: outcomes)
+    thread.join(5)
+    (label, timed_out), = outcomes
+    assert isinstance(timed_out, admission.QueueTimeout) and timed_out.status_code == 503
+    assert scheduler.stats()["timed_out"] == 1 and scheduler.stats()["queue_depth"] == 0
+
+
+def test_token_bucket_refills_at_its_rate_up_to_burst(clock):
+    bucket = admission.TokenBucket(rate=2, burst=3)
+
+    assert [bucket.take() for _ in range(3)] == [0, 0, 0]
+    assert bucket.take() == pytest.approx(0.5)
+    clock.now += 0.25
+    assert bucket.take() == pytest.approx(0.25)
+    clock.now += 0.25
+    assert bucket.take() == 0
+    assert bucket.take() == pytest.approx(0.5)
+
+    clock.now += 60
+    assert bucket.available() == 3
+    bucket.refund()
+    assert bucket.available() == 3
+
+
+def test_unspent_ticket_is_refunded_once(clock):
+    scheduler = admission.AdmissionScheduler(rate_per_second=1, burst=1, max_queue=10, max_wait_seconds=60)
+    ticket = scheduler.reserve(0)
+    assert scheduler.try_acquire() is False
+
+    ticket.release()
+    ticket.release()
+
+    assert ticket.spend() is False
+    assert scheduler.stats()["refunded"] == 1
+    assert scheduler.try_acquire() is True
+    assert scheduler.try_acquire() is False
+
+
+def test_reserved_ticket_pays_for_the_first_attempt(fake, monkeypatch):
+    scheduler = _use_scheduler(monkeypatch)
+    monkeypatch.setattr(analysis_cache, "ENABLED", False)
+    ticket = scheduler.reserve(0)
+
+    assert ai._chat(MESSAGES, ai.MODEL_NAME, 0, ai.AI_CALL_DEADLINE_SECONDS, ticket).message is not None
+
+    # One reservation, no second acquire for the attempt, nothing to refund.
+    assert scheduler.waits == [None]
+    assert scheduler.stats()["admitted"] == 1
+    ticket.release()
+    assert scheduler.stats()["refunded"] == 0
+
+
+def test_shed_visit_is_not_stored(monkeypatch):
+    scheduler = _use_scheduler(monkeypatch, rate_per_second=0.001, max_queue=0)
+    scheduler.acquire(0)
+
+    def get_connection():
+        raise AssertionError("a shed request must not store its visit")
+
+    monkeypatch.setattr(main, "get_connection", get_connection)
+    response = TestClient(main.app).post(
+        "/visits/analyze",
+        json={
+            "symptoms": ["fever"],
+            "duration": "2 days",
+            "severity": "medium",
+            "vitals": {},
+            "notes": "",
+            "doctor_diagnosis": "",
+            "patient_id": str(uuid.uuid4()),
+            "doctor_id": str(uuid.uuid4()),
+        },
+    )
+
+    assert response.status_code == 429
+    assert "not saved" in response.json()["detail"]
+    assert int(response.headers["Retry-After"]) >= 1
@@ -0,0 +1,99 @@
+import threading
+
+import pytest
+
+import ai
+import fake_cohere
+
+MESSAGES = [{"role": "user", "content": "ping"}]
+
+
+@pytest.fixture(scope="module")
+def fake_url():
+    fake = fake_cohere.FakeCohere(fake_cohere.ModelProfile(fake_cohere.LatencyModel("fixed", 0)))
+    with fake_cohere.serve_in_thread(fake) as url:
+        yield url
+
+
+@pytest.fixture
+def manager(fake_url, monkeypatch):
+    manager = ai._CohereClientManager()
+    monkeypatch.setattr(ai, "COHERE_BASE_URL", fake_url)
+    monkeypatch.setattr(ai, "_client_manager", manager)
+    monkeypatch.setenv("COHERE_API_KEY", "key-1")
+    yield manager
+    manager.close()
+
+
+def _chat(client):
+    return client.chat(model="command-r", messages=MESSAGES, request_options={"max_retries": 0})
+
+
+def test_calls_share_one_client(manager):
+    with ai.lease_client() as first:
+        _chat(first)
+    with ai.lease_client() as second:
+        _chat(second)
+
+    assert first is second
+    assert manager.stats()["client_builds"] == 1
+    assert manager.stats()["clients_closed"] == 0
+
+
+def test_rotation_closes_idle_client_immediately(manager, monkeypatch):
+    with ai.lease_client() as old:
+        _chat(old)
+    old_http = manager._current.http_client
+
+    monkeypatch.setenv("COHERE_API_KEY", "key-2")
+    with ai.lease_client() as new:
+        _chat(new)
+
+    assert new is not old
+    assert old_http.is_closed
+    assert manager.stats()["clients_closed"] == 1
+
+
+def test_rotation_waits_for_in_flight_calls(manager, monkeypatch):
+    leased = threading.Event()
+    rotated = threading.Event()
+    finished = threading.Event()
+    seen = {}
+
+    def in_flight_call():
+        with ai.lease_client() as old:
+            seen["http"] = manager._current.http_client
+            leased.set()
+            rotated.wait(5)
+            # The rotation happened mid-call; the old pool must still work.
+            seen["response"] = _chat(old)
+            seen["closed_during_call"] = seen["http"].is_closed
+        finished.set()
+
+    worker = threading.Thread(target=in_flight_call)
+    worker.start()
+    assert leased.wait(5)
+
+    monkeypatch.setenv("COHERE_API_KEY", "key-2")
+    with ai.lease_client() as new:
+        _chat(new)
+    assert not seen["http"].is_closed
+    assert manager.stats()["clients_closed"] == 0
+
+    rotated.set()
+    assert finished.wait(5)
+    worker.join()
+
+    assert seen["response"].message is not None
+    assert seen["closed_during_call"] is False
+    assert seen["http"].is_closed
+    assert manager.stats()["clients_closed"] == 1
+
+
+def test_close_defers_to_in_flight_calls(manager):
+    with ai.lease_client() as client:
+        http_client = manager._current.http_client
+        manager.close()
+        assert not http_client.is_closed
+        _chat(client)
+    assert http_client.is_closed
@@ -0,0 +1,61 @@
+import ai
+import analysis_cache
+
+CASE = {
+    "symptoms": ["Fever", "cough"],
+    "duration": "2 days",
+    "severity": "medium",
+    "vitals": {"temperature": 38.4, "pulse": 96},
+    "notes": "Productive cough.",
+    "doctor_diagnosis": "Viral URTI",
+}
+
+
+def _key(payload, model="command-a", prompt="v1"):
+    return analysis_cache.make_key(payload, "history", model, prompt)
+
+
+def _with_vitals(**vitals):
+    return {**CASE, "vitals": {**CASE["vitals"], **vitals}}
+
+
+def test_key_ignores_formatting_and_reading_noise():
+    reformatted = {**CASE, "symptoms": ["cough ", "FEVER"], "notes": "  productive   cough. "}
+
+    assert _key(reformatted) == _key(CASE)
+    assert _key(_with_vitals(temperature="38.41")) == _key(CASE)
+
+
+def test_key_separates_clinically_different_vitals():
+    assert _key(_with_vitals(temperature=37.6)) != _key(_with_vitals(temperature=38.4))
+    assert _key(_with_vitals(temperature=38.0)) != _key(_with_vitals(temperature=38.4))
+
+
+def test_key_changes_with_model_and_prompt():
+    assert _key(CASE, model="command-r") != _key(CASE)
+    assert _key(CASE, prompt="v2") != _key(CASE)
+
+
+def test_analysis_key_tracks_configured_models(monkeypatch):
+    before = ai._analysis_cache_key(CASE, [])
+    monkeypatch.setattr(ai, "MODEL_NAME", "another-model")
+
+    assert ai._analysis_cache_key(CASE, []) != before
+
+
+def test_prompt_version_covers_the_user_message_template(monkeypatch):
+    before = ai._prompt_fingerprint()
+    assert before == ai.PROMPT_VERSION
+
+    monkeypatch.setattr(
+        ai, "_render_case_message", lambda case, history: f"Case:\n{case}\n\nHistory:\n{history}"
+    )
+    assert ai._prompt_fingerprint() != before
+    monkeypatch.undo()
+
+    monkeypatch.setattr(ai, "PROMPT_TEMPLATE_REVISION", ai.PROMPT_TEMPLATE_REVISION + 1)
+    assert ai._prompt_fingerprint() != before
+    monkeypatch.undo()
+
+    monkeypatch.setattr(ai, "PROMPT_TOKEN_BUDGET", ai.PROMPT_TOKEN_BUDGET // 2)
+    assert ai._prompt_fingerprint() != before
@@ -0,0 +1,153 @@
+import gc
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+ITEM = {
+    "symptoms": ["fever"],
+    "duration": "2 days",
+    "severity": "medium",
+    "vitals": {"temperature": 38.2},
+    "notes": "",
+    "doctor_diagnosis": "Viral URTI",
+    "patient_id": str(uuid.uuid4()),
+    "doctor_id": str(uuid.uuid4()),
+}
+
+
+class _Conn:
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture
+def batch(monkeypatch):
+    # Stored visits v0..v(n-1) plus the persist errors in state["errors"]; analyze(visit_id)
+    # stands in for the model call and save.
+    state = {"errors": {}, "analyze": lambda visit_id: {"visit": visit_id}, "failed": []}
+    marked = threading.Condition()
+
+    @contextmanager
+    def connection():
+        yield _Conn()
+
+    def persist(conn, items):
+        visit_ids = {index: f"v{index}" for index in range(len(items)) if index not in state["errors"]}
+        triage = {index: {"risk_level": "low"} for index in visit_ids}
+        return visit_ids, dict(state["errors"]), {}, triage
+
+    def mark_failed(visit_id, error):
+        with marked:
+            state["failed"].append((visit_id, error))
+            marked.notify_all()
+
+    def wait_for_failed(count):
+        with marked:
+            assert marked.wait_for(lambda: len(state["failed"]) >= count, timeout=5)
+        return sorted(visit_id for visit_id, _ in state["failed"])
+
+    monkeypatch.setattr(main, "get_connection", connection)
+    monkeypatch.setattr(main, "_persist_visit_batch", persist)
+    monkeypatch.setattr(main, "_analyze_batch_item", lambda visit_id, item, history: state["analyze"](visit_id))
+    monkeypatch.setattr(main, "_mark_analysis_failed", mark_failed)
+    state["wait_for_failed"] = wait_for_failed
+    return state
+
+
+def _request(count):
+    return main.AnalyzeVisitBatchRequest(items=[dict(ITEM) for _ in range(count)])
+
+
+def _post(count):
+    response = TestClient(main.app).post("/visits/analyze/batch", json=_request(count).model_dump())
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_lines_arrive_in_completion_order_with_per_visit_errors(batch):
+    delays = {"v0": 0.3, "v1": 0.1, "v2": 0.2}
+    batch["errors"] = {3: "Patient not found"}
+
+    def analyze(visit_id):
+        time.sleep(delays[visit_id])
+        if visit_id == "v1":
+            raise ValueError("unusable model output")
+        return {"visit": visit_id}
+
+    batch["analyze"] = analyze
+
+    lines = _post(4)
+
+    assert [line["index"] for line in lines] == [3, 1, 2, 0]
+    assert lines[0] == {"index": 3, "status": "error", "error": "Patient not found"}
+    assert lines[1]["status"] == "error" and "unusable model output" in lines[1]["error"]
+    assert lines[1]["visit_id"] == "v1" and lines[1]["triage"] == {"risk_level": "low"}
+    assert [line["result"] for line in lines[2:]] == [{"visit": "v2"}, {"visit": "v0"}]
+
+
+def test_disconnect_cancels_queued_visits_without_waiting_for_running_ones(batch, monkeypatch):
+    monkeypatch.setattr(main, "ANALYZE_BATCH_CONCURRENCY", 2)
+    release = threading.Event()
+    finished = []
+
+    def analyze(visit_id):
+        if visit_id != "v0":
+            release.wait(10)
+        finished.append(visit_id)
+        return {"visit": visit_id}
+
+    batch["analyze"] = analyze
+    request = _request(5)
+    stream = main._iter_batch_results(
+        request.items, {index: f"v{index}" for index in range(5)}, {}, {}, {}, {"started": False}
+    )
+
+    assert json.loads(next(stream))["visit_id"] == "v0"
+    started = time.monotonic()
+    stream.close()
+
+    # v1 and v2 hold the two workers; close() does not wait for them.
+    assert time.monotonic() - started < 0.5
+    assert batch["wait_for_failed"](2) == ["v3", "v4"]
+    release.set()
+    deadline = time.monotonic() + 5
+    while len(finished) < 3:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert sorted(finished) == ["v0", "v1", "v2"]
+    assert all(error.startswith("Client disconnected") for _, error in batch["failed"])
+
+
+def test_stream_dropped_before_it_starts_fails_every_visit(batch):
+    response = main.analyze_visit_batch(_request(3))
+
+    del response
+    gc.collect()
+
+    assert batch["wait_for_failed"](3) == ["v0", "v1", "v2"]
+
+
+def test_fifty_visits_run_concurrently(batch, monkeypatch):
+    monkeypatch.setattr(main, "ANALYZE_BATCH_CONCURRENCY", 8)
+    call_seconds = 0.1
+    batch["analyze"] = lambda visit_id: time.sleep(call_seconds) or {"visit": visit_id}
+
+    started = time.monotonic()
+    lines = _post(50)
+    elapsed = time.monotonic() - started
+
+    assert sorted(line["index"] for line in lines) == list(range(50))
+    assert all(line["status"] == "completed" for line in lines)
+    # Serially this is 50 x 0.1s = 5s; eight at a time it is seven rounds, about 0.7s.
+    assert elapsed < 50 * call_seconds / 2
@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+
+import psycopg2
+import pytest
+from psycopg2 import extensions
+
+import db
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+
+@pytest.fixture
+def connect(monkeypatch):
+    if not DATABASE_URL:
+        pytest.skip("DATABASE_URL is not set")
+    opened = []
+
+    def connect_to_test_server():
+        conn = psycopg2.connect(DATABASE_URL)
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(db, "_connect", connect_to_test_server)
+    yield opened
+    for conn in opened:
+        conn.close()
+
+
+def _pool(min_size=0, max_size=2, timeout=0.2, healthcheck_after=30.0):
+    return db.ConnectionPool(min_size, max_size, timeout, healthcheck_after)
+
+
+@pytest.mark.parametrize("min_size, max_size", [(-1, 2), (3, 2), (0, 0)])
+def test_rejects_invalid_bounds(min_size, max_size):
+    with pytest.raises(ValueError):
+        _pool(min_size, max_size)
+
+
+def test_opens_min_size_up_front_and_never_more_than_max_size(connect):
+    pool = _pool(min_size=1, max_size=2)
+    assert pool.stats()["size"] == 1
+
+    first, second = pool.getconn(), pool.getconn()
+    assert pool.stats()["size"] == 2 and len(connect) == 2
+
+    with pytest.raises(db.PoolTimeout):
+        pool.getconn()
+    assert pool.stats()["timeouts"] == 1
+
+    pool.putconn(first)
+    pool.putconn(second)
+    pool.close()
+
+
+def test_waiter_gets_a_connection_as_soon_as_one_is_returned(connect):
+    pool = _pool(max_size=1, timeout=5)
+    held = pool.getconn()
+    threading.Timer(0.1, pool.putconn, [held]).start()
+
+    started = time.monotonic()
+    conn = pool.getconn()
+
+    assert conn is held
+    assert time.monotonic() - started < 2
+    assert pool.stats()["waits"] == 1
+    pool.putconn(conn)
+    pool.close()
+
+
+def test_returned_connection_is_rolled_back(connect):
+    pool = _pool()
+    conn = pool.getconn()
+    with conn.cursor() as cur:
+        cur.execute("CREATE TEMP TABLE pool_probe (id int)")
+    assert conn.info.transaction_status == extensions.TRANSACTION_STATUS_INTRANS
+
+    pool.putconn(conn)
+
+    again = pool.getconn()
+    assert again is conn
+    assert again.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE
+    with again.cursor() as cur:
+        cur.execute("SELECT to_regclass('pg_temp.pool_probe')")
+        assert cur.fetchone()[0] is None
+    pool.putconn(again)
+    pool.close()
+
+
+def test_idle_connection_is_pinged_and_replaced_when_dead(connect):
+    pool = _pool(healthcheck_after=0.05)
+    conn = pool.getconn()
+    backend_pid = conn.get_backend_pid()
+    pool.putconn(conn)
+
+    killer = psycopg2.connect(DATABASE_URL)
+    killer.autocommit = True
+    killer.cursor().execute("SELECT pg_terminate_backend(%s)", (backend_pid,))
+    killer.close()
+    time.sleep(0.1)
+
+    fresh = pool.getconn()
+
+    assert fresh is not conn
+    assert fresh.get_backend_pid() != backend_pid
+    assert pool.stats()["discarded"] == 1
+    pool.putconn(fresh)
+    pool.close()
+
+
+def test_recently_used_connection_skips_the_ping(connect):
+    pool = _pool(healthcheck_after=30)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+    assert pool.stats()["discarded"] == 0
+    pool.putconn(conn)
+    pool.close()
+
+
+def test_closed_pool_refuses_checkouts(connect):
+    pool = _pool()
+    pool.close()
+
+    with pytest.raises(db.PoolTimeout):
+        pool.getconn()
@@ -0,0 +1,153 @@
+import json
+import random
+import re
+
+import pytest
+
+import ai
+from bench import _legacy_extract_json_object
+
+# Seeded fuzz corpus: replies stitched together from prose, brace noise, valid and broken
+# objects, strings holding braces and code fences. Every run sees the same cases.
+CASES = 3000
+SEED = 21
+OBJECT_START = re.compile(r'\{\s*["}]')
+
+VALID = [
+    {"risk_level": "low", "probable_causes": ["Viral infection"]},
+    {"a": {"b": {"c": [1, 2, {"d": "}"}]}}},
+    {"note": 'brace { and quote " and backslash \\ inside'},
+    {},
+    {"nested": {}, "list": [{}, {"x": None}]},
+]
+BROKEN = [
+    '{"risk_level": "low",}',
+    '{"a": {"b": 1}',
+    '{"a": {"b": {"c": 1,}}}',
+    '{"a": [1, 2}',
+    '{"a": "unterminated}',
+    '{"outer": {"inner": {"ok": 1}}, oops}',
+    '{"k": "\\"}"',
+    "{'single': 'quotes'}",
+]
+NOISE = [
+    "The {dose} depends on weight. ",
+    "{ ",
+    "} ",
+    '"',
+    '\\"',
+    "{}",
+    '{"',
+    "```json\n",
+    "\n```",
+    "Résumé: température élevée. ",
+    " ",
+]
+
+
+def _fragment(rng: random.Random) -> str:
+    roll = rng.random()
+    if roll < 0.2:
+        return json.dumps(rng.choice(VALID), indent=rng.choice([None, 2]))
+    if roll < 0.45:
+        return rng.choice(BROKEN)
+    return rng.choice(NOISE)
+
+
+def _corpus():
+    rng = random.Random(SEED)
+    for _ in range(CASES):
+        yield "".join(_fragment(rng) for _ in range(rng.randint(1, 12)))
+
+
+def _loads(text):
+    try:
+        parsed = json.loads(text)
+    except (json.JSONDecodeError, RecursionError):
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+def _balanced_end(text, start):
+    depth, in_string, escaped = 0, False, False
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return index + 1
+    return -1
+
+
+def _reference(text):
+    # The extractor's contract written out plainly: try each "{" that can open an object,
+    # in order, and skip a balanced span that does not parse as a whole. Returns the
+    # result and the skipped spans.
+    text = text.strip()
+    parsed = _loads(ai._strip_code_fence(text))
+    if parsed is not None:
+        return parsed, []
+    rejected = []
+    pos = 0
+    while True:
+        match = OBJECT_START.search(text, pos)
+        if match is None:
+            return None, rejected
+        start = match.start()
+        end = _balanced_end(text, start)
+        if end == -1:
+            pos = start + 1
+            continue
+        parsed = _loads(text[start:end])
+        if parsed is not None:
+            return parsed, rejected
+        rejected.append((start, end))
+        pos = end
+
+
+def _extract(extract, text):
+    try:
+        return extract(text)
+    except ValueError:
+        return None
+
+
+def _nested_objects(text, spans):
+    for span_start, span_end in spans:
+        for start in range(span_start + 1, span_end):
+            if text[start] == "{":
+                end = _balanced_end(text, start)
+                parsed = _loads(text[start:end]) if end != -1 else None
+                if parsed is not None:
+                    yield parsed
+
+
+@pytest.mark.parametrize("text", list(_corpus()), ids=range(CASES))
+def test_matches_reference_and_legacy(text):
+    expected, rejected = _reference(text)
+
+    assert _extract(ai._extract_json_object, text) == expected
+
+    # The old extractor also tried objects nested inside a span that failed to parse; that
+    # is the only place the two are allowed to disagree.
+    legacy = _extract(_legacy_extract_json_object, text)
+    if legacy != expected:
+        assert legacy in list(_nested_objects(text.strip(), rejected))
+
+
+def test_skips_objects_nested_in_a_broken_span():
+    text = 'Draft: {"summary": {"risk_level": "low"}, broken} Final: {"risk_level": "high"}'
+
+    assert ai._extract_json_object(text) == {"risk_level": "high"}
+    assert _legacy_extract_json_object(text) == {"risk_level": "low"}
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+import ai
+
+REPLY = {
+    "risk_level": "medium",
+    "summary": 'Quote " backslash \\ braces {} [] and, commas',
+    "probable_causes": ["Viral {infection}", "Influenza"],
+    "suggested_doctors": [{"name": "Dr. Rao", "specialty": "ENT", "reason": "Sinus \"pressure\"."}],
+    "vitals": {"bp": {"sys": 120, "dia": 80}, "notes": "élévée — ok"},
+    "confidence_score": 0.8,
+    "deviation_percentage": 12.5,
+}
+
+
+def _fields(chunks):
+    parser = ai._IncrementalJsonFields()
+    fields = []
+    for chunk in chunks:
+        fields.extend(parser.feed(chunk))
+    return fields, parser
+
+
+def _chunked(text, size):
+    return [text[index:index + size] for index in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 10_000])
+def test_every_chunk_boundary_gives_the_same_fields(size, ensure_ascii):
+    text = json.dumps(REPLY, indent=2, ensure_ascii=ensure_ascii)
+
+    fields, parser = _fields(_chunked(text, size))
+
+    assert fields == list(REPLY.items())
+    assert parser.finished
+
+
+def test_field_is_reported_once_its_value_is_complete():
+    parser = ai._IncrementalJsonFields()
+
+    assert parser.feed('{"risk_level": "hi') == []
+    assert parser.feed('gh", "summary": "a\\') == [("risk_level", "high")]
+    assert parser.feed('"b"') == []
+    assert parser.feed("}") == [("summary", 'a"b')]
+
+
+def test_nested_values_are_reported_whole():
+    fields, _ = _fields(['{"a": {"b": [1, {"c": "}"}]}, "d": [[], {}]}'])
+
+    assert fields == [("a", {"b": [1, {"c": "}"}]}), ("d", [[], {}])]
+
+
+@pytest.mark.parametrize(
+    "prefix",
+    [
+        "Sure, see {below}: ",
+        "Sure, see { below }: ",
+        'Draft {"unfinished thought"} then the answer: ',
+        "Here you go {} ",
+        "```json\n",
+        "Temperature was [38.5] and {rising}. ",
+    ],
+)
+@pytest.mark.parametrize("size", [1, 5, 10_000])
+def test_leading_prose_with_braces_is_skipped(prefix, size):
+    text = prefix + json.dumps(REPLY)
+
+    fields, parser = _fields(_chunked(text, size))
+
+    assert fields == list(REPLY.items())
+    assert parser.finished
+
+
+def test_waits_for_the_character_after_a_brace():
+    parser = ai._IncrementalJsonFields()
+
+    assert parser.feed("See {") == []
+    assert parser.feed("   ") == []
+    assert parser.feed('"risk_level": "low"}') == [("risk_level", "low")]
+    assert parser.finished
+
+
+def test_text_after_the_object_is_ignored():
+    fields, _ = _fields(['{"risk_level": "low"} and {"risk_level": "high"}'])
+
+    assert fields == [("risk_level", "low")]
@@ -0,0 +1,123 @@
+import threading
+import uuid
+from contextlib import contextmanager
+
+from fastapi.testclient import TestClient
+from psycopg2.extras import Json
+
+import jobs
+import main
+
+
+def test_dispatcher_keeps_its_slot_when_claim_fails(monkeypatch):
+    # With one worker, a slot lost to a failed claim would stop all later dispatches.
+    monkeypatch.setattr(jobs, "POLL_INTERVAL_SECONDS", 0.01)
+    job = {"id": uuid.uuid4(), "attempts": 1}
+    claims = iter([RuntimeError("database restarting"), RuntimeError("still restarting"), job])
+    ran = threading.Event()
+
+    def claim():
+        outcome = next(claims, None)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    runner = jobs.AnalysisJobRunner(run_job=None, save_result=None, on_failure=None, workers=1)
+    monkeypatch.setattr(runner, "_requeue_stale", lambda: None)
+    monkeypatch.setattr(runner, "_claim", claim)
+
+    def run(claimed):
+        assert claimed is job
+        runner._slots.release()
+        ran.set()
+
+    monkeypatch.setattr(runner, "_run", run)
+    runner.start()
+    try:
+        assert ran.wait(5)
+    finally:
+        runner.stop()
+    assert runner._slots.acquire(blocking=False)
+
+
+def test_dispatcher_survives_stale_requeue_failure(monkeypatch):
+    monkeypatch.setattr(jobs, "POLL_INTERVAL_SECONDS", 0.01)
+    claimed = threading.Event()
+
+    def requeue_stale():
+        raise RuntimeError("database unavailable")
+
+    def claim():
+        claimed.set()
+        return None
+
+    runner = jobs.AnalysisJobRunner(run_job=None, save_result=None, on_failure=None, workers=1)
+    monkeypatch.setattr(runner, "_requeue_stale", requeue_stale)
+    monkeypatch.setattr(runner, "_claim", claim)
+    runner.start()
+    try:
+        assert claimed.wait(5)
+    finally:
+        runner.stop()
+    assert runner._slots.acquire(blocking=False)
+
+
+def test_job_events_stream_status_changes(monkeypatch):
+    job_id = str(uuid.uuid4())
+    statuses = iter(["pending", "pending", "running", "completed"])
+
+    def get_job(requested_id):
+        assert requested_id == job_id
+        status = next(statuses, "completed")
+        return {"id": job_id, "visit_id": None, "status": status, "attempts": 1}
+
+    monkeypatch.setattr(jobs, "get_job", get_job)
+    monkeypatch.setattr(main, "ANALYSIS_JOB_EVENTS_POLL_SECONDS", 0)
+
+    response = TestClient(main.app).get(f"/visits/analyze/jobs/{job_id}/events")
+
+    assert response.status_code == 200
+    events = [line for line in response.text.splitlines() if line.startswith("data:")]
+    assert len(events) == 3
+    assert '"status": "pending"' in events[0]
+    assert '"status": "running"' in events[1]
+    assert '"status": "completed"' in events[2]
+
+
+def test_stale_job_on_its_last_attempt_is_failed_not_requeued(pg_conn, monkeypatch):
+    @contextmanager
+    def connection():
+        try:
+            yield pg_conn
+        finally:
+            pg_conn.rollback()
+
+    monkeypatch.setattr(jobs, "get_connection", connection)
+    cur = pg_conn.cursor()
+    patient_id, visit_id = str(uuid.uuid4()), str(uuid.uuid4())
+    cur.execute("INSERT INTO patients (id, health_id, full_name) VALUES (%s, 'CAX-stale', 'Stale')", (patient_id,))
+    cur.execute("INSERT INTO visits (id, patient_id) VALUES (%s, %s)", (visit_id, patient_id))
+    job_ids = {}
+    for attempts in (1, jobs.MAX_ATTEMPTS):
+        job_ids[attempts] = str(uuid.uuid4())
+        cur.execute(
+            """
+            INSERT INTO analysis_jobs (id, visit_id, patient_id, payload, status, attempts, started_at)
+            VALUES (%s, %s, %s, %s, 'running', %s, NOW() - make_interval(secs => %s))
+            """,
+            (job_ids[attempts], visit_id, patient_id, Json({}), attempts, jobs.STALE_AFTER_SECONDS + 60),
+        )
+    pg_conn.commit()
+    failures = []
+    runner = jobs.AnalysisJobRunner(run_job=None, save_result=None, on_failure=lambda job, error: failures.append(job))
+
+    runner._requeue_stale()
+
+    cur.execute("SELECT id::text, status, attempts, error FROM analysis_jobs WHERE visit_id = %s", (visit_id,))
+    rows = {row["id"]: row for row in cur.fetchall()}
+    pg_conn.rollback()
+    assert rows[job_ids[1]]["status"] == "pending"
+    assert rows[job_ids[jobs.MAX_ATTEMPTS]]["status"] == "failed"
+    assert "worker was lost" in rows[job_ids[jobs.MAX_ATTEMPTS]]["error"]
+    assert [str(job["id"]) for job in failures] == [job_ids[jobs.MAX_ATTEMPTS]]
+    assert str(failures[0]["visit_id"]) == visit_id
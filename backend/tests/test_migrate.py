@@ -0,0 +1,56 @@
+import os
+import threading
+import uuid
+
+import psycopg2
+import pytest
+from psycopg2.extras import RealDictCursor
+
+import migrate
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+RUNNERS = 6
+
+
+@pytest.fixture
+def fresh_database():
+    if not DATABASE_URL:
+        pytest.skip("DATABASE_URL is not set")
+    name = f"careaxis_migrate_{uuid.uuid4().hex[:8]}"
+    admin = psycopg2.connect(DATABASE_URL)
+    admin.autocommit = True
+    admin.cursor().execute(f"CREATE DATABASE \"{name}\" TEMPLATE template0 ENCODING 'UTF8'")
+    try:
+        yield name
+    finally:
+        admin.cursor().execute(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+        admin.close()
+
+
+def test_concurrent_cold_starts_apply_each_migration_once(fresh_database):
+    connections = [
+        psycopg2.connect(DATABASE_URL, dbname=fresh_database, cursor_factory=RealDictCursor) for _ in range(RUNNERS)
+    ]
+    barrier = threading.Barrier(RUNNERS)
+    applied, errors = [], []
+
+    def run(conn):
+        barrier.wait()
+        try:
+            applied.extend(migrate.apply_migrations(conn))
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=run, args=(conn,)) for conn in connections]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(60)
+
+    try:
+        assert errors == []
+        assert sorted(applied) == [version for version, _, _ in migrate.list_migrations()]
+        assert migrate.current_version(connections[0]) == migrate.latest_version()
+    finally:
+        for conn in connections:
+            conn.close()
@@ -0,0 +1,55 @@
+from contextlib import contextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture(scope="module")
+def patients(pg_conn):
+    cur = pg_conn.cursor()
+    cur.execute(
+        """
+        INSERT INTO patients (id, health_id, full_name, phone, created_at)
+        SELECT gen_random_uuid(), 'CAX-l' || n, 'Listed ' || n, '+91970000' || n,
+               CASE WHEN n % 3 = 0 THEN NULL ELSE TIMESTAMP '2025-01-01' + n * INTERVAL '1 hour' END
+        FROM generate_series(1, 7) AS n
+        """
+    )
+    pg_conn.commit()
+    return 7
+
+
+@pytest.fixture
+def client(pg_conn, monkeypatch):
+    @contextmanager
+    def connection():
+        try:
+            yield pg_conn
+        finally:
+            pg_conn.rollback()
+
+    monkeypatch.setattr(main, "get_connection", connection)
+    return TestClient(main.app)
+
+
+def test_pages_cover_every_patient_once_including_missing_created_at(client, patients):
+    seen, cursor = [], None
+    while True:
+        response = client.get("/patients", params={"limit": 2, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200, response.text
+        page = response.json()
+        seen.extend(patient["health_id"] for patient in page["patients"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(seen) == len(set(seen)) == patients
+    # Newest first; the rows without created_at come last.
+    assert seen[:2] == ["CAX-l7", "CAX-l5"]
+    assert set(seen[-2:]) == {"CAX-l3", "CAX-l6"}
+
+
+def test_count_matches_the_listing(client, patients):
+    assert client.get("/patients/count").json() == {"count": patients}
@@ -0,0 +1,60 @@
+import pytest
+
+import main
+
+
+def _search(conn, term, limit=10):
+    sql, params = main._patient_search_query(term, limit)
+    cur = conn.cursor()
+    cur.execute(sql, params)
+    rows = cur.fetchall()
+    conn.rollback()
+    return rows
+
+
+@pytest.fixture(scope="module")
+def patients(pg_conn):
+    cur = pg_conn.cursor()
+    cur.execute(
+        """
+        INSERT INTO patients (id, health_id, full_name, phone)
+        VALUES
+            (gen_random_uuid(), 'CAX-aa0001', 'Priya Sharma', '+919800000001'),
+            (gen_random_uuid(), 'CAX-aa0002', 'Priyanka Rao', '+919800000002'),
+            (gen_random_uuid(), 'CAX-bb0003', 'Rahul Verma', '+919811111111'),
+            (gen_random_uuid(), 'CAX-cc0004', 'Anand Iyer', '+919822222222')
+        """
+    )
+    pg_conn.commit()
+
+
+def test_short_terms_skip_the_trigram_branch():
+    short_sql, _ = main._patient_search_query("pr", 10)
+    long_sql, _ = main._patient_search_query("priya", 10)
+
+    assert "fuzzy" not in short_sql
+    assert "fuzzy" in long_sql
+
+
+def test_exact_health_id_ranks_first(pg_conn, patients):
+    rows = _search(pg_conn, "CAX-aa0002")
+
+    assert rows[0]["full_name"] == "Priyanka Rao"
+    assert rows[0]["match_rank"] == 0
+
+
+def test_prefixes_match_ids_phones_and_names(pg_conn, patients):
+    assert {row["full_name"] for row in _search(pg_conn, "CAX-aa")} == {"Priya Sharma", "Priyanka Rao"}
+    assert [row["full_name"] for row in _search(pg_conn, "+91981")] == ["Rahul Verma"]
+    assert {row["full_name"] for row in _search(pg_conn, "pri")} == {"Priya Sharma", "Priyanka Rao"}
+
+
+def test_each_branch_stops_at_the_limit(pg_conn, patients):
+    assert len(_search(pg_conn, "CAX-", limit=2)) == 2
+
+
+def test_typos_fall_back_to_trigram_matches(pg_conn, patients):
+    rows = _search(pg_conn, "Rahul Varma")
+
+    assert [row["full_name"] for row in rows] == ["Rahul Verma"]
+    assert rows[0]["match_rank"] == 3
@@ -0,0 +1,68 @@
+import io
+import itertools
+
+import pytest
+from pypdf import PdfReader
+
+import pdf_writer
+
+MODES = list(itertools.product([0, 1, 6, 9], [False, True]))
+# Enough pages that object streams are flushed more than once.
+LINES = [f"Line {index}: (parenthesised) back\\slash text {index % 7}" for index in range(120 * pdf_writer.MAX_LINES_PER_PAGE)]
+
+
+def _read(pdf_bytes: bytes) -> PdfReader:
+    return PdfReader(io.BytesIO(pdf_bytes), strict=True)
+
+
+def _texts(pdf_bytes: bytes) -> list:
+    return [page.extract_text() for page in _read(pdf_bytes).pages]
+
+
+@pytest.fixture(scope="module")
+def baseline_texts():
+    return _texts(pdf_writer.build_pdf_from_lines(LINES, compression_level=0, object_streams=False))
+
+
+@pytest.mark.parametrize("compression_level, object_streams", MODES)
+def test_every_mode_parses_with_identical_text(compression_level, object_streams, baseline_texts):
+    pdf_bytes = pdf_writer.build_pdf_from_lines(LINES, compression_level, object_streams)
+
+    reader = _read(pdf_bytes)
+    assert pdf_bytes.startswith(b"%PDF-1.5" if object_streams else b"%PDF-1.4")
+    assert len(reader.pages) == 120
+    assert [page.extract_text() for page in reader.pages] == baseline_texts
+
+
+def test_extracted_text_matches_the_input_lines(baseline_texts):
+    first_page = baseline_texts[0].splitlines()
+
+    assert first_page[0] == LINES[0]
+    assert first_page[-1] == LINES[pdf_writer.MAX_LINES_PER_PAGE - 1]
+
+
+@pytest.mark.parametrize("compression_level, object_streams", [(0, False), (6, True)])
+def test_empty_report_still_has_one_page(compression_level, object_streams):
+    texts = _texts(pdf_writer.build_pdf_from_lines([], compression_level, object_streams))
+
+    assert texts == ["No data"]
+
+
+def test_compression_shrinks_output():
+    plain = pdf_writer.build_pdf_from_lines(LINES, compression_level=0, object_streams=False)
+    flate = pdf_writer.build_pdf_from_lines(LINES, compression_level=6, object_streams=False)
+    packed = pdf_writer.build_pdf_from_lines(LINES, compression_level=6, object_streams=True)
+
+    assert len(packed) < len(flate) < len(plain)
+
+
+def test_streamed_chunks_match_the_built_document():
+    chunks = list(pdf_writer.iter_pdf_from_lines(LINES, 6, True))
+
+    assert len(chunks) > 100
+    assert b"".join(chunks) == pdf_writer.build_pdf_from_lines(LINES, 6, True)
+
+
+def test_rejects_out_of_range_compression_level():
+    with pytest.raises(ValueError):
+        pdf_writer.build_pdf_from_lines(LINES[:1], compression_level=10)
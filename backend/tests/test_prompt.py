@@ -0,0 +1,45 @@
+import json
+
+import ai
+
+HISTORY = [{"risk_level": "low", "probable_causes": ["Viral infection"], "specialist_recommendation": "None"}]
+
+
+def _case(vitals):
+    return {"symptoms": ["fever"], "severity": "medium", "vitals": vitals, "notes": "Short note."}
+
+
+def _rendered_vitals(compiled):
+    case_json = compiled["user"].split("\n", 2)[1]
+    return json.loads(case_json)["vitals"]
+
+
+def test_oversized_vitals_are_trimmed_to_the_budget():
+    vitals = {
+        "pulse": 112,
+        "spo2": 91,
+        "blood_pressure": {"systolic": 88, "diastolic": 60},
+        **{f"lab_{index:03d}": "Pending repeat sample, see lab portal. " * 5 for index in range(400)},
+        "ecg_trace": list(range(3000)),
+    }
+    compiled = ai.compile_analysis_prompt(_case(vitals), HISTORY)
+    stats = ai.prompt_stats()["last"]
+    rendered = _rendered_vitals(compiled)
+
+    assert len(compiled["user"]) <= ai.PROMPT_TOKEN_BUDGET * 4
+    assert stats["truncated"] == ["vitals"]
+    assert stats["history_entries"] == 1
+    # Vitals the triage rules score are never dropped.
+    assert rendered["pulse"] == 112
+    assert rendered["spo2"] == 91
+    assert rendered["blood_pressure"] == {"systolic": 88, "diastolic": 60}
+    assert rendered["_omitted"].endswith("more readings omitted for length")
+    assert all(len(str(value)) <= ai.PROMPT_VITAL_VALUE_MAX_CHARS for value in rendered.values())
+
+
+def test_vitals_within_budget_are_untouched():
+    vitals = {"pulse": 80, "remark": "x" * 200}
+    compiled = ai.compile_analysis_prompt(_case(vitals), HISTORY)
+
+    assert _rendered_vitals(compiled) == vitals
+    assert ai.prompt_stats()["last"]["truncated"] == []
@@ -0,0 +1,180 @@
+import uuid
+from contextlib import contextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import pdf_writer
+from report_cache import ReportCache, etag_matches, make_etag, make_key
+
+KEY = make_key("p-1", None, None)
+VERSION = (1, "2025-01-01T00:00:00", None)
+
+
+def test_etags_are_weak_and_compared_weakly():
+    etag = make_etag(KEY, VERSION, "json")
+
+    assert etag.startswith('W/"') and etag.endswith('"')
+    assert etag_matches(etag, etag)
+    assert etag_matches(etag[2:], etag)
+    assert etag_matches(f'"other", {etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches('W/"other"', etag)
+    assert make_etag(KEY, VERSION, "pdf") != etag
+    assert make_etag(KEY, (2,) + VERSION[1:], "json") != etag
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ReportCache(max_entries=2)
+    first, second, third = (make_key(f"p-{n}", None, None) for n in range(3))
+    cache.put_payload(first, VERSION, {"n": 1})
+    cache.put_payload(second, VERSION, {"n": 2})
+    assert cache.get_payload(first, VERSION) == {"n": 1}
+
+    cache.put_payload(third, VERSION, {"n": 3})
+
+    assert cache.get_payload(second, VERSION) is None
+    assert cache.get_payload(first, VERSION) == {"n": 1}
+    assert cache.get_payload(third, VERSION) == {"n": 3}
+    assert cache.stats()["evictions"] == 1 and cache.stats()["entries"] == 2
+
+
+def test_new_version_replaces_the_entry():
+    cache = ReportCache()
+    cache.put_payload(KEY, VERSION, {"n": 1})
+    cache.put_pdf(KEY, VERSION, b"%PDF-old")
+
+    cache.put_payload(KEY, (2,) + VERSION[1:], {"n": 2})
+
+    assert cache.get_payload(KEY, VERSION) is None
+    assert cache.get_pdf(KEY, (2,) + VERSION[1:]) is None
+
+
+def test_pdf_over_the_size_bound_is_not_kept():
+    cache = ReportCache(max_pdf_bytes=8)
+    cache.put_pdf(KEY, VERSION, b"%PDF-123456")
+    assert cache.get_pdf(KEY, VERSION) is None
+
+    cache.put_pdf(KEY, VERSION, b"%PDF-12")
+    assert cache.get_pdf(KEY, VERSION) == b"%PDF-12"
+
+
+def test_oversized_streamed_pdf_is_served_but_not_cached(monkeypatch):
+    cache = ReportCache(max_pdf_bytes=10)
+    monkeypatch.setattr(main, "report_cache", cache)
+
+    chunks = list(main._iter_and_cache_pdf(iter([b"%PDF-", b"123456"]), KEY, VERSION))
+
+    assert chunks == [b"%PDF-", b"123456"]
+    assert cache.get_pdf(KEY, VERSION) is None
+
+
+def test_invalidate_patient_drops_every_range():
+    cache = ReportCache()
+    ranged = make_key("p-1", "2025-01-01", "2025-01-31")
+    other = make_key("p-2", None, None)
+    for key in (KEY, ranged, other):
+        cache.put_payload(key, VERSION, {})
+
+    cache.invalidate_patient("p-1")
+
+    assert cache.get_payload(KEY, VERSION) is None and cache.get_payload(ranged, VERSION) is None
+    assert cache.get_payload(other, VERSION) == {}
+    assert cache.stats()["invalidations"] == 2
+
+
+@pytest.fixture(scope="module")
+def visit(pg_conn):
+    cur = pg_conn.cursor()
+    patient_id, visit_id = str(uuid.uuid4()), str(uuid.uuid4())
+    cur.execute(
+        "INSERT INTO patients (id, health_id, full_name) VALUES (%s, 'CAX-cache', 'Cached Patient')",
+        (patient_id,),
+    )
+    cur.execute("INSERT INTO visits (id, patient_id) VALUES (%s, %s)", (visit_id, patient_id))
+    pg_conn.commit()
+    return patient_id, visit_id
+
+
+@pytest.fixture
+def client(pg_conn, monkeypatch):
+    @contextmanager
+    def connection():
+        try:
+            yield pg_conn
+        finally:
+            pg_conn.rollback()
+
+    monkeypatch.setattr(main, "get_connection", connection)
+    monkeypatch.setattr(main, "report_cache", ReportCache())
+    return TestClient(main.app)
+
+
+@pytest.mark.parametrize("suffix", ["", "/pdf"])
+def test_if_none_match_returns_304(client, visit, suffix):
+    url = f"/reports/patients/{visit[0]}{suffix}"
+    first = client.get(url)
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and etag.startswith('W/"')
+
+    again = client.get(url, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag and again.content == b""
+
+    # Caches that drop the weak prefix still revalidate.
+    assert client.get(url, headers={"If-None-Match": etag[2:]}).status_code == 304
+
+
+def test_new_analysis_changes_the_etag_and_the_payload(client, visit, pg_conn):
+    patient_id, visit_id = visit
+    url = f"/reports/patients/{patient_id}"
+    before = client.get(url)
+    assert before.json()["totals"]["total_ai_analyses"] == 0
+
+    main._save_analysis_result(
+        pg_conn,
+        visit_id,
+        {
+            "probable_causes": ["Viral infection"],
+            "risk_level": "low",
+            "specialist_recommendation": "General Medicine",
+            "summary": "Rest and fluids.",
+            "confidence_score": 0.8,
+            "deviation_percentage": 5,
+            "suggested_doctors": [],
+        },
+    )
+    pg_conn.commit()
+
+    after = client.get(url, headers={"If-None-Match": before.headers["ETag"]})
+
+    assert after.status_code == 200
+    assert after.headers["ETag"] != before.headers["ETag"]
+    assert after.json()["totals"]["total_ai_analyses"] == 1
+
+
+def test_new_visit_changes_the_version_and_the_etag(client, visit, pg_conn):
+    patient_id, _ = visit
+    url = f"/reports/patients/{patient_id}/pdf"
+    before_version = main._fetch_report_version(pg_conn, patient_id)
+    before = client.get(url)
+    key = make_key(patient_id, None, None)
+    assert main.report_cache.get_pdf(key, before_version) == before.content
+
+    pg_conn.cursor().execute("INSERT INTO visits (id, patient_id) VALUES (gen_random_uuid(), %s)", (patient_id,))
+    pg_conn.commit()
+
+    after_version = main._fetch_report_version(pg_conn, patient_id)
+    pg_conn.rollback()
+    assert after_version[0] == before_version[0] + 1
+    after = client.get(url, headers={"If-None-Match": before.headers["ETag"]})
+
+    assert after.status_code == 200
+    assert after.headers["ETag"] != before.headers["ETag"]
+    assert after.content != before.content
+    assert main.report_cache.get_pdf(key, after_version) == after.content
+    assert after.headers["ETag"] == make_etag(
+        key, after_version + (pdf_writer.COMPRESSION_LEVEL, pdf_writer.OBJECT_STREAMS), "pdf"
+    )
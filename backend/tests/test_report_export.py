@@ -0,0 +1,69 @@
+import gc
+import weakref
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from bench import _report_rows
+
+
+@pytest.fixture
+def free_slots():
+    # Tests leave the shared export semaphore as they found it.
+    before = main._export_slots._value
+    yield
+    gc.collect()
+    assert main._export_slots._value == before
+
+
+def _held_stream(chunks):
+    assert main._export_slots.acquire(blocking=False)
+    release = weakref.finalize(chunks, main._export_slots.release)
+    return main._iter_holding_export_slot(chunks, release)
+
+
+def test_slot_is_released_when_the_stream_finishes(free_slots):
+    before = main._export_slots._value
+    stream = _held_stream(chunk for chunk in [b"a", b"b"])
+
+    assert main._export_slots._value == before - 1
+    assert list(stream) == [b"a", b"b"]
+    assert main._export_slots._value == before
+
+
+def test_slot_is_released_when_the_stream_never_starts(free_slots):
+    before = main._export_slots._value
+    stream = _held_stream(chunk for chunk in [b"a"])
+
+    del stream
+    gc.collect()
+    assert main._export_slots._value == before
+
+
+def test_export_is_rejected_while_all_slots_are_busy(free_slots):
+    held = 0
+    while main._export_slots.acquire(blocking=False):
+        held += 1
+    try:
+        response = TestClient(main.app).get("/reports/export?from_date=2025-01-01&to_date=2025-01-31")
+    finally:
+        for _ in range(held):
+            main._export_slots.release()
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "30"
+
+
+def test_forkserver_pool_renders_reports():
+    patient, rows = _report_rows(3)
+    report = main._shape_report_document(patient, rows, None, None)
+
+    pool = main._new_export_pool(1)
+    try:
+        filename, pdf_bytes = pool.submit(main._render_report_pdf, report).result(timeout=60)
+    finally:
+        pool.shutdown(wait=True)
+
+    assert filename == "patient-report-CAX-a1b2c3.pdf"
+    assert pdf_bytes == main._render_report_pdf(report)[1]
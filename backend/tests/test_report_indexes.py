@@ -0,0 +1,126 @@
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+import main
+
+PATIENTS = 2000
+VISITS_PER_PATIENT = 10
+
+
+@pytest.fixture(scope="module")
+def seeded(pg_conn):
+    # Enough rows that the planner prefers the indexes over sequential scans.
+    cur = pg_conn.cursor()
+    cur.execute(
+        """
+        INSERT INTO users (id, full_name, email, password_hash, role)
+        VALUES (gen_random_uuid(), 'Dr. Seed', 'seed@example.test', 'x', 'doctor')
+        RETURNING id
+        """
+    )
+    doctor_id = cur.fetchone()["id"]
+    cur.execute(
+        """
+        INSERT INTO patients (id, health_id, full_name, phone, age, gender, created_at)
+        SELECT gen_random_uuid(), 'CAX-' || lpad(n::text, 6, '0'), 'Patient ' || n,
+               '+9198' || lpad(n::text, 8, '0'), 20 + mod(n, 60), 'female',
+               TIMESTAMP '2024-01-01' + n * INTERVAL '1 minute'
+        FROM generate_series(1, %s) AS n
+        """,
+        (PATIENTS,),
+    )
+    cur.execute(
+        """
+        INSERT INTO visits (id, patient_id, doctor_id, created_at)
+        SELECT gen_random_uuid(), p.id, %s, TIMESTAMP '2024-01-01' + n * INTERVAL '3 days'
+        FROM patients p, generate_series(1, %s) AS n
+        """,
+        (doctor_id, VISITS_PER_PATIENT),
+    )
+    cur.execute(
+        """
+        INSERT INTO clinical_inputs (id, visit_id, symptoms, duration, severity, vitals, notes, doctor_diagnosis)
+        SELECT gen_random_uuid(), v.id, '["fever"]', '2 days', 'low', '{"pulse": 80}', 'Seeded', 'Viral illness'
+        FROM visits v
+        """
+    )
+    cur.execute(
+        """
+        INSERT INTO ai_analysis (id, visit_id, probable_causes, risk_level, specialist_recommendation,
+                                 summary, confidence_score, deviation_percentage, suggested_doctors)
+        SELECT gen_random_uuid(), v.id, '["Viral infection"]', 'low', 'None', 'Seeded', 0.5, 10, '[]'
+        FROM visits v
+        """
+    )
+    cur.execute("SELECT id FROM patients ORDER BY health_id LIMIT 1 OFFSET %s", (PATIENTS // 2,))
+    patient_id = str(cur.fetchone()["id"])
+    pg_conn.commit()
+
+    pg_conn.autocommit = True
+    pg_conn.cursor().execute("ANALYZE")
+    pg_conn.autocommit = False
+    return patient_id
+
+
+def _index_names(plan: Dict[str, Any], names: Optional[List[str]] = None) -> List[str]:
+    names = [] if names is None else names
+    if "Index Name" in plan:
+        names.append(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        _index_names(child, names)
+    return names
+
+
+def _report_plan_indexes(conn: Any, patient_id: str, from_date: Optional[date], to_date: Optional[date]) -> List[str]:
+    # The same statement _build_patient_report_payload runs for the visit rows.
+    range_filters, range_params = main._visit_range_filters(from_date, to_date)
+    cur = conn.cursor()
+    cur.execute(
+        "EXPLAIN (FORMAT JSON) SELECT"
+        + main.REPORT_VISIT_COLUMNS
+        + main.REPORT_VISIT_JOINS
+        + "WHERE "
+        + " AND ".join(["v.patient_id = %s", *range_filters])
+        + "\nORDER BY v.created_at DESC",
+        [patient_id, *range_params],
+    )
+    plan = cur.fetchone()["QUERY PLAN"][0]["Plan"]
+    conn.rollback()
+    return _index_names(plan)
+
+
+@pytest.mark.parametrize(
+    "from_date, to_date",
+    [(None, None), (date(2024, 1, 4), date(2024, 1, 20)), (date(2024, 1, 10), None)],
+)
+def test_report_query_uses_visit_indexes(pg_conn, seeded, from_date, to_date):
+    indexes = _report_plan_indexes(pg_conn, seeded, from_date, to_date)
+
+    assert "idx_visits_patient_created_at" in indexes
+    assert "idx_clinical_inputs_visit_id" in indexes
+    assert "idx_ai_analysis_visit_id" in indexes
+
+
+def test_report_payload_reads_seeded_visits(pg_conn, seeded):
+    report = main._build_patient_report_payload(pg_conn, seeded, date(2024, 1, 4), date(2024, 1, 9))
+    pg_conn.rollback()
+
+    # Visits fall on days 3, 6, 9, ...; the range is inclusive of both dates.
+    assert [visit["visit_created_at"][:10] for visit in report["visits"]] == ["2024-01-07", "2024-01-04"]
+    assert report["totals"] == {"total_visits": 2, "total_ai_analyses": 2}
+
+
+def test_patient_lookups_use_the_listing_and_pattern_indexes(pg_conn, seeded):
+    cur = pg_conn.cursor()
+    cur.execute("EXPLAIN (FORMAT JSON) SELECT id FROM patients WHERE phone = '+919800001000'")
+    phone_indexes = _index_names(cur.fetchone()["QUERY PLAN"][0]["Plan"])
+    cur.execute(
+        f"EXPLAIN (FORMAT JSON) SELECT id FROM patients ORDER BY {main.PATIENTS_SORT_KEY} DESC, id DESC LIMIT 51"
+    )
+    listing_indexes = _index_names(cur.fetchone()["QUERY PLAN"][0]["Plan"])
+    pg_conn.rollback()
+
+    assert phone_indexes == ["idx_patients_phone_pattern"]
+    assert listing_indexes == ["idx_patients_sort_key_id"]
@@ -0,0 +1,193 @@
+import json
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Any, Dict, Optional
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from psycopg2.extras import Json
+
+import main
+import report_cache
+
+SUGGESTED_DOCTORS = [
+    {"name": " Dr. Rao ", "specialty": "Cardiology", "reason": "Chest pain on exertion."},
+    {"name": "Dr. Blank", "specialty": " ", "reason": ""},
+    {"name": "   ", "specialty": "Dropped", "reason": "No name."},
+    "not an object",
+    {"specialty": "Missing name"},
+]
+
+
+@pytest.fixture(scope="module")
+def patient_id(pg_conn):
+    # One patient whose visits cover every shape the two builders normalize differently.
+    cur = pg_conn.cursor()
+    doctor_id = uuid.uuid4()
+    patient = uuid.uuid4()
+    cur.execute(
+        """
+        INSERT INTO users (id, full_name, email, password_hash, role)
+        VALUES (%s, 'Dr. Equivalence', 'equivalence@example.test', 'x', 'doctor')
+        """,
+        (str(doctor_id),),
+    )
+    cur.execute(
+        """
+        INSERT INTO patients (id, health_id, full_name, phone, age, gender, created_at)
+        VALUES (%s, 'CAX-EQ-1', 'Equivalence Patient', NULL, NULL, 'female', '2024-01-01 08:00:00.250000')
+        """,
+        (str(patient),),
+    )
+
+    visits = [
+        # Full visit with microsecond timestamps and every optional field set.
+        (datetime(2024, 3, 1, 9, 30, 0, 123000), doctor_id, ["fever", "cough", 38.5], {"temp": 38.5, "bp": {"sys": 120}},
+         ["Viral infection", "Influenza"], 0.85, 12.5, SUGGESTED_DOCTORS),
+        # No doctor, non-array symptoms and causes, blank scores.
+        (datetime(2024, 2, 15, 0, 0, 0), None, {"fever": True}, None, "not a list", None, None, None),
+        # Whole-second timestamp, empty lists.
+        (datetime(2024, 2, 1, 12, 0, 0), doctor_id, [], {}, [], 0, 0, []),
+    ]
+    for created_at, doctor, symptoms, vitals, causes, confidence, deviation, doctors in visits:
+        visit_id = str(uuid.uuid4())
+        cur.execute(
+            "INSERT INTO visits (id, patient_id, doctor_id, created_at) VALUES (%s, %s, %s, %s)",
+            (visit_id, str(patient), str(doctor) if doctor else None, created_at),
+        )
+        cur.execute(
+            """
+            INSERT INTO clinical_inputs (id, visit_id, symptoms, duration, severity, vitals, notes, doctor_diagnosis)
+            VALUES (gen_random_uuid(), %s, %s, '3 days', 'moderate', %s, 'Notes with "quotes" and ünïcode', NULL)
+            """,
+            (visit_id, Json(symptoms), Json(vitals) if vitals is not None else None),
+        )
+        cur.execute(
+            """
+            INSERT INTO ai_analysis (id, visit_id, probable_causes, risk_level, specialist_recommendation,
+                                     summary, confidence_score, deviation_percentage, suggested_doctors, created_at)
+            VALUES (gen_random_uuid(), %s, %s, 'medium', 'General Medicine', 'Summary', %s, %s, %s, %s)
+            """,
+            (visit_id, Json(causes), confidence, deviation, Json(doctors) if doctors is not None else None, created_at),
+        )
+
+    # A visit with neither clinical input nor analysis.
+    cur.execute(
+        "INSERT INTO visits (id, patient_id, doctor_id, created_at) VALUES (gen_random_uuid(), %s, %s, %s)",
+        (str(patient), str(doctor_id), datetime(2024, 1, 10, 18, 45, 30, 500)),
+    )
+    pg_conn.commit()
+    return str(patient)
+
+
+def _normalize(document: Any) -> Any:
+    # Postgres prints timestamps with the shortest fraction; compare them as datetimes instead.
+    if isinstance(document, dict):
+        return {key: _normalize(value) for key, value in document.items() if key != "generated_at"}
+    if isinstance(document, list):
+        return [_normalize(value) for value in document]
+    if isinstance(document, str) and len(document) >= 19 and document[4] == "-" and document[10] == "T":
+        try:
+            return datetime.fromisoformat(document)
+        except ValueError:
+            return document
+    return document
+
+
+@pytest.mark.parametrize(
+    "from_date, to_date, expected_visits",
+    [
+        (None, None, 4),
+        (date(2024, 2, 1), date(2024, 2, 15), 2),
+        (date(2024, 3, 1), None, 1),
+        (None, date(2024, 1, 10), 1),
+        (date(2025, 1, 1), date(2025, 1, 31), 0),
+    ],
+)
+def test_json_report_matches_payload(
+    pg_conn, patient_id, from_date: Optional[date], to_date: Optional[date], expected_visits: int
+):
+    payload = main._build_patient_report_payload(pg_conn, patient_id, from_date, to_date)
+    document = json.loads(main._build_patient_report_json(pg_conn, patient_id, from_date, to_date))
+    pg_conn.rollback()
+
+    assert payload["totals"]["total_visits"] == expected_visits
+    # Round-trip the payload through JSON the way JSONResponse would send it.
+    expected: Dict[str, Any] = json.loads(json.dumps(payload))
+    assert _normalize(document) == _normalize(expected)
+    assert list(document) == list(expected)
+    assert document["report_period"]["generated_at"].endswith("Z")
+
+
+def test_json_report_missing_patient_matches_payload(pg_conn, patient_id):
+    missing = str(uuid.uuid4())
+    for build in (main._build_patient_report_payload, main._build_patient_report_json):
+        with pytest.raises(HTTPException) as raised:
+            build(pg_conn, missing, None, None)
+        assert raised.value.status_code == 404
+    pg_conn.rollback()
+
+
+@pytest.fixture
+def borrowed(pg_conn, monkeypatch):
+    # get_connection hands out the test connection and records each borrow.
+    borrows = []
+
+    @contextmanager
+    def fake_get_connection():
+        borrows.append(pg_conn)
+        yield pg_conn
+
+    monkeypatch.setattr(main, "get_connection", fake_get_connection)
+    monkeypatch.setattr(main, "REPORT_STREAM_BATCH_ROWS", 1)
+    yield borrows
+    pg_conn.rollback()
+
+
+def _without_generated_at(lines):
+    return [line for line in lines if not line.startswith("Generated At:")]
+
+
+@pytest.mark.parametrize(
+    "from_date, to_date",
+    [(None, None), (date(2024, 2, 1), date(2024, 2, 15)), (date(2025, 1, 1), date(2025, 1, 31))],
+)
+def test_streamed_report_lines_match_payload(pg_conn, patient_id, borrowed, from_date, to_date):
+    report = main._build_patient_report_payload(pg_conn, patient_id, from_date, to_date)
+    patient = main._fetch_report_patient(pg_conn, patient_id)
+    pg_conn.rollback()
+
+    streamed = list(main._iter_streamed_report_lines(patient, from_date, to_date))
+
+    assert _without_generated_at(streamed) == _without_generated_at(main._to_report_lines(report))
+
+
+def test_streamed_report_borrows_a_connection_only_while_consumed(pg_conn, patient_id, borrowed):
+    patient = main._fetch_report_patient(pg_conn, patient_id)
+    pg_conn.rollback()
+
+    lines = main._iter_streamed_report_lines(patient, None, None)
+    assert borrowed == []
+
+    header = [next(lines) for _ in range(3)]
+    assert header[0] == "CareAxis CoPilot - Patient Detailed Report"
+    assert len(borrowed) == 1
+
+    # Abandoning the stream closes the server-side cursor with it.
+    lines.close()
+    cur = pg_conn.cursor()
+    cur.execute("SELECT COUNT(*) AS open FROM pg_cursors WHERE name LIKE 'report_visits_%%'")
+    assert cur.fetchone()["open"] == 0
+
+
+def test_pdf_download_streams_rows(pg_conn, patient_id, borrowed, monkeypatch):
+    monkeypatch.setattr(main, "report_cache", report_cache.ReportCache())
+    response = TestClient(main.app).get(f"/reports/patients/{patient_id}/pdf")
+
+    assert response.status_code == 200
+    assert response.content.startswith(b"%PDF")
+    assert response.headers["Content-Disposition"] == 'attachment; filename="patient-report-CAX-EQ-1.pdf"'
+    # One borrow for the version check, one for the streamed rows.
+    assert len(borrowed) == 2
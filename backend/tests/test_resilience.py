@@ -0,0 +1,241 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cohere
+import httpx
+import pytest
+
+import ai
+import fake_cohere
+import resilience
+
+MESSAGES = [{"role": "user", "content": "ping"}]
+
+
+@pytest.fixture(scope="module")
+def server():
+    fake = fake_cohere.FakeCohere(fake_cohere.ModelProfile(fake_cohere.LatencyModel("fixed", 0)))
+    with fake_cohere.serve_in_thread(fake) as url:
+        yield fake, url
+
+
+@pytest.fixture
+def fake(server):
+    fake, _ = server
+    fake.reset()
+    return fake
+
+
+@pytest.fixture
+def client(server):
+    _, url = server
+    http_client = httpx.Client()
+    yield cohere.ClientV2(api_key="test", base_url=url, httpx_client=http_client)
+    http_client.close()
+
+
+def _requests(fake):
+    return sum(model["requests"] for model in fake.stats()["models"].values())
+
+
+def _errors(fake):
+    return sum(model["errors"] for model in fake.stats()["models"].values())
+
+
+def _send(client):
+    def send(timeout):
+        return client.chat(
+            model="command-r", messages=MESSAGES, request_options={"timeout_in_seconds": timeout, "max_retries": 0}
+        )
+
+    return send
+
+
+def _retry(send, breaker=None, **overrides):
+    options = dict(
+        deadline_seconds=5,
+        attempt_timeout_seconds=2,
+        max_retries=2,
+        backoff_base=0.01,
+        backoff_cap=0.02,
+        is_retryable=ai._is_retryable,
+        breaker=breaker,
+    )
+    options.update(overrides)
+    return resilience.call_with_retries(send, **options)
+
+
+def test_retries_transient_errors_until_success(fake, client):
+    fake.inject(2, status=503)
+    retries = []
+
+    response = _retry(_send(client), on_retry=lambda attempt, exc: retries.append(getattr(exc, "status_code", None)))
+
+    assert response.message.content[0].text
+    assert retries == [503, 503]
+    assert (_requests(fake), _errors(fake)) == (3, 2)
+
+
+def test_gives_up_after_max_retries(fake, client):
+    fake.inject(5, status=429)
+
+    with pytest.raises(Exception) as raised:
+        _retry(_send(client), max_retries=2)
+
+    assert raised.value.status_code == 429
+    assert _requests(fake) == 3
+
+
+def test_does_not_retry_client_errors(fake, client):
+    fake.inject(1, status=400)
+    breaker = resilience.CircuitBreaker(failure_threshold=1, reset_seconds=60)
+
+    with pytest.raises(Exception) as raised:
+        _retry(_send(client), breaker=breaker)
+
+    assert raised.value.status_code == 400
+    assert _requests(fake) == 1
+    # The provider answered, so its health is not held against it.
+    assert breaker.stats()["state"] == "closed"
+
+
+def test_attempt_timeouts_respect_the_overall_deadline(fake, client):
+    fake.inject(10, delay_seconds=1.0)
+
+    started = time.monotonic()
+    with pytest.raises(Exception) as raised:
+        _retry(_send(client), deadline_seconds=0.5, attempt_timeout_seconds=0.2, max_retries=10)
+    elapsed = time.monotonic() - started
+
+    assert ai._is_retryable(raised.value) or isinstance(raised.value, resilience.DeadlineExceeded)
+    assert elapsed < 0.9
+    assert 2 <= _requests(fake) <= 3
+
+
+def test_breaker_opens_fails_fast_and_recovers(fake, client):
+    breaker = resilience.CircuitBreaker(failure_threshold=2, reset_seconds=0.3)
+    fake.inject(2, status=503)
+    for _ in range(2):
+        with pytest.raises(Exception):
+            _retry(_send(client), breaker=breaker, max_retries=0)
+    assert breaker.stats()["state"] == "open"
+
+    # While open, calls fail without reaching the provider.
+    with pytest.raises(resilience.CircuitOpenError):
+        _retry(_send(client), breaker=breaker)
+    assert _requests(fake) == 2
+
+    time.sleep(0.35)
+    fake.inject(1, status=500)
+    with pytest.raises(Exception):
+        _retry(_send(client), breaker=breaker, max_retries=0)
+    assert breaker.stats()["state"] == "open"
+    assert breaker.stats()["opens"] == 2
+
+    time.sleep(0.35)
+    assert _retry(_send(client), breaker=breaker).message is not None
+    assert breaker.stats() == {"state": "closed", "consecutive_failures": 0, "opens": 2, "rejected": 1}
+
+
+def test_hedge_wins_when_the_first_request_stalls(fake, client):
+    fake.inject(1, delay_seconds=2.0)
+    executor = ThreadPoolExecutor(max_workers=2)
+    events = []
+
+    started = time.monotonic()
+    response = resilience.hedged_call(
+        lambda: _send(client)(5),
+        executor,
+        hedge_after=0.1,
+        on_hedge=lambda: events.append("hedge"),
+        on_hedge_win=lambda: events.append("win"),
+    )
+    elapsed = time.monotonic() - started
+    executor.shutdown(wait=True)
+
+    assert response.message is not None
+    assert events == ["hedge", "win"]
+    assert elapsed < 1.0
+    assert _requests(fake) == 2
+
+
+def test_no_hedge_when_the_first_request_is_fast(fake, client):
+    executor = ThreadPoolExecutor(max_workers=2)
+    events = []
+
+    response = resilience.hedged_call(
+        lambda: _send(client)(5), executor, hedge_after=1.0, on_hedge=lambda: events.append("hedge")
+    )
+    executor.shutdown(wait=True)
+
+    assert response.message is not None
+    assert events == []
+    assert _requests(fake) == 1
+
+
+def test_hedge_surfaces_the_error_when_both_copies_fail(fake, client):
+    fake.inject(1, status=503, delay_seconds=0.4)
+    fake.inject(1, status=500)
+    executor = ThreadPoolExecutor(max_workers=2)
+
+    with pytest.raises(Exception) as raised:
+        resilience.hedged_call(lambda: _send(client)(5), executor, hedge_after=0.05)
+    executor.shutdown(wait=True)
+
+    assert raised.value.status_code in (500, 503)
+    assert _requests(fake) == 2
+
+
+@pytest.fixture
+def streaming(server, monkeypatch):
+    _, url = server
+    manager = ai._CohereClientManager()
+    breaker = resilience.CircuitBreaker(failure_threshold=1, reset_seconds=0.05)
+    monkeypatch.setattr(ai, "COHERE_BASE_URL", url)
+    monkeypatch.setattr(ai, "_client_manager", manager)
+    monkeypatch.setattr(ai, "_breaker", breaker)
+    monkeypatch.setattr(ai._admission, "acquire", lambda priority: None)
+    monkeypatch.setenv("COHERE_API_KEY", "test")
+    yield breaker
+    manager.close()
+
+
+def _half_open(breaker):
+    breaker.record_failure()
+    time.sleep(0.06)
+
+
+def test_abandoned_stream_releases_the_half_open_trial(fake, streaming):
+    breaker = streaming
+    _half_open(breaker)
+    compiled = {"system": "s", "user": "u"}
+
+    stream = ai._stream_text_deltas(compiled, 0)
+    assert next(stream)
+    assert not breaker.allow()
+    stream.close()
+
+    # Neither a success nor a failure: still half-open, and the next caller gets the trial.
+    assert breaker.stats()["state"] == "half_open"
+    assert breaker.allow()
+
+
+def test_completed_stream_closes_the_breaker(fake, streaming):
+    breaker = streaming
+    _half_open(breaker)
+
+    text = "".join(ai._stream_text_deltas({"system": "s", "user": "u"}, 0))
+
+    assert text
+    assert breaker.stats()["state"] == "closed"
+
+
+def test_failed_stream_reopens_the_breaker(fake, streaming):
+    breaker = streaming
+    _half_open(breaker)
+    fake.inject(1, status=503)
+
+    with pytest.raises(Exception):
+        list(ai._stream_text_deltas({"system": "s", "user": "u"}, 0))
+
+    assert breaker.stats()["state"] == "open"
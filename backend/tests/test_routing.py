@@ -0,0 +1,199 @@
+import json
+import random
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import admission
+import ai
+import analysis_cache
+import bench
+import fake_cohere
+import resilience
+
+FAST_MODEL = "fast-model"
+VALID = json.dumps(bench._analysis_output(random.Random(3)))
+
+
+def _response(text):
+    return SimpleNamespace(message=SimpleNamespace(content=[SimpleNamespace(text=text)]))
+
+
+@pytest.fixture
+def chat(monkeypatch):
+    # A stubbed _chat: the fast model answers with prose after `fast_seconds`, the large
+    # model answers with valid JSON at once.
+    monkeypatch.setattr(ai, "AI_CALL_DEADLINE_SECONDS", 1.0)
+    monkeypatch.setattr(ai, "_router", ai._ModelRouter(ai.MODEL_NAME, FAST_MODEL))
+    state = {"calls": [], "fast_seconds": 0.3}
+
+    def fake_chat(messages, model, priority, deadline_seconds, ticket=None):
+        state["calls"].append((model, priority, deadline_seconds))
+        if model == FAST_MODEL:
+            time.sleep(state["fast_seconds"])
+            return _response("Sorry, I cannot format that.")
+        return _response(VALID)
+
+    monkeypatch.setattr(ai, "_chat", fake_chat)
+    return state
+
+
+def test_escalation_gets_only_the_remaining_deadline(chat):
+    result = ai._call_model({"system": "s", "user": "u"}, FAST_MODEL, -5.0)
+
+    assert result["risk_level"]
+    (fast, fast_priority, fast_deadline), (large, large_priority, large_deadline) = chat["calls"]
+    assert (fast, large) == (FAST_MODEL, ai.MODEL_NAME)
+    assert fast_priority == large_priority == -5.0
+    assert fast_deadline == pytest.approx(1.0, abs=0.05)
+    assert large_deadline <= 1.0 - 0.3
+    assert ai.routing_stats()["escalations"] == 1
+
+
+def test_no_escalation_once_the_deadline_has_passed(chat):
+    chat["fast_seconds"] = 1.1
+
+    with pytest.raises(ValueError):
+        ai._call_model({"system": "s", "user": "u"}, FAST_MODEL, 0.0)
+
+    assert [model for model, _, _ in chat["calls"]] == [FAST_MODEL]
+    assert ai.routing_stats()["escalations"] == 0
+
+
+ROUTINE = {
+    "symptoms": ["cough"],
+    "duration": "2 days",
+    "severity": "mild",
+    "vitals": {"temperature": 37.4},
+    "notes": "",
+    "doctor_diagnosis": "",
+}
+
+
+@pytest.fixture(scope="module")
+def server():
+    fake = fake_cohere.FakeCohere(
+        fake_cohere.ModelProfile(fake_cohere.LatencyModel("fixed", 0)),
+        profiles={
+            FAST_MODEL: fake_cohere.ModelProfile(fake_cohere.LatencyModel("fixed", 0)),
+            ai.MODEL_NAME: fake_cohere.ModelProfile(fake_cohere.LatencyModel("fixed", 0)),
+        },
+        seed=25,
+    )
+    with fake_cohere.serve_in_thread(fake) as url:
+        yield fake, url
+
+
+@pytest.fixture
+def fake(server, monkeypatch):
+    # Real calls through _chat to the fake provider, one profile per model; no cache,
+    # hedging or rate limit, and AI_ROUTE_MIN_SAMPLES lowered so tests stay short.
+    fake, url = server
+    fake.reset()
+    for model in (FAST_MODEL, ai.MODEL_NAME):
+        fake.profiles[model] = fake_cohere.ModelProfile(fake_cohere.LatencyModel("fixed", 0))
+    manager = ai._CohereClientManager()
+    monkeypatch.setattr(ai, "COHERE_BASE_URL", url)
+    monkeypatch.setattr(ai, "_client_manager", manager)
+    monkeypatch.setattr(ai, "_breaker", resilience.CircuitBreaker(failure_threshold=100, reset_seconds=60))
+    monkeypatch.setattr(ai, "_admission", admission.AdmissionScheduler(0, 1, 10, 5))
+    monkeypatch.setattr(ai, "_inflight", ai._SingleFlight())
+    monkeypatch.setattr(ai, "AI_HEDGE_ENABLED", False)
+    monkeypatch.setattr(ai, "AI_ROUTE_MIN_SAMPLES", 5)
+    monkeypatch.setattr(analysis_cache, "ENABLED", False)
+    monkeypatch.setenv("COHERE_API_KEY", "test")
+    monkeypatch.setattr(ai, "_router", ai._ModelRouter(ai.MODEL_NAME, FAST_MODEL, window=10, probe_every=4))
+    yield fake
+    manager.close()
+
+
+def _profile(fake, model, latency_ms=0, invalid_rate=0.0):
+    fake.profiles[model] = fake_cohere.ModelProfile(fake_cohere.LatencyModel("fixed", latency_ms), invalid_rate)
+
+
+def _requests(fake, model):
+    return fake.stats()["models"].get(model, {}).get("requests", 0)
+
+
+def _analyze(count=1, **overrides):
+    for index in range(count):
+        # A distinct case each time, so nothing is coalesced.
+        ai.analyze_case({**ROUTINE, "duration": f"{index + 2} days", **overrides}, [])
+
+
+@pytest.mark.parametrize(
+    "overrides, history, reason",
+    [
+        ({"severity": "severe"}, [], "severity"),
+        ({"vitals": {"spo2": 85, "heart_rate": 140, "temperature": 40.5}}, [], "triage_risk"),
+        ({"symptoms": ["cough", "fever", "headache", "myalgia"]}, [], "symptoms"),
+        ({"notes": "x" * 601}, [], "notes"),
+        ({}, [{"summary": "earlier visit"}] * 3, "history"),
+        ({}, [], "routine"),
+    ],
+)
+def test_case_thresholds_pick_the_model(fake, overrides, history, reason):
+    ai.analyze_case({**ROUTINE, **overrides}, history)
+
+    expected = FAST_MODEL if reason == "routine" else ai.MODEL_NAME
+    assert _requests(fake, expected) == 1
+    assert sum(model["requests"] for model in fake.stats()["models"].values()) == 1
+    assert ai.routing_stats()["reasons"] == {reason: 1}
+
+
+def test_fast_model_is_benched_on_failure_rate_and_probed_back(fake):
+    # A clearly slower large model keeps latency out of the decision.
+    _profile(fake, ai.MODEL_NAME, latency_ms=20)
+    _profile(fake, FAST_MODEL, invalid_rate=1.0)
+    _analyze(5)
+    # Every fast answer failed validation and escalated.
+    assert (_requests(fake, FAST_MODEL), _requests(fake, ai.MODEL_NAME)) == (5, 5)
+    assert ai.routing_stats()["escalations"] == 5
+
+    _analyze(4)
+    stats = ai.routing_stats()
+    assert stats["reasons"]["fast_failure_rate"] == 3 and stats["reasons"]["fast_probe"] == 1
+    assert _requests(fake, FAST_MODEL) == 6
+
+    # The fast model recovers; probes refill its window until the failure rate is back
+    # under the limit (2 failures in the last 10) and routine cases return to it.
+    _profile(fake, FAST_MODEL)
+    _analyze(4 * 8)
+    assert ai._router.failure_rate(FAST_MODEL) <= ai.AI_ROUTE_FAST_MAX_FAILURE_RATE
+    fast_before = _requests(fake, FAST_MODEL)
+    _analyze(3)
+    assert _requests(fake, FAST_MODEL) == fast_before + 3
+    assert ai.routing_stats()["reasons"]["routine"] == 5 + 3
+
+
+def test_fast_model_is_benched_while_slower_and_probed_back(fake):
+    _profile(fake, FAST_MODEL, latency_ms=80)
+    _profile(fake, ai.MODEL_NAME, latency_ms=30)
+    _analyze(5)
+    _analyze(5, severity="severe")
+
+    large_before = _requests(fake, ai.MODEL_NAME)
+    _analyze(3)
+    assert _requests(fake, ai.MODEL_NAME) == large_before + 3
+    assert ai.routing_stats()["reasons"]["fast_not_faster"] == 3
+
+    # Now faster than the large model: probes bring its median down and it is used again.
+    _profile(fake, FAST_MODEL, latency_ms=0)
+    _analyze(4 * 8)
+    assert ai._router.latency(FAST_MODEL, 0.5) < ai._router.latency(ai.MODEL_NAME, 0.5)
+    fast_before = _requests(fake, FAST_MODEL)
+    _analyze(3)
+    assert _requests(fake, FAST_MODEL) == fast_before + 3
+
+
+def test_probes_can_be_disabled(fake):
+    ai._router.probe_every = 0
+    _profile(fake, ai.MODEL_NAME, latency_ms=20)
+    _profile(fake, FAST_MODEL, invalid_rate=1.0)
+    _analyze(5)
+
+    _analyze(12)
+
+    assert _requests(fake, FAST_MODEL) == 5
+    assert "fast_probe" not in ai.routing_stats()["reasons"]
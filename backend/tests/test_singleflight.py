@@ -0,0 +1,130 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import admission
+import ai
+import analysis_cache
+
+CALLERS = 16
+CASE = {
+    "symptoms": ["fever", "cough"],
+    "duration": "2 days",
+    "severity": "medium",
+    "vitals": {"temperature": 38.2},
+    "notes": "",
+    "doctor_diagnosis": "Viral URTI",
+}
+RESULT = {"probable_causes": ["Viral infection"], "risk_level": "medium", "suggested_doctors": []}
+
+
+@pytest.fixture
+def model(monkeypatch):
+    # A stubbed _call_model that blocks until every caller has joined the flight.
+    monkeypatch.setattr(analysis_cache, "ENABLED", False)
+    monkeypatch.setattr(ai, "_inflight", ai._SingleFlight())
+    monkeypatch.setattr(ai, "_router", ai._ModelRouter(ai.MODEL_NAME, ai.FAST_MODEL_NAME))
+
+    state = {"calls": 0, "outcome": RESULT, "release": threading.Event()}
+
+    def call_model(compiled, model_name, priority, ticket=None):
+        state["calls"] += 1
+        assert state["release"].wait(10)
+        if isinstance(state["outcome"], BaseException):
+            raise state["outcome"]
+        return dict(state["outcome"])
+
+    monkeypatch.setattr(ai, "_call_model", call_model)
+    return state
+
+
+def _wait_for_followers(count: int) -> None:
+    deadline = time.monotonic() + 10
+    while ai.inflight_stats()["coalesced"] < count:
+        assert time.monotonic() < deadline, ai.inflight_stats()
+        time.sleep(0.005)
+
+
+def _analyze_concurrently(callers: int = CALLERS):
+    def call():
+        try:
+            return ai.analyze_case(CASE, [])
+        except BaseException as exc:
+            return exc
+
+    pool = ThreadPoolExecutor(max_workers=callers)
+    futures = [pool.submit(call) for _ in range(callers)]
+    return pool, futures
+
+
+def test_identical_calls_share_one_execution(model):
+    pool, futures = _analyze_concurrently()
+    _wait_for_followers(CALLERS - 1)
+    model["release"].set()
+    results = [future.result(10) for future in futures]
+    pool.shutdown()
+
+    assert model["calls"] == 1
+    assert all(result == RESULT for result in results)
+    # Every caller gets its own copy, so one caller's edits cannot leak into another's.
+    assert len({id(result) for result in results}) == CALLERS
+    assert ai.inflight_stats() == {"in_flight": 0, "executions": 1, "coalesced": CALLERS - 1}
+    # Only the leader is routed; followers never reach a model.
+    assert sum(model["routed"] for model in ai.routing_stats()["models"].values()) == 1
+
+
+def test_every_waiter_receives_the_leaders_error(model):
+    model["outcome"] = ValueError("unusable model output")
+    pool, futures = _analyze_concurrently()
+    _wait_for_followers(CALLERS - 1)
+    model["release"].set()
+    errors = [future.result(10) for future in futures]
+    pool.shutdown()
+
+    assert model["calls"] == 1
+    # The leader raises the original; each waiter raises its own copy chained to it.
+    assert sum(error is model["outcome"] for error in errors) == 1
+    copies = [error for error in errors if error is not model["outcome"]]
+    assert len({id(error) for error in copies}) == CALLERS - 1
+    assert all(type(error) is ValueError and error.args == model["outcome"].args for error in copies)
+    assert all(error.__cause__ is model["outcome"] for error in copies)
+    assert ai.inflight_stats()["in_flight"] == 0
+
+
+def test_waiters_keep_the_admission_status_and_retry_hint(model):
+    model["outcome"] = admission.QueueFull("AI queue is full.", retry_after=2.5)
+    pool, futures = _analyze_concurrently(4)
+    _wait_for_followers(3)
+    model["release"].set()
+    errors = [future.result(10) for future in futures]
+    pool.shutdown()
+
+    assert all(isinstance(error, admission.QueueFull) for error in errors)
+    assert all(error.status_code == 429 and error.retry_after == 2.5 for error in errors)
+    assert all(error.__cause__ is model["outcome"] for error in errors if error is not model["outcome"])
+
+
+def test_waiters_time_out_without_cancelling_the_leader(model, monkeypatch):
+    monkeypatch.setattr(ai, "SINGLEFLIGHT_TIMEOUT_SECONDS", 0.05)
+    pool, futures = _analyze_concurrently(4)
+    _wait_for_followers(3)
+
+    # Followers give up after their timeout while the leader is still running.
+    deadline = time.monotonic() + 10
+    while sum(future.done() for future in futures) < 3:
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+    model["release"].set()
+    outcomes = [future.result(10) for future in futures]
+    pool.shutdown()
+
+    assert model["calls"] == 1
+    assert sum(isinstance(outcome, TimeoutError) for outcome in outcomes) == 3
+    assert [outcome for outcome in outcomes if not isinstance(outcome, TimeoutError)] == [RESULT]
+    assert ai.inflight_stats()["in_flight"] == 0
+
+    # The next identical call starts a fresh execution instead of joining a finished one.
+    assert ai.analyze_case(CASE, []) == RESULT
+    assert model["calls"] == 2
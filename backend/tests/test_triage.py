@@ -0,0 +1,46 @@
+import pytest
+
+import triage
+
+
+@pytest.mark.parametrize(
+    "symptoms, expected",
+    [
+        (["chest pain"], ["chest pain"]),
+        (["Chest   Pain", "fever"], ["chest pain"]),
+        (["stroke"], ["stroke"]),
+        (["heat stroke"], []),
+        (["sunstroke"], []),
+        (["heat stroke, now slurred speech and stroke"], ["stroke", "slurred speech"]),
+        (["chest painful on palpation"], []),
+        (["no chest pain"], []),
+        (["denies shortness of breath"], []),
+        (["no fever or chest pain"], []),
+        (["no fever, chest pain"], ["chest pain"]),
+        (["denies fever but has chest pain"], ["chest pain"]),
+        (["not unconscious", "seizure"], ["seizure"]),
+        ("chest pain", []),
+    ],
+)
+def test_red_flags_match_affirmed_whole_phrases(symptoms, expected):
+    points, matched = triage.engine._symptom_points(symptoms)
+
+    assert matched == expected
+    assert points == sum(triage.engine.red_flags[flag] for flag in expected)
+
+
+def test_negated_red_flag_does_not_raise_the_risk_level():
+    case = {"symptoms": ["denies chest pain", "no shortness of breath"], "severity": "low", "vitals": {"pulse": 80}}
+
+    result = triage.score_case(case)
+
+    assert result["red_flags"] == []
+    assert result["risk_level"] == "low"
+
+
+def test_exclusions_and_negations_come_from_the_rules():
+    rules = {**triage.DEFAULT_RULES, "red_flag_exclusions": {}, "negation_cues": []}
+    engine = triage.TriageEngine(rules)
+
+    assert engine._symptom_points(["heat stroke"])[1] == ["stroke"]
+    assert engine._symptom_points(["no chest pain"])[1] == ["chest pain"]
@@ -0,0 +1,93 @@
+import gc
+import threading
+import uuid
+import weakref
+from contextlib import contextmanager
+
+import pytest
+
+import ai
+import main
+
+PATIENT_ID = str(uuid.uuid4())
+RESULT = {"risk_level": "low", "summary": "Self-limiting."}
+
+
+@pytest.fixture
+def visit(monkeypatch):
+    state = {"failed": [], "failed_event": threading.Event(), "upstream_closed": False, "saved": False}
+
+    def analyze_case_stream(payload, history, ticket=None):
+        try:
+            yield "field", ("risk_level", "low")
+            yield "field", ("summary", "Self-limiting.")
+            yield "result", RESULT
+        finally:
+            state["upstream_closed"] = True
+
+    def mark_failed(visit_id, error):
+        state["failed"].append((visit_id, error))
+        state["failed_event"].set()
+
+    @contextmanager
+    def connection():
+        class Conn:
+            def commit(self):
+                pass
+
+            def rollback(self):
+                pass
+
+        yield Conn()
+
+    def save(conn, visit_id, result):
+        state["saved"] = True
+
+    monkeypatch.setattr(ai, "analyze_case_stream", analyze_case_stream)
+    monkeypatch.setattr(main, "_mark_analysis_failed", mark_failed)
+    monkeypatch.setattr(main, "get_connection", connection)
+    monkeypatch.setattr(main, "_save_analysis_result", save)
+    monkeypatch.setattr(main.report_cache, "invalidate_patient", lambda patient_id: None)
+    return state
+
+
+def _stream(visit_id):
+    # The same wiring analyze_visit_stream sets up around its generator.
+    settled = {"done": False}
+    stream = main._iter_visit_analysis_events(visit_id, PATIENT_ID, {"risk_level": "low"}, {}, [], settled)
+    weakref.finalize(stream, main._fail_abandoned_visit, visit_id, settled)
+    return stream
+
+
+def test_completed_stream_leaves_the_visit_alone(visit):
+    events = list(_stream("visit-1"))
+    gc.collect()
+
+    assert events[-1].startswith("event: result")
+    assert visit["saved"]
+    assert visit["upstream_closed"]
+    assert not visit["failed_event"].wait(0.2)
+
+
+def test_disconnect_mid_stream_marks_the_visit_failed(visit):
+    stream = _stream("visit-2")
+    assert next(stream).startswith("event: visit")
+    next(stream)
+    assert next(stream).startswith("event: field")
+
+    del stream
+    gc.collect()
+
+    assert visit["failed_event"].wait(5)
+    assert visit["failed"] == [("visit-2", "Client disconnected before the analysis completed")]
+    assert visit["upstream_closed"]
+    assert not visit["saved"]
+
+
+def test_disconnect_before_the_stream_starts_marks_the_visit_failed(visit):
+    stream = _stream("visit-3")
+    del stream
+    gc.collect()
+
+    assert visit["failed_event"].wait(5)
+    assert visit["failed"] == [("visit-3", "Client disconnected before the analysis completed")]
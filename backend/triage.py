@@ -0,0 +1,274 @@
+import argparse
+import json
+import math
+import os
+import re
+import sys
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Early-warning-score style bands: each vital maps to (inclusive upper bound, points) pairs
+# in ascending order. Values above the last bound score the last band's points.
+DEFAULT_RULES: Dict[str, Any] = {
+    "vitals": {
+        "respiratory_rate": {
+            "paths": [["respiratory_rate"], ["resp_rate"], ["rr"]],
+            "bands": [[8, 3], [11, 1], [20, 0], [24, 2], [math.inf, 3]],
+        },
+        "spo2": {
+            "paths": [["spo2"], ["oxygen_saturation"]],
+            "bands": [[91, 3], [93, 2], [95, 1], [math.inf, 0]],
+        },
+        "systolic_bp": {
+            "paths": [["blood_pressure", "systolic"], ["systolic"], ["bp_systolic"]],
+            "bands": [[90, 3], [100, 2], [110, 1], [219, 0], [math.inf, 3]],
+        },
+        "pulse": {
+            "paths": [["pulse"], ["heart_rate"], ["hr"]],
+            "bands": [[40, 3], [50, 1], [90, 0], [110, 1], [130, 2], [math.inf, 3]],
+        },
+        "temperature_c": {
+            "paths": [["temperature_c"], ["temperature"], ["temp_c"]],
+            "bands": [[35.0, 3], [36.0, 1], [38.0, 0], [39.0, 1], [math.inf, 2]],
+        },
+    },
+    "severity": {"low": 0, "medium": 1, "moderate": 1, "high": 2, "severe": 2, "critical": 4},
+    "red_flag_symptoms": {
+        "chest pain": 3,
+        "shortness of breath": 2,
+        "difficulty breathing": 2,
+        "unconscious": 3,
+        "unresponsive": 3,
+        "seizure": 3,
+        "stroke": 3,
+        "slurred speech": 3,
+        "severe bleeding": 3,
+        "confusion": 2,
+        "fainting": 2,
+        "syncope": 2,
+    },
+    # Phrases that contain a red flag's words but are not that condition.
+    "red_flag_exclusions": {
+        "stroke": ["heat stroke", "sun stroke"],
+    },
+    # A red flag preceded by one of these in the same clause is not counted ("denies chest pain").
+    "negation_cues": ["no", "not", "denies", "denied", "without", "negative for", "absence of", "free of"],
+    # First threshold the total reaches wins; a single vital scoring 3 forces at least "medium".
+    "risk_levels": [[9, "critical"], [7, "high"], [5, "medium"], [0, "low"]],
+    "single_parameter_alert": {"points": 3, "minimum_level": "medium"},
+}
+
+
+# Negation scope ends at punctuation or a contrasting conjunction: "no fever, chest pain".
+CLAUSE_BOUNDARY = re.compile(r"[.;,:|]|\b(?:but|however|although)\b")
+
+
+def _phrase_pattern(phrases: Sequence[str]) -> "re.Pattern[str]":
+    # Whole words only, with any run of whitespace between them.
+    words = [r"\s+".join(map(re.escape, phrase.lower().split())) for phrase in phrases]
+    alternatives = sorted(words, key=len, reverse=True)
+    return re.compile(r"\b(?:" + "|".join(alternatives) + r")\b")
+
+
+def _load_rules() -> Dict[str, Any]:
+    path = os.getenv("TRIAGE_RULES_PATH")
+    if not path:
+        return DEFAULT_RULES
+    with open(path, "r", encoding="utf-8") as handle:
+        overrides = json.load(handle)
+    return {**DEFAULT_RULES, **overrides}
+
+
+def _to_number(value: Any) -> float:
+    if isinstance(value, bool) or value is None:
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _lookup(vitals: Any, paths: Sequence[Sequence[str]]) -> float:
+    for path in paths:
+        node = vitals
+        for part in path:
+            if not isinstance(node, dict) or part not in node:
+                node = None
+                break
+            node = node[part]
+        number = _to_number(node)
+        if not math.isnan(number):
+            return number
+    return math.nan
+
+
+class TriageEngine:
+    def __init__(self, rules: Optional[Dict[str, Any]] = None):
+        self.rules = rules or _load_rules()
+        vitals = self.rules["vitals"]
+        self.vital_names: List[str] = list(vitals)
+        self._paths = [vitals[name]["paths"] for name in self.vital_names]
+        self._bounds = [np.array([band[0] for band in vitals[name]["bands"]], dtype=float) for name in self.vital_names]
+        self._points = [np.array([band[1] for band in vitals[name]["bands"]], dtype=np.int16) for name in self.vital_names]
+        self.severity_points = {key.lower(): value for key, value in self.rules["severity"].items()}
+        self.red_flags = {key.lower(): value for key, value in self.rules["red_flag_symptoms"].items()}
+        # One pass per clause: a group per red flag, longest phrases first.
+        flags = sorted(self.red_flags, key=len, reverse=True)
+        self._red_flag_pattern = re.compile(
+            r"\b(?:" + "|".join("(" + r"\s+".join(map(re.escape, flag.split())) + ")" for flag in flags) + r")\b"
+        )
+        self._red_flag_groups = flags
+        exclusions = [phrase for phrases in (self.rules.get("red_flag_exclusions") or {}).values() for phrase in phrases]
+        self._exclusion = _phrase_pattern(exclusions) if exclusions else None
+        cues = self.rules.get("negation_cues") or []
+        self._negation = _phrase_pattern(cues) if cues else None
+        self.risk_levels: List[Tuple[int, str]] = [(int(score), level) for score, level in self.rules["risk_levels"]]
+        alert = self.rules.get("single_parameter_alert") or {}
+        self.alert_points = int(alert.get("points", 3))
+        self.alert_level = alert.get("minimum_level")
+        self._level_rank = {level: rank for rank, (_, level) in enumerate(reversed(self.risk_levels))}
+
+    def vitals_matrix(self, vitals_list: Sequence[Any]) -> np.ndarray:
+        matrix = np.full((len(vitals_list), len(self.vital_names)), np.nan)
+        for row, vitals in enumerate(vitals_list):
+            for column, paths in enumerate(self._paths):
+                matrix[row, column] = _lookup(vitals, paths)
+        return matrix
+
+    def score_vitals(self, matrix: np.ndarray) -> np.ndarray:
+        # Band lookup for every visit at once; missing readings score 0.
+        points = np.zeros(matrix.shape, dtype=np.int16)
+        for column, (bounds, band_points) in enumerate(zip(self._bounds, self._points)):
+            values = matrix[:, column]
+            present = ~np.isnan(values)
+            index = np.minimum(np.searchsorted(bounds, values[present], side="left"), len(bounds) - 1)
+            points[present, column] = band_points[index]
+        return points
+
+    def _symptom_points(self, symptoms: Any) -> Tuple[int, List[str]]:
+        # Matches whole words within each entry's clauses, skipping excluded phrases
+        # ("heat stroke") and negated mentions ("denies chest pain").
+        if not isinstance(symptoms, list):
+            return 0, []
+        found = set()
+        for item in symptoms:
+            text = str(item).lower()
+            if not self._red_flag_pattern.search(text):
+                continue
+            for clause in CLAUSE_BOUNDARY.split(" ".join(text.split())):
+                if self._exclusion is not None:
+                    clause = self._exclusion.sub(" ", clause)
+                for match in self._red_flag_pattern.finditer(clause):
+                    if self._negation is None or not self._negation.search(clause, 0, match.start()):
+                        found.add(self._red_flag_groups[match.lastindex - 1])
+        matched = [flag for flag in self.red_flags if flag in found]
+        return sum(self.red_flags[flag] for flag in matched), matched
+
+    def _risk_level(self, total: int, max_vital_points: int) -> str:
+        level = self.risk_levels[-1][1]
+        for threshold, candidate in self.risk_levels:
+            if total >= threshold:
+                level = candidate
+                break
+        if (
+            self.alert_level
+            and max_vital_points >= self.alert_points
+            and self._level_rank.get(level, 0) < self._level_rank.get(self.alert_level, 0)
+        ):
+            level = self.alert_level
+        return level
+
+    def score_batch(self, cases: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        vital_points = self.score_vitals(self.vitals_matrix([case.get("vitals") or {} for case in cases]))
+        vital_totals = vital_points.sum(axis=1)
+        vital_max = vital_points.max(axis=1, initial=0)
+
+        results: List[Dict[str, Any]] = []
+        for row, case in enumerate(cases):
+            severity = str(case.get("severity") or "").strip().lower()
+            severity_points = int(self.severity_points.get(severity, 0))
+            symptom_points, red_flags = self._symptom_points(case.get("symptoms"))
+            total = int(vital_totals[row]) + severity_points + symptom_points
+            results.append(
+                {
+                    "risk_level": self._risk_level(total, int(vital_max[row])),
+                    "score": total,
+                    "components": {
+                        "vitals": {
+                            name: int(vital_points[row, column])
+                            for column, name in enumerate(self.vital_names)
+                            if vital_points[row, column]
+                        },
+                        "severity": severity_points,
+                        "symptoms": symptom_points,
+                    },
+                    "red_flags": red_flags,
+                    "provisional": True,
+                }
+            )
+        return results
+
+    def score_case(self, case: Dict[str, Any]) -> Dict[str, Any]:
+        return self.score_batch([case])[0]
+
+
+engine = TriageEngine()
+
+
+def score_case(case: Dict[str, Any]) -> Dict[str, Any]:
+    return engine.score_case(case)
+
+
+def rescore_visits(batch_size: int = 5000) -> int:
+    # Audit helper: recompute the stored provisional triage for every visit.
+    from psycopg2.extras import execute_values
+
+    from db import get_connection
+
+    updated = 0
+    last_id = None
+    while True:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT ci.visit_id, ci.symptoms, ci.severity, ci.vitals
+                FROM clinical_inputs ci
+                WHERE (%s::uuid IS NULL OR ci.visit_id > %s::uuid)
+                ORDER BY ci.visit_id
+                LIMIT %s
+                """,
+                (last_id, last_id, batch_size),
+            )
+            rows = cur.fetchall()
+            if not rows:
+                return updated
+
+            scores = engine.score_batch(rows)
+            execute_values(
+                cur,
+                """
+                UPDATE visits AS v
+                SET triage_risk_level = data.risk_level, triage_score = data.score
+                FROM (VALUES %s) AS data (id, risk_level, score)
+                WHERE v.id = data.id::uuid
+                """,
+                [(str(row["visit_id"]), score["risk_level"], score["score"]) for row, score in zip(rows, scores)],
+            )
+            conn.commit()
+
+        updated += len(rows)
+        last_id = str(rows[-1]["visit_id"])
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Recompute provisional triage scores for stored visits.")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args(argv)
+    print(f"Rescored {rescore_visits(args.batch_size)} visits")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,28 @@
+import argparse
+import logging
+import sys
+from typing import List, Optional
+
+import jobs
+import main
+
+
+def run(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Process queued CareAxis analysis jobs.")
+    parser.add_argument("--workers", type=int, default=max(jobs.WORKERS, 1), help="Concurrent analyses.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    runner = jobs.AnalysisJobRunner(
+        run_job=main._run_analysis_job,
+        save_result=main._save_analysis_job_result,
+        on_failure=main._fail_analysis_job,
+        workers=args.workers,
+    )
+    runner.run_forever()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,48 @@
+import * as React from "react";
+
+import { getPatientsPage, PATIENTS_PAGE_SIZE, type PatientSummary } from "@/lib/api";
+
+// Loads the patient list one page at a time: the first page on mount and on reload(),
+// later pages only when the view asks for them with loadMore().
+export function usePatientPages(token?: string, pageSize = PATIENTS_PAGE_SIZE, onError?: (error: unknown) => void) {
+  const [patients, setPatients] = React.useState<PatientSummary[]>([]);
+  const [nextCursor, setNextCursor] = React.useState<string | null>(null);
+  const [loading, setLoading] = React.useState(false);
+  const onErrorRef = React.useRef(onError);
+  onErrorRef.current = onError;
+  // Bumped on reload so a slow page from an earlier load cannot land after a newer one.
+  const generation = React.useRef(0);
+
+  const fetchPage = React.useCallback(
+    async (cursor: string | null) => {
+      const current = ++generation.current;
+      setLoading(true);
+      try {
+        const page = await getPatientsPage(token, cursor, pageSize);
+        if (current !== generation.current) return null;
+        setPatients((previous) => (cursor ? [...previous, ...page.patients] : page.patients));
+        setNextCursor(page.next_cursor);
+        return page.patients;
+      } catch (error) {
+        onErrorRef.current?.(error);
+        return null;
+      } finally {
+        if (current === generation.current) setLoading(false);
+      }
+    },
+    [pageSize, token],
+  );
+
+  const reload = React.useCallback(() => fetchPage(null), [fetchPage]);
+
+  const loadMore = React.useCallback(() => {
+    if (!nextCursor || loading) return Promise.resolve(null);
+    return fetchPage(nextCursor);
+  }, [fetchPage, loading, nextCursor]);
+
+  React.useEffect(() => {
+    void reload();
+  }, [reload]);
+
+  return { patients, loading, hasMore: nextCursor !== null, loadMore, reload };
+}
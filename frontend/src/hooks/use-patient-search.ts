@@ -0,0 +1,43 @@
+import * as React from "react";
+
+import { searchPatients, type PatientSearchResult } from "@/lib/api";
+
+const SEARCH_DEBOUNCE_MS = 250;
+
+// Server-side type-ahead for the patient pickers. Runs once typing pauses; an empty
+// query clears the results so views fall back to their paged list.
+export function usePatientSearch(query: string, token?: string, limit = 10, onError?: (error: unknown) => void) {
+  const [results, setResults] = React.useState<PatientSearchResult[]>([]);
+  const [searching, setSearching] = React.useState(false);
+  const onErrorRef = React.useRef(onError);
+  onErrorRef.current = onError;
+  const term = query.trim();
+
+  React.useEffect(() => {
+    if (!term) {
+      setResults([]);
+      setSearching(false);
+      return;
+    }
+
+    let stale = false;
+    setSearching(true);
+    const timeoutId = window.setTimeout(async () => {
+      try {
+        const response = await searchPatients(term, token, limit);
+        if (!stale) setResults(response.results);
+      } catch (error) {
+        if (!stale) onErrorRef.current?.(error);
+      } finally {
+        if (!stale) setSearching(false);
+      }
+    }, SEARCH_DEBOUNCE_MS);
+
+    return () => {
+      stale = true;
+      window.clearTimeout(timeoutId);
+    };
+  }, [limit, term, token]);
+
+  return { active: term.length > 0, results, searching };
+}
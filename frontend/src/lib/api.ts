@@ -94,6 +94,21 @@ export type GetPatientsResponse = {
   patients: PatientSummary[];
 };
 
+export type GetPatientsPageResponse = GetPatientsResponse & {
+  next_cursor: string | null;
+};
+
+// The API serves patients newest first in pages of at most 200.
+export const PATIENTS_PAGE_SIZE = 50;
+
+export type PatientSearchResult = PatientSummary & {
+  score: number | null;
+};
+
+export type SearchPatientsResponse = {
+  results: PatientSearchResult[];
+};
+
 export type CreatePatientRequest = {
   full_name: string;
   phone: string;
@@ -197,8 +212,28 @@ export function login(payload: LoginRequest) {
   });
 }
 
-export function getPatients(token?: string) {
-  return apiRequest<GetPatientsResponse>("/patients", {
+export function getPatientsPage(token?: string, cursor?: string | null, limit = PATIENTS_PAGE_SIZE) {
+  const params = new URLSearchParams({ limit: String(limit) });
+  if (cursor) params.set("cursor", cursor);
+
+  return apiRequest<GetPatientsPageResponse>(`/patients?${params.toString()}`, {
+    method: "GET",
+    token,
+  });
+}
+
+export function searchPatients(query: string, token?: string, limit = 10) {
+  // Type-ahead lookup by health ID, phone or name, ranked by the server.
+  const params = new URLSearchParams({ q: query, limit: String(limit) });
+
+  return apiRequest<SearchPatientsResponse>(`/patients/search?${params.toString()}`, {
+    method: "GET",
+    token,
+  });
+}
+
+export function countPatients(token?: string) {
+  return apiRequest<{ count: number }>("/patients/count", {
     method: "GET",
     token,
   });
@@ -12,10 +12,12 @@ import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@
 import { Separator } from "@/components/ui/separator";
 import { Textarea } from "@/components/ui/textarea";
 import { toast } from "@/components/ui/sonner";
+import { usePatientPages } from "@/hooks/use-patient-pages";
+import { usePatientSearch } from "@/hooks/use-patient-search";
 import {
   analyzeVisit,
   getApiErrorMessage,
-  getPatients,
+  PATIENTS_PAGE_SIZE,
   type AnalyzeVisitResponse,
   type PatientSummary,
 } from "@/lib/api";
@@ -44,10 +46,21 @@ export default function Consultation() {
   const token = getAuthToken() ?? undefined;
   const authUser = getAuthUser();
 
-  const [patients, setPatients] = React.useState<PatientSummary[]>([]);
-  const [loadingPatients, setLoadingPatients] = React.useState(false);
-
-  const [selectedPatientId, setSelectedPatientId] = React.useState("");
+  const showLoadError = React.useCallback((error: unknown) => {
+    toast.error("Failed to load patients", {
+      description: getApiErrorMessage(error),
+    });
+  }, []);
+  const {
+    patients,
+    loading: loadingPatients,
+    hasMore: morePatients,
+    loadMore: loadMorePatients,
+  } = usePatientPages(token, PATIENTS_PAGE_SIZE, showLoadError);
+
+  const [patientQuery, setPatientQuery] = React.useState("");
+  const [selectedPatient, setSelectedPatient] = React.useState<PatientSummary | null>(null);
+  const selectedPatientId = selectedPatient?.id ?? "";
   const [symptomInput, setSymptomInput] = React.useState("");
   const [symptoms, setSymptoms] = React.useState<string[]>([]);
   const [duration, setDuration] = React.useState("2-3 days");
@@ -59,26 +72,30 @@ export default function Consultation() {
   const [submitting, setSubmitting] = React.useState(false);
   const [result, setResult] = React.useState<AnalyzeVisitResponse | null>(null);
 
-  const loadPatients = React.useCallback(async () => {
-    setLoadingPatients(true);
-    try {
-      const response = await getPatients(token);
-      setPatients(response.patients);
-      setSelectedPatientId((current) => current || response.patients[0]?.id || "");
-    } catch (error) {
-      toast.error("Failed to load patients", {
-        description: getApiErrorMessage(error),
-      });
-    } finally {
-      setLoadingPatients(false);
+  const showSearchError = React.useCallback((error: unknown) => {
+    toast.error("Patient search failed", {
+      description: getApiErrorMessage(error),
+    });
+  }, []);
+  const search = usePatientSearch(patientQuery, token, 10, showSearchError);
+
+  // Search results replace the paged list while a query is typed; the selected patient
+  // stays listed so the picker can still show it.
+  const patientOptions = React.useMemo(() => {
+    const options: PatientSummary[] = search.active ? search.results : patients;
+    if (selectedPatient && !options.some((patient) => patient.id === selectedPatient.id)) {
+      return [selectedPatient, ...options];
     }
-  }, [token]);
+    return options;
+  }, [patients, search.active, search.results, selectedPatient]);
 
   React.useEffect(() => {
-    void loadPatients();
-  }, [loadPatients]);
+    setSelectedPatient((current) => current ?? patients[0] ?? null);
+  }, [patients]);
 
-  const selectedPatient = patients.find((patient) => patient.id === selectedPatientId) ?? null;
+  const selectPatient = (patientId: string) => {
+    setSelectedPatient(patientOptions.find((patient) => patient.id === patientId) ?? null);
+  };
 
   const addSymptom = () => {
     const value = symptomInput.trim();
@@ -189,18 +206,42 @@ export default function Consultation() {
             <CardContent className="space-y-5">
               <div className="grid gap-2">
                 <Label>Patient</Label>
-                <Select value={selectedPatientId} onValueChange={setSelectedPatientId} disabled={loadingPatients}>
+                <Input
+                  value={patientQuery}
+                  onChange={(event) => setPatientQuery(event.target.value)}
+                  placeholder="Search by name, health ID or phone"
+                  aria-label="Search patients"
+                />
+                <Select
+                  value={selectedPatientId}
+                  onValueChange={selectPatient}
+                  disabled={loadingPatients && !patients.length}
+                >
                   <SelectTrigger>
                     <SelectValue placeholder={loadingPatients ? "Loading patients..." : "Select patient"} />
                   </SelectTrigger>
                   <SelectContent>
-                    {patients.map((patient) => (
+                    {patientOptions.map((patient) => (
                       <SelectItem key={patient.id} value={patient.id}>
                         {patient.full_name} - {patient.health_id}
                       </SelectItem>
                     ))}
                   </SelectContent>
                 </Select>
+                {search.active && search.searching ? (
+                  <div className="text-sm text-muted-foreground">Searching...</div>
+                ) : null}
+                {morePatients && !search.active ? (
+                  <Button
+                    type="button"
+                    variant="ghost"
+                    className="h-8 justify-start px-2 text-sm"
+                    onClick={() => void loadMorePatients()}
+                    disabled={loadingPatients}
+                  >
+                    {loadingPatients ? "Loading..." : "Load more patients"}
+                  </Button>
+                ) : null}
               </div>
 
               <div className="space-y-2">
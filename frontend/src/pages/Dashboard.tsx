@@ -29,7 +29,7 @@ import { Avatar, AvatarFallback } from "@/components/ui/avatar";
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select";
 import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from "@/components/ui/table";
 import { toast } from "@/components/ui/sonner";
-import { getPatients, type PatientSummary } from "@/lib/api";
+import { countPatients, getPatientsPage, type PatientSummary } from "@/lib/api";
 import { clearAuthSession, getAuthToken, getAuthUser } from "@/lib/demo-auth";
 
 const navItems = [
@@ -54,9 +54,11 @@ function deviationFromId(id: string): Consultation["deviation"] {
   return options[hash % options.length];
 }
 
+const RECENT_CONSULTATION_ROWS = 5;
+
 function toConsultationRows(patients: PatientSummary[]): Consultation[] {
   const today = new Date().toISOString().slice(0, 10);
-  return patients.slice(0, 5).map((patient) => ({
+  return patients.slice(0, RECENT_CONSULTATION_ROWS).map((patient) => ({
     patientName: patient.full_name,
     careAxisId: patient.health_id,
     date: today,
@@ -91,9 +93,13 @@ export default function Dashboard() {
   const loadPatients = React.useCallback(async () => {
     setLoadingPatients(true);
     try {
-      const response = await getPatients(authToken);
-      setPatientCount(response.patients.length);
-      setRecentConsultations(toConsultationRows(response.patients));
+      // Only the newest few rows and the total; the full list lives on the Patients page.
+      const [recent, total] = await Promise.all([
+        getPatientsPage(authToken, null, RECENT_CONSULTATION_ROWS),
+        countPatients(authToken),
+      ]);
+      setPatientCount(total.count);
+      setRecentConsultations(toConsultationRows(recent.patients));
     } catch {
       toast.error("Failed to load patients", {
         description: "Check backend server and try again.",
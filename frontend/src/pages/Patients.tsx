@@ -25,7 +25,9 @@ import { Input } from "@/components/ui/input";
 import { Label } from "@/components/ui/label";
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select";
 import { toast } from "@/components/ui/sonner";
-import { createPatient, getApiErrorMessage, getPatients, type PatientSummary } from "@/lib/api";
+import { usePatientPages } from "@/hooks/use-patient-pages";
+import { usePatientSearch } from "@/hooks/use-patient-search";
+import { createPatient, getApiErrorMessage, PATIENTS_PAGE_SIZE } from "@/lib/api";
 import { getAuthToken } from "@/lib/demo-auth";
 
 type NewPatientForm = {
@@ -46,38 +48,32 @@ export default function Patients() {
   const navigate = useNavigate();
   const token = getAuthToken() ?? undefined;
 
-  const [patients, setPatients] = React.useState<PatientSummary[]>([]);
-  const [loading, setLoading] = React.useState(false);
   const [query, setQuery] = React.useState("");
   const [newPatientOpen, setNewPatientOpen] = React.useState(false);
   const [creating, setCreating] = React.useState(false);
   const [newPatientForm, setNewPatientForm] = React.useState<NewPatientForm>(emptyNewPatientForm);
 
-  const loadPatients = React.useCallback(async () => {
-    setLoading(true);
-    try {
-      const response = await getPatients(token);
-      setPatients(response.patients);
-    } catch (error) {
-      toast.error("Failed to load patients", {
-        description: getApiErrorMessage(error),
-      });
-    } finally {
-      setLoading(false);
-    }
-  }, [token]);
+  const showLoadError = React.useCallback((error: unknown) => {
+    toast.error("Failed to load patients", {
+      description: getApiErrorMessage(error),
+    });
+  }, []);
+  const {
+    patients,
+    loading,
+    hasMore,
+    loadMore,
+    reload: loadPatients,
+  } = usePatientPages(token, PATIENTS_PAGE_SIZE, showLoadError);
 
-  React.useEffect(() => {
-    void loadPatients();
-  }, [loadPatients]);
-
-  const filteredPatients = React.useMemo(() => {
-    const q = query.trim().toLowerCase();
-    if (!q) return patients;
-    return patients.filter((patient) =>
-      `${patient.full_name} ${patient.health_id} ${patient.phone}`.toLowerCase().includes(q),
-    );
-  }, [patients, query]);
+  const showSearchError = React.useCallback((error: unknown) => {
+    toast.error("Patient search failed", {
+      description: getApiErrorMessage(error),
+    });
+  }, []);
+  const search = usePatientSearch(query, token, 25, showSearchError);
+  const visiblePatients = search.active ? search.results : patients;
+  const busy = search.active ? search.searching : loading;
 
   const handleCreatePatient = async () => {
     if (!newPatientForm.full_name.trim()) {
@@ -189,7 +185,7 @@ export default function Patients() {
         </Card>
 
         <div className="mt-6 grid gap-4 md:grid-cols-2 xl:grid-cols-3">
-          {filteredPatients.map((patient) => (
+          {visiblePatients.map((patient) => (
             <Card key={patient.id} className="rounded-xl border-border/70 bg-card/90 shadow-sm">
               <CardHeader className="pb-2">
                 <CardTitle className="text-lg">{patient.full_name}</CardTitle>
@@ -207,9 +203,17 @@ export default function Patients() {
           ))}
         </div>
 
-        {!filteredPatients.length ? (
+        {hasMore && !search.active ? (
+          <div className="mt-6 flex justify-center">
+            <Button type="button" variant="outline" className="h-10" onClick={() => void loadMore()} disabled={loading}>
+              {loading ? "Loading..." : "Load more patients"}
+            </Button>
+          </div>
+        ) : null}
+
+        {!visiblePatients.length ? (
           <div className="mt-10 text-center text-sm text-muted-foreground">
-            {loading ? "Loading patients..." : "No patients match your search."}
+            {busy ? "Loading patients..." : "No patients match your search."}
           </div>
         ) : null}
       </section>
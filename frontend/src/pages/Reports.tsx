@@ -77,11 +77,13 @@ import {
   downloadPatientReportPdf,
   getApiErrorMessage,
   getPatientReport,
-  getPatients,
+  PATIENTS_PAGE_SIZE,
   type PatientReportResponse,
   type PatientSummary,
 } from "@/lib/api";
 import { getAuthToken } from "@/lib/demo-auth";
+import { usePatientPages } from "@/hooks/use-patient-pages";
+import { usePatientSearch } from "@/hooks/use-patient-search";
 
 type ComplianceSlice = {
   label: string;
@@ -230,10 +232,9 @@ function ReportPreviewModal({
 
 export default function Reports() {
   const token = getAuthToken() ?? undefined;
-  const [patients, setPatients] = React.useState<PatientSummary[]>([]);
-  const [loadingPatients, setLoadingPatients] = React.useState(false);
   const [patientQuery, setPatientQuery] = React.useState("");
-  const [selectedPatientId, setSelectedPatientId] = React.useState<string>("");
+  const [selectedPatient, setSelectedPatient] = React.useState<PatientSummary | null>(null);
+  const selectedPatientId = selectedPatient?.id ?? "";
   const [fromDate, setFromDate] = React.useState<Date | undefined>(undefined);
   const [toDate, setToDate] = React.useState<Date | undefined>(undefined);
 
@@ -248,39 +249,29 @@ export default function Reports() {
   const [previewTitle, setPreviewTitle] = React.useState("Report Preview");
   const [previewKind, setPreviewKind] = React.useState<"empty" | "patient" | "consultation" | "custom">("empty");
 
-  const selectedPatient = patients.find((patient) => patient.id === selectedPatientId) ?? null;
-
-  const filteredPatients = React.useMemo(() => {
-    const q = patientQuery.trim().toLowerCase();
-    if (!q) return patients;
-    return patients.filter((patient) => `${patient.full_name} ${patient.health_id}`.toLowerCase().includes(q));
-  }, [patientQuery, patients]);
-
-  const loadPatients = React.useCallback(async () => {
-    setLoadingPatients(true);
-    try {
-      const response = await getPatients(token);
-      setPatients(response.patients);
-      setSelectedPatientId((current) => {
-        if (current && response.patients.some((patient) => patient.id === current)) return current;
-        return response.patients[0]?.id ?? "";
-      });
-    } catch (error) {
-      toast.error("Failed to load patients", {
-        description: getApiErrorMessage(error),
-      });
-    } finally {
-      setLoadingPatients(false);
-    }
-  }, [token]);
+  const showLoadError = React.useCallback((error: unknown) => {
+    toast.error("Failed to load patients", {
+      description: getApiErrorMessage(error),
+    });
+  }, []);
+  const {
+    patients,
+    loading: loadingPatients,
+    hasMore: morePatients,
+    loadMore: loadMorePatients,
+  } = usePatientPages(token, PATIENTS_PAGE_SIZE, showLoadError);
+
+  const showSearchError = React.useCallback((error: unknown) => {
+    toast.error("Patient search failed", {
+      description: getApiErrorMessage(error),
+    });
+  }, []);
+  const search = usePatientSearch(patientQuery, token, 25, showSearchError);
+  const filteredPatients: PatientSummary[] = search.active ? search.results : patients;
 
   React.useEffect(() => {
-    void loadPatients();
-    const intervalId = window.setInterval(() => {
-      void loadPatients();
-    }, 15000);
-    return () => window.clearInterval(intervalId);
-  }, [loadPatients]);
+    setSelectedPatient((current) => current ?? patients[0] ?? null);
+  }, [patients]);
 
   const fetchPatientReport = React.useCallback(
     async (patientId?: string) => {
@@ -329,7 +320,7 @@ export default function Reports() {
           fromDate ? format(fromDate, "yyyy-MM-dd") : undefined,
           toDate ? format(toDate, "yyyy-MM-dd") : undefined,
         );
-        const currentPatient = patients.find((patient) => patient.id === targetPatientId);
+        const currentPatient = [selectedPatient, ...filteredPatients].find((patient) => patient?.id === targetPatientId);
         const filename = `patient-report-${currentPatient?.health_id ?? targetPatientId}.pdf`;
 
         const url = window.URL.createObjectURL(blob);
@@ -352,7 +343,7 @@ export default function Reports() {
         setDownloadingPatientId(null);
       }
     },
-    [fromDate, patients, selectedPatientId, toDate, token],
+    [filteredPatients, fromDate, selectedPatient, selectedPatientId, toDate, token],
   );
 
   const generate = async (kind: typeof previewKind) => {
@@ -723,7 +714,7 @@ export default function Reports() {
                             type="button"
                             variant={p.id === selectedPatientId ? "secondary" : "ghost"}
                             className="h-9"
-                            onClick={() => setSelectedPatientId(p.id)}
+                            onClick={() => setSelectedPatient(p)}
                           >
                             {p.full_name} | {p.health_id}
                           </Button>
@@ -759,7 +750,7 @@ export default function Reports() {
                         </TableRow>
                       </TableHeader>
                       <TableBody>
-                        {loadingPatients ? (
+                        {(search.active ? search.searching && !filteredPatients.length : loadingPatients && !patients.length) ? (
                           <TableRow>
                             <TableCell colSpan={4} className="text-muted-foreground">
                               Loading patients...
@@ -778,7 +769,7 @@ export default function Reports() {
                                     variant="outline"
                                     className="h-9"
                                     onClick={() => {
-                                      setSelectedPatientId(patient.id);
+                                      setSelectedPatient(patient);
                                       void fetchPatientReport(patient.id);
                                     }}
                                     disabled={loadingPatientReport}
@@ -806,6 +797,19 @@ export default function Reports() {
                         )}
                       </TableBody>
                     </Table>
+                    {morePatients && !search.active ? (
+                      <div className="flex justify-center border-t p-3">
+                        <Button
+                          type="button"
+                          variant="outline"
+                          className="h-9"
+                          onClick={() => void loadMorePatients()}
+                          disabled={loadingPatients}
+                        >
+                          {loadingPatients ? "Loading..." : "Load more patients"}
+                        </Button>
+                      </div>
+                    ) : null}
                   </div>
 
                   <div className="grid gap-3 sm:grid-cols-[1fr_1fr_auto]">